@@ -0,0 +1,105 @@
+"""
+Configuração do gunicorn em produção (lida automaticamente a partir da raiz do projeto).
+
+GUNICORN_MODO=gthread (omissão): workers síncronos com threads, iv_sweets.wsgi.
+GUNICORN_MODO=asgi: workers uvicorn (pacote uvicorn-worker) a servir iv_sweets.asgi.
+
+WEB_CONCURRENCY e GUNICORN_THREADS sobrepõem-se ao cálculo a partir dos CPUs e
+da memória disponível (WEB_WORKER_MEMORIA_MB por worker).
+"""
+import os
+from pathlib import Path
+
+MODO = os.environ.get('GUNICORN_MODO', 'gthread')
+
+
+def _cpus():
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def _memoria_mb():
+    # Limite do container (cgroup v2 ou v1) ou, sem limite, a memória da máquina
+    for caminho in ('/sys/fs/cgroup/memory.max', '/sys/fs/cgroup/memory/memory.limit_in_bytes'):
+        try:
+            valor = Path(caminho).read_text().strip()
+        except OSError:
+            continue
+        if valor.isdigit() and int(valor) < 1 << 60:
+            return int(valor) // (1024 * 1024)
+    try:
+        for linha in Path('/proc/meminfo').read_text().splitlines():
+            if linha.startswith('MemTotal:'):
+                return int(linha.split()[1]) // 1024
+    except OSError:
+        pass
+    return None
+
+
+def _workers():
+    if os.environ.get('WEB_CONCURRENCY'):
+        return int(os.environ['WEB_CONCURRENCY'])
+    workers = 2 * _cpus() + 1
+    memoria = _memoria_mb()
+    if memoria:
+        # Com preload o código é partilhado; o que conta é a memória própria de cada worker
+        workers = min(workers, memoria // int(os.environ.get('WEB_WORKER_MEMORIA_MB', '150')))
+    return max(workers, 1)
+
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+workers = _workers()
+
+if MODO == 'asgi':
+    wsgi_app = 'iv_sweets.asgi:application'
+    worker_class = 'uvicorn_worker.UvicornWorker'
+else:
+    wsgi_app = 'iv_sweets.wsgi:application'
+    worker_class = 'gthread'
+    # Threads cobrem a espera por I/O (BD, storage, uploads lentos) sem mais processos
+    threads = int(os.environ.get('GUNICORN_THREADS', '4'))
+
+# Importa o Django, as views e compila os templates no master (iv_sweets.wsgi/asgi);
+# os workers herdam tudo copy-on-write e arrancam já quentes.
+preload_app = True
+
+# Um comprovativo de 1.5 MB num 3G lento demora bem mais que os 30s por omissão
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', '120'))
+graceful_timeout = 30
+keepalive = 5
+
+# Recicla os workers de vez em quando (fugas de memória), sem reiniciarem todos ao mesmo tempo
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', '1000'))
+max_requests_jitter = max_requests // 10
+
+# O heartbeat dos workers em memória, não no disco do container
+worker_tmp_dir = '/dev/shm' if os.path.isdir('/dev/shm') else None
+
+accesslog = '-'
+errorlog = '-'
+loglevel = os.environ.get('GUNICORN_LOG_LEVEL', 'info')
+
+
+def when_ready(server):
+    server.log.info(
+        'Modo %s: %s worker(s) x %s thread(s), %s MB de memória, %s CPU(s)',
+        MODO, workers, globals().get('threads', 1), _memoria_mb(), _cpus(),
+    )
+
+
+def post_fork(server, worker):
+    # Nenhuma ligação à BD aberta no master pode ser partilhada entre processos
+    from django.conf import settings
+    from django.db import connections
+
+    connections.close_all()
+
+    # Sem worker à parte (SQLite não é partilhável entre serviços), a fila de
+    # tarefas é processada aqui (com TAREFAS_SINCRONAS só as periódicas e as
+    # que têm atraso)
+    if settings.TAREFAS_NO_WEB:
+        from sweets.tarefas import processar_em_segundo_plano
+
+        processar_em_segundo_plano()
@@ -14,13 +14,14 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
-from django.urls import path, include
+from django.urls import path, re_path, include
 from django.conf import settings
-from django.conf.urls.static import static
+
+from sweets.media import servir_media
 
 urlpatterns = [
     path('', include('sweets.urls')),
+    # Uploads, in development and production: access control for private
+    # folders, Range/ETag support and optional X-Accel-Redirect/X-Sendfile offload
+    re_path(r'^%s(?P<caminho>.+)$' % settings.MEDIA_URL.lstrip('/'), servir_media, name='media'),
 ]
-
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
@@ -14,3 +14,10 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'iv_sweets.settings')
 
 application = get_wsgi_application()
+
+from django.conf import settings  # noqa: E402
+
+if settings.AQUECER_TEMPLATES:
+    from sweets.aquecimento import aquecer  # noqa: E402
+
+    aquecer()
@@ -0,0 +1,39 @@
+import io
+
+from django.core.files.base import ContentFile
+from PIL import Image
+
+from .imagens import miniatura
+from .models import ChatMessage
+from .uploads import tipo_real
+
+
+def processar_anexo(mensagem_id):
+    """
+    Guarda tipo, tamanho e dimensões do anexo de uma mensagem e, se for
+    imagem, uma miniatura para o chat mostrar em vez do ficheiro inteiro.
+    """
+    mensagem = ChatMessage.objects.filter(pk=mensagem_id).first()
+    if not mensagem or not mensagem.attachment:
+        return
+    try:
+        with mensagem.attachment.open('rb') as ficheiro:
+            conteudo = ficheiro.read()
+    except OSError:
+        return  # Anexo em falta no storage: o chat mostra só o link
+
+    campos = {'attachment_type': tipo_real(io.BytesIO(conteudo)), 'attachment_size': len(conteudo)}
+    if campos['attachment_type'].startswith('image/'):
+        try:
+            (largura, altura), preview = miniatura(conteudo)
+        except (OSError, Image.DecompressionBombError):
+            pass
+        else:
+            field = ChatMessage._meta.get_field('attachment_preview')
+            campos['attachment_width'] = largura
+            campos['attachment_height'] = altura
+            campos['attachment_preview'] = field.storage.save(
+                field.generate_filename(None, 'preview.jpg'), ContentFile(preview)
+            )
+    # update() em vez de save(): não volta a disparar os signals da mensagem
+    ChatMessage.objects.filter(pk=mensagem_id).update(**campos)
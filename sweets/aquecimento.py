@@ -0,0 +1,48 @@
+import logging
+from pathlib import Path
+
+import django
+from django.template import TemplateSyntaxError, engines
+from django.urls import get_resolver, reverse
+
+logger = logging.getLogger(__name__)
+
+DJANGO = Path(django.__file__).parent
+
+
+def nomes_templates(incluir_django=False):
+    # Todos os .html que os loaders conseguem encontrar (por omissão sem os do admin do Django)
+    nomes = set()
+    for loader in engines['django'].engine.template_loaders:
+        for carregador in getattr(loader, 'loaders', [loader]):
+            for pasta in map(Path, carregador.get_dirs()):
+                if not pasta.is_dir() or (not incluir_django and pasta.is_relative_to(DJANGO)):
+                    continue
+                nomes.update(f.relative_to(pasta).as_posix() for f in pasta.rglob('*.html'))
+    return sorted(nomes)
+
+
+def aquecer_templates():
+    """
+    Compila os templates do projeto para a cache do cached loader, para que
+    os primeiros pedidos de cada worker não paguem o parse. Devolve quantos.
+    """
+    engine = engines['django']
+    compilados = 0
+    for nome in nomes_templates():
+        try:
+            engine.get_template(nome)
+        except TemplateSyntaxError as erro:
+            logger.warning('Template %s não compila: %s', nome, erro)
+            continue
+        compilados += 1
+    return compilados
+
+
+def aquecer():
+    # Importa as views (via URLconf), prepara as tabelas do reverse() e compila os
+    # templates. Com o gunicorn em preload corre uma vez no master e os workers
+    # herdam tudo por fork.
+    get_resolver().url_patterns
+    reverse('sweets:index')
+    return aquecer_templates()
@@ -0,0 +1,98 @@
+import json
+import re
+from functools import lru_cache
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+
+# Versões fixas dos assets de terceiros, servidos a partir de sweets/static/vendor/
+# (manage.py baixar_assets) em vez dos CDNs.
+BOOTSTRAP = '5.3.0'
+FONT_AWESOME = '6.4.0'
+
+BOOTSTRAP_URL = f'https://cdn.jsdelivr.net/npm/bootstrap@{BOOTSTRAP}/dist'
+FONT_AWESOME_URL = f'https://cdnjs.cloudflare.com/ajax/libs/font-awesome/{FONT_AWESOME}'
+GOOGLE_FONTS_URL = 'https://fonts.googleapis.com/css2?family=Angelina&family=Grand+Hotel&display=swap'
+
+# Escrito no fim de baixar_assets: sem ele os templates continuam a usar os CDNs
+MARCADOR = 'vendor/versoes.json'
+
+ICONE = re.compile(r'\bfa-[a-z0-9]+(?:-[a-z0-9]+)*')
+# Nomes de ícones montados em runtime (fa-{{ ... }}, fa-{% ... %}, `fa-${...}`,
+# 'fa-' + x): o subconjunto não os vê, por isso cada um tem de estar em
+# ICONES_DINAMICOS com a lista dos ícones que pode dar
+DINAMICO = re.compile(r"""\bfa-(?:\{\{.*?\}\}|\{%.*?%\}|\$\{.*?\}|['"]\s*\+\s*[\w.]+)""")
+ICONES_DINAMICOS = Path(__file__).with_name('icones_dinamicos.json')
+SELETOR_ICONE = re.compile(r'^\.(fa-[a-z0-9-]+)::?(?:before|after)$')
+SOURCE_MAP = re.compile(r'/[*/]#\s*sourceMappingURL=\S+(?:\s*\*/)?')
+
+
+@lru_cache
+def locais():
+    return getattr(settings, 'ASSETS_LOCAIS', True) and finders.find(MARCADOR) is not None
+
+
+def dinamicos_permitidos():
+    with open(ICONES_DINAMICOS, encoding='utf-8') as ficheiro:
+        return {_expressao(chave): icones for chave, icones in json.load(ficheiro).items()}
+
+
+def _expressao(texto):
+    return re.sub(r'\s+', '', texto)
+
+
+def icones_do_texto(texto, permitidos):
+    """
+    Ícones que um template/script usa: os escritos por extenso e, para cada nome
+    montado em runtime, os que `permitidos` lhe atribui. Devolve também as
+    expressões dinâmicas que não estão em `permitidos`.
+    """
+    icones = set(ICONE.findall(texto))
+    desconhecidas = []
+    for expressao in DINAMICO.findall(texto):
+        if _expressao(expressao) in permitidos:
+            icones.update(permitidos[_expressao(expressao)])
+        else:
+            desconhecidas.append(expressao)
+    return icones, desconhecidas
+
+
+def sem_source_map(conteudo):
+    # O ManifestStaticFilesStorage segue os sourceMappingURL e falha se o .map não existir
+    return SOURCE_MAP.sub('', conteudo)
+
+
+def regras(css):
+    # Divide o CSS em blocos de topo (regras e @-blocos inteiros)
+    inicio = profundidade = 0
+    for posicao, caracter in enumerate(css):
+        if caracter == '{':
+            profundidade += 1
+        elif caracter == '}':
+            profundidade -= 1
+            if profundidade == 0:
+                yield css[inicio:posicao + 1]
+                inicio = posicao + 1
+    if css[inicio:].strip():
+        yield css[inicio:]
+
+
+def subconjunto_icones(css, usados):
+    """
+    Tira do CSS do Font Awesome as regras `.fa-x::before{content:...}` dos ícones
+    que não estão em `usados`. Tudo o resto (tamanhos, animações, @font-face) fica.
+    Devolve o CSS e os code points dos ícones que ficaram.
+    """
+    partes, codigos = [], set()
+    for regra in regras(css):
+        seletores, _, corpo = regra.partition('{')
+        nomes = [SELETOR_ICONE.match(s.strip()) for s in seletores.split(',')]
+        if not all(nomes):
+            partes.append(regra)
+            continue
+        mantidos = [m.group(0) for m in nomes if m.group(1) in usados]
+        if mantidos:
+            partes.append(','.join(mantidos) + '{' + corpo)
+            codigos.update(int(c, 16) for c in re.findall(r'\\([0-9a-fA-F]{2,6})', corpo))
+    return ''.join(partes), codigos
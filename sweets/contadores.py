@@ -0,0 +1,43 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import ChatMessage, ItemCarrinho, Reclamacao
+
+# Contadores dos badges da navegação (mensagens não lidas, linhas do carrinho,
+# reclamações por responder), guardados na cache. As escritas que os alteram
+# apagam a entrada depois do commit e o pedido seguinte volta a contar, por isso
+# as páginas normais não fazem nenhuma query para os mostrar.
+RECLAMACOES_ABERTAS = ('nova', 'lida')
+
+CONTAGENS = {
+    'mensagens': lambda usuario_id: ChatMessage.objects.filter(recipient_id=usuario_id, is_read=False).count(),
+    'carrinho': lambda usuario_id: ItemCarrinho.objects.filter(
+        carrinho__usuario_id=usuario_id, carrinho__encomendado=False
+    ).count(),
+    # Só o admin as vê: a contagem é a mesma para todos
+    'reclamacoes': lambda usuario_id: Reclamacao.objects.filter(status__in=RECLAMACOES_ABERTAS).count(),
+}
+GLOBAIS = {'reclamacoes'}
+
+
+def _chave(nome, usuario_id=None):
+    return f'contador:{nome}' if nome in GLOBAIS else f'contador:{nome}:{usuario_id}'
+
+
+def ler(usuario_id, nomes):
+    chaves = {nome: _chave(nome, usuario_id) for nome in nomes}
+    guardados = cache.get_many(chaves.values())
+    valores, novos = {}, {}
+    for nome, chave in chaves.items():
+        if chave not in guardados:
+            guardados[chave] = novos[chave] = CONTAGENS[nome](usuario_id)
+        valores[nome] = guardados[chave]
+    if novos:
+        cache.set_many(novos, settings.CONTADORES_CACHE_TIMEOUT)
+    return valores
+
+
+def invalidar(nome, *usuario_ids):
+    chaves = [_chave(nome, usuario_id) for usuario_id in usuario_ids or [None]]
+    transaction.on_commit(lambda: cache.delete_many(chaves))
@@ -0,0 +1,21 @@
+from django.utils.functional import SimpleLazyObject
+
+from . import assets, contadores as _contadores
+from .uploads import ativos
+
+
+def uploads(request):
+    return {'uploads_diretos': ativos()}
+
+
+def assets_locais(request):
+    return {'assets_locais': assets.locais()}
+
+
+def contadores(request):
+    # Badges da navegação, lidos da cache só quando o template os usa
+    usuario = request.user
+    if not usuario.is_authenticated:
+        return {}
+    nomes = ('mensagens', 'reclamacoes') if usuario.username == 'ivsweets' else ('mensagens', 'carrinho')
+    return {'contadores': SimpleLazyObject(lambda: _contadores.ler(usuario.pk, nomes))}
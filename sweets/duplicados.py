@@ -0,0 +1,112 @@
+import io
+from collections import defaultdict
+from functools import reduce
+from operator import or_
+
+from django.conf import settings
+from django.db.models import Q
+from PIL import Image, ImageOps
+
+from .models import ComprovativoPagamento
+
+BLOCOS = 4
+BITS_BLOCO = 16
+
+
+def hash_perceptual(conteudo):
+    # dHash: compara cada píxel com o vizinho numa miniatura 9x8 em tons de cinzento.
+    # Sobrevive a re-encodes, redimensionamentos e pequenas diferenças de brilho.
+    with Image.open(io.BytesIO(conteudo)) as imagem:
+        miniatura = ImageOps.exif_transpose(imagem).convert('L').resize((9, 8), Image.LANCZOS)
+        pixeis = list(miniatura.getdata())
+    valor = 0
+    for linha in range(8):
+        for coluna in range(8):
+            valor = (valor << 1) | (pixeis[linha * 9 + coluna] > pixeis[linha * 9 + coluna + 1])
+    return valor
+
+
+def blocos(valor):
+    mascara = (1 << BITS_BLOCO) - 1
+    return [(valor >> (BITS_BLOCO * i)) & mascara for i in range(BLOCOS)]
+
+
+def distancia(a, b):
+    return (a ^ b).bit_count()
+
+
+def distancia_maxima():
+    return getattr(settings, 'COMPROVATIVOS_DISTANCIA_MAX', 3)
+
+
+def calcular_hash(comprovativo_id):
+    comprovativo = ComprovativoPagamento.objects.filter(pk=comprovativo_id).first()
+    if not comprovativo or not comprovativo.comprovativo:
+        return
+    try:
+        with comprovativo.comprovativo.open('rb') as ficheiro:
+            conteudo = ficheiro.read()
+    except OSError:
+        return  # Ficheiro em falta no storage: não há nada para comparar
+    try:
+        valor = hash_perceptual(conteudo)
+    except (OSError, Image.DecompressionBombError):
+        return  # PDF ou ficheiro que não é imagem: só a referência é verificada
+    campos = {f'hash_bloco_{i}': bloco for i, bloco in enumerate(blocos(valor))}
+    ComprovativoPagamento.objects.filter(pk=comprovativo_id).update(hash_imagem=f'{valor:016x}', **campos)
+
+
+def _candidatos_por_imagem(hashes):
+    # Com distância máxima < número de blocos, duas imagens parecidas têm pelo menos um
+    # bloco igual (princípio da gaveta): basta procurar nos índices dos blocos.
+    if distancia_maxima() >= BLOCOS:
+        return ComprovativoPagamento.objects.exclude(hash_imagem='')
+    por_bloco = defaultdict(set)
+    for valor in hashes:
+        for i, bloco in enumerate(blocos(valor)):
+            por_bloco[i].add(bloco)
+    return ComprovativoPagamento.objects.filter(
+        reduce(or_, (Q(**{f'hash_bloco_{i}__in': valores}) for i, valores in por_bloco.items()))
+    )
+
+
+def anotar_duplicados(comprovativos):
+    """
+    Marca em cada comprovativo os outros com o mesmo (método, referência)
+    (`duplicados_referencia`) e os com imagem parecida (`duplicados_imagem`,
+    pares (id, distância)). Duas queries para a lista inteira.
+    """
+    comprovativos = list(comprovativos)
+    for comprovativo in comprovativos:
+        comprovativo.duplicados_referencia = []
+        comprovativo.duplicados_imagem = []
+    if not comprovativos:
+        return comprovativos
+
+    referencias = {(c.metodo_pagamento, c.numero_referencia) for c in comprovativos}
+    mesmas = defaultdict(list)
+    for id_, metodo, numero in ComprovativoPagamento.objects.filter(
+        reduce(or_, (Q(metodo_pagamento=m, numero_referencia=n) for m, n in referencias))
+    ).values_list('id', 'metodo_pagamento', 'numero_referencia').order_by('id'):
+        mesmas[(metodo, numero)].append(id_)
+    for comprovativo in comprovativos:
+        comprovativo.duplicados_referencia = [
+            id_ for id_ in mesmas[(comprovativo.metodo_pagamento, comprovativo.numero_referencia)]
+            if id_ != comprovativo.id
+        ]
+
+    com_hash = [c for c in comprovativos if c.hash_imagem]
+    if com_hash:
+        maximo = distancia_maxima()
+        candidatos = [
+            (id_, int(valor, 16))
+            for id_, valor in _candidatos_por_imagem([int(c.hash_imagem, 16) for c in com_hash])
+            .values_list('id', 'hash_imagem').order_by('id')
+        ]
+        for comprovativo in com_hash:
+            valor = int(comprovativo.hash_imagem, 16)
+            comprovativo.duplicados_imagem = [
+                (id_, d) for id_, outro in candidatos
+                if id_ != comprovativo.id and (d := distancia(valor, outro)) <= maximo
+            ]
+    return comprovativos
@@ -0,0 +1,77 @@
+from django.db import transaction
+from django.utils import timezone
+
+from . import partilha
+from .estatisticas import atualizar_estatisticas, dia_local
+from .models import Encomenda, EventoEncomenda
+
+FLUXO = ['pendente', 'confirmada', 'em_preparo', 'pronta', 'entregue']
+
+# Só se avança no fluxo (pode saltar passos); cancelar é possível até à entrega.
+# 'entregue' e 'cancelada' são finais.
+TRANSICOES = {
+    status: set(FLUXO[posicao + 1:]) | ({'cancelada'} if status != 'entregue' else set())
+    for posicao, status in enumerate(FLUXO)
+}
+TRANSICOES['cancelada'] = set()
+
+
+class TransicaoInvalida(Exception):
+    pass
+
+
+def pode_transitar(atual, novo):
+    return novo in TRANSICOES.get(atual, ())
+
+
+def transicoes_possiveis(encomenda):
+    nomes = dict(Encomenda.STATUS_CHOICES)
+    return [(status, nomes[status]) for status, _ in Encomenda.STATUS_CHOICES if pode_transitar(encomenda.status, status)]
+
+
+def transitar_em_lote(encomendas, novo, autor=None, nota='', ignorar_invalidas=False):
+    """
+    Muda o status de várias encomendas numa só transação e regista um evento
+    por encomenda. Com `ignorar_invalidas`, as que não podem fazer a transição
+    ficam como estão; caso contrário nenhuma muda e levanta TransicaoInvalida.
+    Devolve as encomendas alteradas.
+    """
+    if novo not in dict(Encomenda.STATUS_CHOICES):
+        raise TransicaoInvalida(f'Status desconhecido: {novo}')
+    ids = [e.pk if isinstance(e, Encomenda) else e for e in encomendas]
+    agora = timezone.now()
+    with transaction.atomic():
+        # Relê com lock: o status usado na validação é o atual, não o da página
+        alteradas, eventos = [], []
+        for encomenda in Encomenda.objects.select_for_update().filter(id__in=ids).order_by('id'):
+            if not pode_transitar(encomenda.status, novo):
+                if ignorar_invalidas:
+                    continue
+                raise TransicaoInvalida(
+                    f'A encomenda #{encomenda.id} não pode passar de '
+                    f'"{encomenda.get_status_display()}" para "{dict(Encomenda.STATUS_CHOICES)[novo]}".'
+                )
+            eventos.append(EventoEncomenda(
+                encomenda=encomenda, status_anterior=encomenda.status, status_novo=novo,
+                autor=autor, nota=nota,
+            ))
+            encomenda.status = novo
+            encomenda.updated_at = agora
+            alteradas.append(encomenda)
+        Encomenda.objects.bulk_update(alteradas, ['status', 'updated_at'])
+        EventoEncomenda.objects.bulk_create(eventos)
+
+        # bulk_update não dispara os signals (estatísticas e páginas partilhadas)
+        dias = {dia_local(encomenda.created_at) for encomenda in alteradas}
+        if dias:
+            transaction.on_commit(lambda: atualizar_estatisticas(dias))
+            transaction.on_commit(lambda: partilha.invalidar([encomenda.pk for encomenda in alteradas]))
+    return alteradas
+
+
+def transitar(encomenda, novo, autor=None, nota=''):
+    alteradas = transitar_em_lote([encomenda], novo, autor=autor, nota=nota)
+    if alteradas and isinstance(encomenda, Encomenda):
+        encomenda.status = alteradas[0].status
+        encomenda.updated_at = alteradas[0].updated_at
+    return bool(alteradas)
@@ -0,0 +1,84 @@
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.db import IntegrityError
+from django.db.models import Count, Sum
+from django.utils import timezone
+
+from .models import Avaliacao, ComprovativoPagamento, Encomenda, EstatisticaDiaria, Reclamacao
+
+
+def intervalo_do_dia(dia):
+    # Limites do dia no fuso horário da loja (TIME_ZONE)
+    inicio = timezone.make_aware(datetime.combine(dia, time.min))
+    return inicio, inicio + timedelta(days=1)
+
+
+def dia_local(momento):
+    return timezone.localtime(momento).date()
+
+
+def atualizar_estatisticas_dia(dia):
+    inicio, fim = intervalo_do_dia(dia)
+
+    por_status = dict(
+        Encomenda.objects.filter(created_at__gte=inicio, created_at__lt=fim)
+        .values_list('status')
+        .annotate(total=Count('id'))
+        .order_by()
+    )
+    pagamentos = ComprovativoPagamento.objects.filter(
+        status='aprovado', processado_em__gte=inicio, processado_em__lt=fim
+    ).aggregate(receita=Sum('valor'), total=Count('id'))
+
+    valores = {
+        'encomendas': sum(por_status.values()),
+        'encomendas_por_status': por_status,
+        'receita': pagamentos['receita'] or Decimal('0'),
+        'comprovativos_aprovados': pagamentos['total'],
+        'novos_clientes': User.objects.exclude(username='ivsweets').filter(
+            date_joined__gte=inicio, date_joined__lt=fim
+        ).count(),
+        'avaliacoes': Avaliacao.objects.filter(criado_em__gte=inicio, criado_em__lt=fim).count(),
+        'reclamacoes': Reclamacao.objects.filter(created_at__gte=inicio, created_at__lt=fim).count(),
+    }
+    try:
+        estatistica, _ = EstatisticaDiaria.objects.update_or_create(data=dia, defaults=valores)
+    except IntegrityError:
+        # Outro processo criou a linha do dia entre a procura e o insert: agora é um update
+        estatistica, _ = EstatisticaDiaria.objects.update_or_create(data=dia, defaults=valores)
+    return estatistica
+
+
+def atualizar_estatisticas(dias):
+    return [atualizar_estatisticas_dia(dia) for dia in sorted(set(dias))]
+
+
+def primeiro_dia_com_dados():
+    candidatos = [
+        Encomenda.objects.order_by('created_at').values_list('created_at', flat=True).first(),
+        User.objects.order_by('date_joined').values_list('date_joined', flat=True).first(),
+        Avaliacao.objects.order_by('criado_em').values_list('criado_em', flat=True).first(),
+        Reclamacao.objects.order_by('created_at').values_list('created_at', flat=True).first(),
+        ComprovativoPagamento.objects.exclude(processado_em=None).order_by('processado_em').values_list('processado_em', flat=True).first(),
+    ]
+    candidatos = [momento for momento in candidatos if momento]
+    return dia_local(min(candidatos)) if candidatos else None
+
+
+def serie_diaria(dias=30):
+    # Série contínua dos últimos `dias` dias (dias sem registo aparecem a zero)
+    hoje = timezone.localdate()
+    inicio = hoje - timedelta(days=dias - 1)
+    registos = {e.data: e for e in EstatisticaDiaria.objects.filter(data__gte=inicio)}
+    serie = []
+    for n in range(dias):
+        dia = inicio + timedelta(days=n)
+        serie.append(registos.get(dia) or EstatisticaDiaria(data=dia))
+    maior_encomendas = max((e.encomendas for e in serie), default=0) or 1
+    maior_receita = max((e.receita for e in serie), default=0) or 1
+    for e in serie:
+        e.percentual_encomendas = round(e.encomendas * 100 / maior_encomendas)
+        e.percentual_receita = round(e.receita * 100 / maior_receita)
+    return serie
@@ -0,0 +1,169 @@
+import csv
+import json
+
+from django.contrib.auth.models import User
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils.dateparse import parse_date
+
+from .estatisticas import intervalo_do_dia
+from .models import ComprovativoPagamento, Encomenda, Produto
+
+CHUNK_SIZE = 2000
+FORMATOS = ('csv', 'jsonl')
+
+
+def _encomendas():
+    return (
+        Encomenda.objects.select_related('usuario')
+        .prefetch_related('itens__produto')
+        .order_by('id')
+    )
+
+
+def _comprovativos():
+    return ComprovativoPagamento.objects.select_related('usuario', 'processado_por').order_by('id')
+
+
+def _clientes():
+    return User.objects.exclude(username='ivsweets').order_by('id')
+
+
+def _produtos():
+    return Produto.objects.select_related('categoria').order_by('id')
+
+
+def _registo_encomenda(encomenda):
+    return {
+        'id': encomenda.id,
+        'cliente': encomenda.usuario.username,
+        'email': encomenda.usuario.email,
+        'status': encomenda.status,
+        'total': encomenda.total,
+        'data_recepcao': encomenda.data_recepcao,
+        'created_at': encomenda.created_at,
+        'itens': [
+            {
+                'produto_id': item.produto_id,
+                'produto': item.produto.nome,
+                'quantidade': item.quantidade,
+                'preco_unitario': item.produto.preco,
+                'subtotal': item.subtotal,
+            }
+            for item in encomenda.itens.all()
+        ],
+    }
+
+
+def _registo_comprovativo(comprovativo):
+    return {
+        'id': comprovativo.id,
+        'encomenda_id': comprovativo.encomenda_id,
+        'cliente': comprovativo.usuario.username,
+        'metodo_pagamento': comprovativo.metodo_pagamento,
+        'numero_referencia': comprovativo.numero_referencia,
+        'valor': comprovativo.valor,
+        'status': comprovativo.status,
+        'enviado_em': comprovativo.enviado_em,
+        'processado_em': comprovativo.processado_em,
+        'processado_por': comprovativo.processado_por.username if comprovativo.processado_por else None,
+        'observacoes': comprovativo.observacoes,
+        'motivo_rejeicao': comprovativo.motivo_rejeicao,
+    }
+
+
+def _registo_cliente(cliente):
+    return {
+        'id': cliente.id,
+        'username': cliente.username,
+        'email': cliente.email,
+        'first_name': cliente.first_name,
+        'last_name': cliente.last_name,
+        'date_joined': cliente.date_joined,
+        'last_login': cliente.last_login,
+        'is_active': cliente.is_active,
+    }
+
+
+def _registo_produto(produto):
+    # Mesmas colunas aceites por `manage.py importar_produtos`
+    return {
+        'id': produto.id,
+        'nome': produto.nome,
+        'descricao': produto.descricao,
+        'preco': produto.preco,
+        'categoria': produto.categoria.nome,
+        'disponivel': produto.disponivel,
+        'imagem': produto.imagem.name.split('/')[-1] if produto.imagem else '',
+    }
+
+
+# tipo -> (queryset base, campo de data, aceita filtro de status, serializador)
+EXPORTACOES = {
+    'encomendas': (_encomendas, 'created_at', True, _registo_encomenda),
+    'comprovativos': (_comprovativos, 'enviado_em', True, _registo_comprovativo),
+    'clientes': (_clientes, 'date_joined', False, _registo_cliente),
+    'produtos': (_produtos, 'created_at', False, _registo_produto),
+}
+
+
+def filtrar(tipo, inicio=None, fim=None, status=None):
+    # Datas no formato YYYY-MM-DD, ambas inclusivas
+    base, campo_data, aceita_status, _ = EXPORTACOES[tipo]
+    queryset = base()
+    if inicio:
+        inicio = parse_date(inicio) if isinstance(inicio, str) else inicio
+        queryset = queryset.filter(**{f'{campo_data}__gte': intervalo_do_dia(inicio)[0]})
+    if fim:
+        fim = parse_date(fim) if isinstance(fim, str) else fim
+        queryset = queryset.filter(**{f'{campo_data}__lt': intervalo_do_dia(fim)[1]})
+    if status and aceita_status:
+        queryset = queryset.filter(status=status)
+    return queryset
+
+
+def registos(tipo, queryset, chunk_size=CHUNK_SIZE):
+    serializar = EXPORTACOES[tipo][3]
+    for objeto in queryset.iterator(chunk_size=chunk_size):
+        yield serializar(objeto)
+
+
+# Pseudo-ficheiro para o csv.writer: devolve a linha em vez de a guardar
+class _Eco:
+    def write(self, valor):
+        return valor
+
+
+def linhas_csv(dados):
+    writer = csv.writer(_Eco())
+    cabecalho = None
+    for registo in dados:
+        itens = registo.pop('itens', None)
+        if cabecalho is None:
+            cabecalho = list(registo)
+            if itens is not None:
+                cabecalho += ['item_produto_id', 'item_produto', 'item_quantidade', 'item_preco_unitario', 'item_subtotal']
+            yield writer.writerow(cabecalho)
+        valores = list(registo.values())
+        if itens is None:
+            yield writer.writerow(valores)
+            continue
+        # Uma linha por item da encomenda (linhas de encomenda)
+        for item in itens or [{}]:
+            yield writer.writerow(valores + [
+                item.get('produto_id'), item.get('produto'), item.get('quantidade'),
+                item.get('preco_unitario'), item.get('subtotal'),
+            ])
+
+
+def linhas_jsonl(dados):
+    for registo in dados:
+        yield json.dumps(registo, cls=DjangoJSONEncoder, ensure_ascii=False) + '\n'
+
+
+def exportar(tipo, formato, inicio=None, fim=None, status=None, chunk_size=CHUNK_SIZE):
+    # Gerador de linhas CSV/JSONL: os registos são lidos em blocos de `chunk_size`,
+    # por isso a memória usada não depende do tamanho da exportação
+    dados = registos(tipo, filtrar(tipo, inicio, fim, status), chunk_size)
+    if formato == 'jsonl':
+        return linhas_jsonl(dados)
+    return linhas_csv(dados)
@@ -0,0 +1,32 @@
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+
+# Sob ASGI o Django só envia aos bocados o conteúdo de um StreamingHttpResponse
+# se o iterador for async: um iterador síncrono é lido todo para memória antes do
+# primeiro byte (sync_to_async(list)). Sob WSGI é o contrário, por isso o tipo
+# de iterador escolhe-se conforme o servidor que recebeu o pedido.
+
+
+async def _em_async(partes, lote, thread_sensitive):
+    iterador = iter(partes)
+    proximas = sync_to_async(lambda: list(islice(iterador, lote)), thread_sensitive=thread_sensitive)
+    try:
+        while bloco := await proximas():
+            # Várias linhas pequenas (CSV/JSONL) num só envio; str ou bytes
+            yield bloco[0][:0].join(bloco)
+    finally:
+        if hasattr(iterador, 'close'):
+            await sync_to_async(iterador.close, thread_sensitive=thread_sensitive)()
+
+
+def conteudo(request, partes, lote=1, thread_sensitive=True):
+    """
+    Conteúdo para StreamingHttpResponse: `partes` tal como está sob WSGI, ou um
+    iterador async que lê `lote` partes de cada vez numa thread sob ASGI.
+    Com thread_sensitive=True corre na thread do pedido (a das queries).
+    """
+    if isinstance(request, ASGIRequest):
+        return _em_async(partes, lote, thread_sensitive)
+    return partes
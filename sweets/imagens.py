@@ -0,0 +1,96 @@
+import io
+import os
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps
+
+
+def _limites(max_lado=None, qualidade=None):
+    return (
+        max_lado or getattr(settings, 'IMAGEM_MAX_LADO', 1600),
+        qualidade or getattr(settings, 'IMAGEM_QUALIDADE', 78),
+    )
+
+
+def reencodar(conteudo, max_lado=None, qualidade=None):
+    # Corrige a orientação EXIF, limita a resolução e grava sem metadados.
+    # Devolve (bytes, extensão).
+    max_lado, qualidade = _limites(max_lado, qualidade)
+    with Image.open(io.BytesIO(conteudo)) as imagem:
+        # Em JPEG descodifica logo a uma escala reduzida: menos memória e CPU
+        imagem.draft('RGB', (max_lado, max_lado))
+        imagem = ImageOps.exif_transpose(imagem)
+        imagem.thumbnail((max_lado, max_lado))
+        saida = io.BytesIO()
+        tem_transparencia = imagem.mode in ('RGBA', 'LA') or (imagem.mode == 'P' and 'transparency' in imagem.info)
+        if tem_transparencia:
+            imagem.save(saida, 'PNG', optimize=True)
+            return saida.getvalue(), '.png'
+        imagem.convert('RGB').save(saida, 'JPEG', quality=qualidade, optimize=True, progressive=True)
+        return saida.getvalue(), '.jpg'
+
+
+def otimizada(conteudo, max_lado=None):
+    # Já dentro dos limites e sem metadados (ex.: re-encodada no upload): re-encodar
+    # outra vez só perderia qualidade
+    max_lado, _ = _limites(max_lado)
+    with Image.open(io.BytesIO(conteudo)) as imagem:
+        return (
+            imagem.format in ('JPEG', 'PNG')
+            and max(imagem.size) <= max_lado
+            and not imagem.getexif()
+            and 'icc_profile' not in imagem.info
+        )
+
+
+def miniatura(conteudo, lado=None):
+    # Pré-visualização pequena em JPEG. Devolve ((largura, altura) da imagem
+    # já com a orientação EXIF aplicada, bytes da miniatura).
+    lado = lado or getattr(settings, 'MINIATURA_LADO', 320)
+    with Image.open(io.BytesIO(conteudo)) as imagem:
+        largura, altura = imagem.size
+        if imagem.getexif().get(0x0112) in (5, 6, 7, 8):  # rodada 90/270 graus
+            largura, altura = altura, largura
+        imagem.draft('RGB', (lado, lado))
+        imagem = ImageOps.exif_transpose(imagem)
+        imagem.thumbnail((lado, lado))
+        if imagem.mode in ('RGBA', 'LA', 'P'):
+            imagem = imagem.convert('RGBA')
+            fundo = Image.new('RGB', imagem.size, 'white')
+            fundo.paste(imagem, mask=imagem.getchannel('A'))
+            imagem = fundo
+        saida = io.BytesIO()
+        imagem.convert('RGB').save(saida, 'JPEG', quality=70, optimize=True)
+        return (largura, altura), saida.getvalue()
+
+
+def otimizar_campo_imagem(modelo, pk, campo):
+    Modelo = apps.get_model(modelo)
+    objeto = Modelo._base_manager.filter(pk=pk).first()
+    ficheiro = getattr(objeto, campo, None) if objeto else None
+    if not ficheiro:
+        return
+    with ficheiro.open('rb') as f:
+        original = f.read()
+    try:
+        if otimizada(original):
+            return
+        conteudo, extensao = reencodar(original)
+    except (OSError, Image.DecompressionBombError):
+        return  # não é imagem (ex.: PDF no chat); fica como está
+    if len(conteudo) >= len(original):
+        return
+    nome_antigo = ficheiro.name
+    base = os.path.splitext(os.path.basename(nome_antigo))[0]
+    novo_nome = ficheiro.storage.save(
+        os.path.join(os.path.dirname(nome_antigo), base + extensao), ContentFile(conteudo)
+    )
+    # update() em vez de save(): não dispara signals nem mexe em updated_at. Só
+    # se o campo ainda tiver o ficheiro lido: se entretanto foi trocado, a versão
+    # otimizada já não serve e a imagem nova não é sobrescrita
+    if Modelo._base_manager.filter(pk=pk, **{campo: nome_antigo}).update(**{campo: novo_nome}):
+        ficheiro.storage.delete(nome_antigo)
+    else:
+        ficheiro.storage.delete(novo_nome)
@@ -0,0 +1,225 @@
+import csv
+import io
+import json
+import os
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils import timezone
+
+from . import partilha
+from .models import Categoria, Produto
+from .uploads import DESTINOS, MB, validar_ficheiro
+
+CAMPOS = ('id', 'nome', 'descricao', 'preco', 'categoria', 'disponivel', 'imagem')
+VERDADEIRO = {'1', 'true', 'sim', 's', 'yes', 'y', 'verdadeiro'}
+BATCH_SIZE = 500
+
+
+class ResultadoImportacao:
+    def __init__(self):
+        self.criados = 0
+        self.atualizados = 0
+        self.categorias_criadas = 0
+        self.imagens = 0
+        self.erros = []
+
+    def erro(self, linha, mensagem):
+        self.erros.append((linha, mensagem))
+
+    def __str__(self):
+        return (
+            f'{self.criados} criados, {self.atualizados} atualizados, '
+            f'{self.categorias_criadas} categorias novas, {self.imagens} imagens, {len(self.erros)} erros'
+        )
+
+
+def ler_linhas(ficheiro, formato=None):
+    # Aceita ficheiros em modo binário (uploads) ou texto; devolve dicts por linha
+    nome = getattr(ficheiro, 'name', '') or ''
+    formato = formato or ('jsonl' if nome.lower().endswith(('.jsonl', '.json')) else 'csv')
+    conteudo = ficheiro.read()
+    if isinstance(conteudo, bytes):
+        conteudo = conteudo.decode('utf-8-sig')
+    if formato == 'jsonl':
+        for numero, linha in enumerate(conteudo.splitlines(), start=1):
+            if linha.strip():
+                try:
+                    yield numero, json.loads(linha)
+                except ValueError as erro:
+                    yield numero, erro
+    else:
+        for numero, registo in enumerate(csv.DictReader(io.StringIO(conteudo)), start=2):
+            yield numero, registo
+
+
+def _validar(registo):
+    dados = {campo: (str(registo.get(campo)).strip() if registo.get(campo) is not None else '') for campo in CAMPOS}
+    if not dados['nome']:
+        raise ValueError('nome em falta')
+    if not dados['categoria']:
+        raise ValueError('categoria em falta')
+    try:
+        preco = Decimal(dados['preco'].replace(',', '.'))
+    except InvalidOperation:
+        raise ValueError(f"preço inválido: {dados['preco']!r}")
+    if not preco.is_finite():
+        raise ValueError(f"preço inválido: {dados['preco']!r}")
+    if preco < 0:
+        raise ValueError('preço negativo')
+    # Tem de caber no campo (max_digits/decimal_places), senão a BD recusa o lote inteiro
+    campo = Produto._meta.get_field('preco')
+    if preco >= Decimal(10) ** (campo.max_digits - campo.decimal_places):
+        raise ValueError(f"preço demasiado alto: {dados['preco']!r}")
+    dados['preco'] = preco.quantize(Decimal(1).scaleb(-campo.decimal_places))
+    dados['id'] = int(dados['id']) if dados['id'] else None
+    dados['disponivel'] = dados['disponivel'].lower() in VERDADEIRO if dados['disponivel'] else True
+    return dados
+
+
+def _guardar_imagem(nome, conteudo):
+    # Corre nas threads do pool: valida e re-encoda como um upload de produto
+    # (tipo real, resolução limitada, sem EXIF) e grava no storage
+    ficheiro = validar_ficheiro(ContentFile(conteudo, name=os.path.basename(nome)), 'produto')
+    return default_storage.save(f'produtos/{os.path.basename(ficheiro.name)}', ficheiro)
+
+
+def _descartar_imagens(nomes):
+    for nome in nomes:
+        default_storage.delete(nome)
+
+
+def _processar_imagens(arquivo_zip, nomes, workers):
+    guardadas, erros = {}, {}
+    if not nomes:
+        return guardadas, erros
+    with zipfile.ZipFile(arquivo_zip) as pacote:
+        membros = {os.path.basename(info.filename): info for info in pacote.infolist() if not info.is_dir()}
+        # Os tamanhos descomprimidos vêm do índice do zip (read() não passa deles):
+        # recusa antes de ler, para um zip pequeno não encher a memória
+        tamanho_max = DESTINOS['produto'].tamanho_max
+        restante = settings.UPLOAD_CATALOGO_TAMANHO_MAX
+        conteudos = {}
+        for nome in sorted(nomes):
+            info = membros.get(nome)
+            if info is None:
+                erros[nome] = 'imagem não encontrada no zip'
+            elif info.file_size > tamanho_max:
+                erros[nome] = f'imagem demasiado grande ({info.file_size // MB}MB)'
+            elif info.file_size > restante:
+                erros[nome] = 'imagens do zip excedem o tamanho total permitido'
+            else:
+                restante -= info.file_size
+                conteudos[nome] = pacote.read(info)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futuros = {nome: pool.submit(_guardar_imagem, nome, conteudo) for nome, conteudo in conteudos.items()}
+        for nome, futuro in futuros.items():
+            try:
+                guardadas[nome] = futuro.result()
+            except Exception as erro:
+                erros[nome] = f'imagem inválida ({erro})'
+    return guardadas, erros
+
+
+def importar_produtos(linhas, arquivo_zip=None, workers=4, dry_run=False):
+    resultado = ResultadoImportacao()
+
+    validos = []
+    for numero, registo in linhas:
+        if isinstance(registo, Exception):
+            resultado.erro(numero, f'linha inválida ({registo})')
+            continue
+        try:
+            validos.append((numero, _validar(registo)))
+        except ValueError as erro:
+            resultado.erro(numero, str(erro))
+
+    categorias = {c.nome.lower(): c for c in Categoria.objects.all()}
+    novas = {}
+    for _, dados in validos:
+        chave = dados['categoria'].lower()
+        if chave not in categorias and chave not in novas:
+            novas[chave] = Categoria(nome=dados['categoria'])
+
+    # Catálogo atual numa só query: upsert por id ou por (nome, categoria)
+    existentes = {p.id: p for p in Produto.objects.select_related('categoria')}
+    por_nome = {}
+    for produto in existentes.values():
+        por_nome.setdefault((produto.nome.lower(), produto.categoria.nome.lower()), produto.id)
+
+    imagens, erros_imagem = {}, {}
+    if arquivo_zip is not None and not dry_run:
+        imagens, erros_imagem = _processar_imagens(
+            arquivo_zip, {dados['imagem'] for _, dados in validos if dados['imagem']}, workers
+        )
+
+    agora = timezone.now()
+    criar, atualizar, vistos, substituidas = [], [], set(), []
+    for numero, dados in validos:
+        if dados['id']:
+            produto = existentes.get(dados['id'])
+            if produto is None:
+                resultado.erro(numero, f"produto #{dados['id']} não existe")
+                continue
+        else:
+            produto_id = por_nome.get((dados['nome'].lower(), dados['categoria'].lower()))
+            produto = existentes.get(produto_id) if produto_id else None
+        chave = produto.id if produto else (dados['nome'].lower(), dados['categoria'].lower())
+        if chave in vistos:
+            resultado.erro(numero, 'produto repetido no ficheiro')
+            continue
+        vistos.add(chave)
+
+        if dados['imagem'] and dados['imagem'] in erros_imagem:
+            resultado.erro(numero, f"{dados['imagem']}: {erros_imagem[dados['imagem']]}")
+
+        if produto is None:
+            produto = Produto()
+            criar.append(produto)
+        else:
+            atualizar.append(produto)
+        produto.nome = dados['nome']
+        produto.descricao = dados['descricao'] or produto.descricao or ''
+        produto.preco = dados['preco']
+        produto.disponivel = dados['disponivel']
+        produto.categoria = categorias.get(dados['categoria'].lower()) or novas[dados['categoria'].lower()]
+        produto.updated_at = agora
+        if dados['imagem'] in imagens:
+            if produto.imagem and produto.imagem.name != imagens[dados['imagem']]:
+                substituidas.append(produto.imagem.name)
+            produto.imagem = imagens[dados['imagem']]
+            resultado.imagens += 1
+
+    resultado.erros.sort()
+    if dry_run:
+        resultado.criados, resultado.atualizados, resultado.categorias_criadas = len(criar), len(atualizar), len(novas)
+        return resultado
+
+    # As imagens já estão no storage: se a importação falhar, ou se a linha da
+    # imagem deu erro, são removidas (delete() mantém as que outro registo usa)
+    try:
+        with transaction.atomic():
+            Categoria.objects.bulk_create(novas.values(), batch_size=BATCH_SIZE)
+            Produto.objects.bulk_create(criar, batch_size=BATCH_SIZE)
+            Produto.objects.bulk_update(
+                atualizar,
+                ['nome', 'descricao', 'preco', 'disponivel', 'categoria', 'imagem', 'updated_at'],
+                batch_size=BATCH_SIZE,
+            )
+    except Exception:
+        _descartar_imagens(imagens.values())
+        raise
+    _descartar_imagens(set(imagens.values()) - {produto.imagem.name for produto in criar + atualizar})
+    # As imagens que as linhas substituíram (remoção diferida, só se ficarem órfãs)
+    _descartar_imagens(set(substituidas))
+    if atualizar:
+        # bulk_update não dispara post_save: os resumos partilhados mostram os produtos
+        partilha.produtos_alterados()
+
+    resultado.criados, resultado.atualizados, resultado.categorias_criadas = len(criar), len(atualizar), len(novas)
+    return resultado
@@ -0,0 +1,53 @@
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from . import contadores
+from .models import ChatMessage, LeituraChat
+
+# As páginas de chat recarregam a cada 5 s. Em vez de um UPDATE em cada pedido,
+# cada conversa guarda a última mensagem lida (LeituraChat, com cópia na cache):
+# enquanto não chegar nada novo, ver a conversa não escreve na base de dados.
+TIMEOUT = 24 * 3600
+
+
+def _chave(leitor_id, remetente_id):
+    return f'leitura_chat:{leitor_id}:{remetente_id}'
+
+
+def ultima_lida(leitor_id, remetente_id):
+    valor = cache.get(_chave(leitor_id, remetente_id))
+    if valor is None:
+        valor = (
+            LeituraChat.objects.filter(leitor_id=leitor_id, remetente_id=remetente_id)
+            .values_list('ultima_lida', flat=True).first()
+        ) or 0
+        cache.set(_chave(leitor_id, remetente_id), valor, TIMEOUT)
+    return valor
+
+
+def marcar_lidas(leitor_id, remetente_id, ate_id):
+    """
+    Avança a marca de leitura da conversa até à mensagem `ate_id` e marca como
+    lidas (is_read) as mensagens de `remetente_id` até ela. Não escreve nada se a
+    marca já lá estiver. Devolve True se avançou.
+    """
+    if not ate_id or ate_id <= ultima_lida(leitor_id, remetente_id):
+        return False
+    with transaction.atomic():
+        # Nunca recua, mesmo com dois separadores abertos na mesma conversa
+        avancou = LeituraChat.objects.filter(
+            leitor_id=leitor_id, remetente_id=remetente_id, ultima_lida__lt=ate_id
+        ).update(ultima_lida=ate_id, atualizada_em=timezone.now())
+        if not avancou:
+            leitura, avancou = LeituraChat.objects.get_or_create(
+                leitor_id=leitor_id, remetente_id=remetente_id, defaults={'ultima_lida': ate_id}
+            )
+            ate_id = max(ate_id, leitura.ultima_lida)
+        if avancou:
+            ChatMessage.objects.filter(
+                sender_id=remetente_id, recipient_id=leitor_id, is_read=False, id__lte=ate_id
+            ).update(is_read=True)
+            contadores.invalidar('mensagens', leitor_id)
+    transaction.on_commit(lambda: cache.set(_chave(leitor_id, remetente_id), ate_id, TIMEOUT))
+    return bool(avancou)
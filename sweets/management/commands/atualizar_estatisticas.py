@@ -0,0 +1,37 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from sweets.estatisticas import atualizar_estatisticas, primeiro_dia_com_dados
+
+
+class Command(BaseCommand):
+    help = 'Recompute the daily statistics rollup used by the admin dashboard'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dias',
+            type=int,
+            default=2,
+            help='Number of most recent days to recompute (default: 2, today and yesterday)',
+        )
+        parser.add_argument(
+            '--tudo',
+            action='store_true',
+            help='Rebuild every day since the first recorded activity',
+        )
+
+    def handle(self, *args, **options):
+        hoje = timezone.localdate()
+        if options['tudo']:
+            inicio = primeiro_dia_com_dados() or hoje
+        else:
+            inicio = hoje - timedelta(days=max(options['dias'], 1) - 1)
+
+        dias = [inicio + timedelta(days=n) for n in range((hoje - inicio).days + 1)]
+        atualizar_estatisticas(dias)
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Statistics updated for {len(dias)} day(s), {inicio} to {hoje}')
+        )
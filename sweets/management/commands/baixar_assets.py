@@ -0,0 +1,146 @@
+import json
+import posixpath
+import re
+import shutil
+import urllib.request
+from pathlib import Path
+from urllib.parse import urljoin
+
+from django.apps import apps
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from sweets.assets import (
+    BOOTSTRAP, BOOTSTRAP_URL, FONT_AWESOME, FONT_AWESOME_URL, GOOGLE_FONTS_URL, ICONES_DINAMICOS, MARCADOR,
+    dinamicos_permitidos, icones_do_texto, sem_source_map, subconjunto_icones,
+)
+
+# O Google Fonts só devolve woff2 (e o CSS partido por unicode-range) a browsers recentes
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0 Safari/537.36'
+URL_CSS = re.compile(r'url\(\s*["\']?([^"\')]+)["\']?\s*\)')
+
+
+class Command(BaseCommand):
+    help = (
+        'Download the pinned Bootstrap, Font Awesome and Google Fonts files into sweets/static/vendor/ '
+        'so they are served by WhiteNoise (run before collectstatic)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--todos-icones',
+            action='store_true',
+            help='Keep every Font Awesome icon instead of only those used in the templates',
+        )
+
+    def handle(self, *args, **options):
+        app = Path(apps.get_app_config('sweets').path)
+        self.static = app / 'static'
+        self.vendor = self.static / 'vendor'
+        usados = None if options['todos_icones'] else self.icones_usados(app)
+        if self.vendor.exists():
+            shutil.rmtree(self.vendor)
+
+        try:
+            self.bootstrap()
+            icones = self.font_awesome(usados)
+            self.google_fonts()
+        except OSError as erro:
+            shutil.rmtree(self.vendor, ignore_errors=True)
+            raise CommandError(f'Download failed: {erro}')
+
+        (self.static / MARCADOR).write_text(json.dumps({
+            'bootstrap': BOOTSTRAP,
+            'font_awesome': FONT_AWESOME,
+            'icones': sorted(icones) if icones is not None else 'todos',
+        }, indent=2))
+        tamanho = sum(f.stat().st_size for f in self.vendor.rglob('*') if f.is_file())
+        self.stdout.write(self.style.SUCCESS(f'Vendor assets written to {self.vendor} ({tamanho / 1024:.0f} KB)'))
+
+    def baixar(self, url):
+        pedido = urllib.request.Request(url, headers={'User-Agent': USER_AGENT})
+        with urllib.request.urlopen(pedido, timeout=30) as resposta:
+            return resposta.read()
+
+    def gravar(self, caminho, conteudo):
+        destino = self.vendor / caminho
+        destino.parent.mkdir(parents=True, exist_ok=True)
+        if isinstance(conteudo, str):
+            conteudo = conteudo.encode()
+        destino.write_bytes(conteudo)
+        return destino
+
+    def bootstrap(self):
+        for origem, destino in (
+            ('css/bootstrap.min.css', 'bootstrap/bootstrap.min.css'),
+            ('js/bootstrap.bundle.min.js', 'bootstrap/bootstrap.bundle.min.js'),
+        ):
+            self.gravar(destino, sem_source_map(self.baixar(f'{BOOTSTRAP_URL}/{origem}').decode()))
+
+    def icones_usados(self, app):
+        pastas = [Path(p) for p in settings.TEMPLATES[0].get('DIRS', [])]
+        pastas += [Path(config.path) / 'templates' for config in apps.get_app_configs()]
+        ficheiros = [f for pasta in pastas if pasta.is_dir() for f in pasta.rglob('*.html')]
+        ficheiros += [f for f in (app / 'static' / 'sweets').rglob('*.js')]
+        permitidos = dinamicos_permitidos()
+        usados, desconhecidas = set(), []
+        for ficheiro in ficheiros:
+            icones, expressoes = icones_do_texto(ficheiro.read_text(errors='ignore'), permitidos)
+            usados.update(icones)
+            desconhecidas += [f'{ficheiro}: {expressao}' for expressao in expressoes]
+        if desconhecidas:
+            # Um ícone fora do subconjunto aparecia como um quadrado vazio
+            raise CommandError(
+                'Icon names built at runtime are missing from '
+                f'{ICONES_DINAMICOS.name} (map each one to the icons it can produce, or use --todos-icones):\n  '
+                + '\n  '.join(desconhecidas)
+            )
+        return usados
+
+    def font_awesome(self, usados):
+        url_css = f'{FONT_AWESOME_URL}/css/all.min.css'
+        css = sem_source_map(self.baixar(url_css).decode())
+        codigos = None
+        if usados is not None:
+            css, codigos = subconjunto_icones(css, usados)
+        self.gravar('fontawesome/css/all.min.css', css)
+
+        for referencia in sorted(set(URL_CSS.findall(css))):
+            if referencia.startswith('data:'):
+                continue
+            destino = self.gravar(
+                posixpath.normpath(f"fontawesome/css/{referencia.split('?')[0]}"),
+                self.baixar(urljoin(url_css, referencia)),
+            )
+            if codigos:
+                self.subconjunto_fonte(destino, codigos)
+        return usados
+
+    def subconjunto_fonte(self, caminho, codigos):
+        # Opcional: com fontTools (e brotli para woff2) as fontes ficam só com os glifos usados
+        try:
+            from fontTools import subset
+        except ImportError:
+            return
+        opcoes = subset.Options()
+        opcoes.flavor = 'woff2' if caminho.suffix == '.woff2' else None
+        opcoes.layout_features = ['*']
+        try:
+            fonte = subset.load_font(str(caminho), opcoes)
+            subsetter = subset.Subsetter(opcoes)
+            subsetter.populate(unicodes=codigos)
+            subsetter.subset(fonte)
+            subset.save_font(fonte, str(caminho), opcoes)
+        except ImportError:
+            self.stdout.write(self.style.WARNING(f'{caminho.name}: install brotli to subset woff2 fonts'))
+
+    def google_fonts(self):
+        css = self.baixar(GOOGLE_FONTS_URL).decode()
+
+        def local(m):
+            url = m.group(1)
+            nome = url.rsplit('/', 1)[-1]
+            self.gravar(f'fonts/ficheiros/{nome}', self.baixar(url))
+            return f'url(ficheiros/{nome})'
+
+        self.gravar('fonts/fonts.css', URL_CSS.sub(local, css))
@@ -0,0 +1,91 @@
+import os
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from sweets.storage import campos_de_ficheiro, nome_por_conteudo, referencias
+
+
+class Command(BaseCommand):
+    help = 'Rename media files to their content hash, merge byte-identical copies and rewrite the references'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Only report what would change')
+        parser.add_argument(
+            '--remover-orfaos',
+            action='store_true',
+            help='Also delete files that no row references (through the job queue, see MEDIA_REMOCAO_ATRASO)',
+        )
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        campos = list(campos_de_ficheiro())
+        nomes = set()
+        for modelo, campo in campos:
+            nomes.update(
+                modelo._base_manager.exclude(**{campo: ''}).exclude(**{f'{campo}__isnull': True})
+                .values_list(campo, flat=True).distinct()
+            )
+
+        renomeados = fundidos = em_falta = poupado = 0
+        finais = set()
+        for nome in sorted(nomes):
+            if not default_storage.exists(nome):
+                em_falta += 1
+                self.stdout.write(self.style.WARNING(f'{nome}: missing, skipped'))
+                continue
+            with default_storage.open(nome, 'rb') as ficheiro:
+                destino = nome_por_conteudo(nome, ficheiro)
+            if destino == nome:
+                finais.add(destino)
+                continue
+
+            # Outro ficheiro com o mesmo conteúdo já está (ou vai ficar) no nome final
+            existia = destino in finais or destino in nomes or default_storage.exists(destino)
+            finais.add(destino)
+            if existia:
+                fundidos += 1
+                poupado += default_storage.size(nome)
+            else:
+                renomeados += 1
+            if dry_run:
+                continue
+
+            if not default_storage.exists(destino):
+                with default_storage.open(nome, 'rb') as ficheiro:
+                    default_storage.save(destino, ficheiro)
+            # Primeiro as referências, depois o ficheiro antigo: nunca fica um link partido
+            with transaction.atomic():
+                for modelo, campo in campos:
+                    modelo._base_manager.filter(**{campo: nome}).update(**{campo: destino})
+            if not referencias(nome):
+                default_storage.delete(nome)
+
+        orfaos, tamanho_orfaos = self.orfaos(nomes | finais)
+        if options['remover_orfaos'] and not dry_run:
+            for nome in orfaos:
+                default_storage.delete(nome)
+
+        prefixo = 'Would rename' if dry_run else 'Renamed'
+        self.stdout.write(self.style.SUCCESS(
+            f'{prefixo} {renomeados} file(s), merged {fundidos} duplicate(s) ({poupado / 1024 / 1024:.1f} MB), '
+            f'{em_falta} missing, {len(orfaos)} orphan(s) ({tamanho_orfaos / 1024 / 1024:.1f} MB)'
+            + (' queued for removal' if options['remover_orfaos'] and not dry_run else '')
+        ))
+
+    def orfaos(self, referenciados):
+        orfaos, tamanho = [], 0
+        for nome in self.listar(''):
+            # originais/ (UPLOADS_MANTER_ORIGINAL) não é referenciado por nenhuma linha
+            if nome not in referenciados and not nome.startswith('originais/'):
+                orfaos.append(nome)
+                tamanho += default_storage.size(nome)
+        return orfaos, tamanho
+
+    def listar(self, pasta):
+        pastas, ficheiros = default_storage.listdir(pasta)
+        for ficheiro in ficheiros:
+            yield os.path.join(pasta, ficheiro) if pasta else ficheiro
+        for subpasta in pastas:
+            yield from self.listar(os.path.join(pasta, subpasta) if pasta else subpasta)
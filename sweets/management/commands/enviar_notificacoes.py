@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from sweets.notificacoes import entregar
+
+
+class Command(BaseCommand):
+    help = 'Deliver pending admin notifications in one batch over a single SMTP connection'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--forcar', action='store_true', help='Send now, even if the digest window is still open')
+
+    def handle(self, *args, **options):
+        total = entregar(forcar=options['forcar'])
+        self.stdout.write(self.style.SUCCESS(f'{total} notification(s) delivered'))
@@ -0,0 +1,50 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from sweets.exportacao import CHUNK_SIZE, EXPORTACOES, FORMATOS, exportar
+
+
+class Command(BaseCommand):
+    help = 'Stream orders, payment receipts or customers to CSV/JSONL'
+
+    def add_arguments(self, parser):
+        parser.add_argument('tipo', choices=sorted(EXPORTACOES), help='What to export')
+        parser.add_argument('--formato', choices=FORMATOS, default='csv', help='Output format (default: csv)')
+        parser.add_argument('--inicio', help='First day to include (YYYY-MM-DD)')
+        parser.add_argument('--fim', help='Last day to include (YYYY-MM-DD)')
+        parser.add_argument('--status', help='Only export rows with this status (orders and receipts)')
+        parser.add_argument('--output', '-o', help='Output file (default: stdout)')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='Rows fetched per database round-trip')
+
+    def handle(self, *args, **options):
+        for opcao in ('inicio', 'fim'):
+            valor = options[opcao]
+            try:
+                if valor and not parse_date(valor):
+                    raise ValueError
+            except ValueError:
+                raise CommandError(f'Invalid date for --{opcao}: {valor}')
+
+        linhas = exportar(
+            options['tipo'],
+            options['formato'],
+            inicio=options['inicio'],
+            fim=options['fim'],
+            status=options['status'],
+            chunk_size=options['chunk_size'],
+        )
+
+        destino = open(options['output'], 'w', encoding='utf-8', newline='') if options['output'] else sys.stdout
+        total = 0
+        try:
+            for linha in linhas:
+                destino.write(linha)
+                total += 1
+        finally:
+            if destino is not sys.stdout:
+                destino.close()
+
+        if options['output']:
+            self.stdout.write(self.style.SUCCESS(f'{total} lines written to {options["output"]}'))
@@ -1,34 +1,58 @@
-from django.core.management.base import BaseCommand
-from django.utils import timezone
 from datetime import timedelta
-from lista.models import SecureLink
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from sweets import partilha
+from sweets.models import Encomenda
+
 
 class Command(BaseCommand):
-    help = 'Generate a secure link'
+    help = (
+        'Generate signed share links for orders, one per line as "<order id> <url>". '
+        'Nothing is written to the database'
+    )
 
     def add_arguments(self, parser):
+        parser.add_argument('encomendas', nargs='*', type=int, help='Order ids')
+        parser.add_argument(
+            '--status',
+            choices=[status for status, _ in Encomenda.STATUS_CHOICES],
+            help='Generate links for every order with this status (in addition to the ids given)',
+        )
         parser.add_argument(
             '--expires',
             type=int,
-            help='Expiration time in hours (optional)',
+            help=f'Expiration time in hours (default: {settings.PARTILHA_VALIDADE_DIAS * 24}, 0 for no expiration)',
+        )
+        parser.add_argument(
+            '--base-url',
+            default=settings.SITE_URL,
+            help='Site address put before the links (default: SITE_URL)',
         )
 
     def handle(self, *args, **options):
-        expires_hours = options.get('expires')
-        expires_at = None
+        if not options['encomendas'] and not options['status']:
+            raise CommandError('Give order ids and/or --status')
 
-        if expires_hours:
-            expires_at = timezone.now() + timedelta(hours=expires_hours)
+        ids = set(Encomenda.objects.filter(id__in=options['encomendas']).values_list('id', flat=True))
+        inexistentes = set(options['encomendas']) - ids
+        if inexistentes:
+            raise CommandError(f'Order(s) not found: {", ".join(map(str, sorted(inexistentes)))}')
+        if options['status']:
+            ids.update(Encomenda.objects.filter(status=options['status']).values_list('id', flat=True))
 
-        secure_link = SecureLink.objects.create(expires_at=expires_at)
+        if options['expires'] is None:
+            expira = partilha.expiracao_padrao()
+        else:
+            expira = timezone.now() + timedelta(hours=options['expires']) if options['expires'] > 0 else None
 
-        self.stdout.write(
-            self.style.SUCCESS(f'Secure link created: {secure_link.token}')
-        )
+        base = options['base_url'].rstrip('/')
+        for encomenda_id in sorted(ids):
+            self.stdout.write(f'{encomenda_id} {base}{partilha.caminho(encomenda_id, expira)}')
 
-        if expires_at:
-            self.stdout.write(
-                f'Expires at: {expires_at}'
-            )
-        else:
-            self.stdout.write('No expiration set')
+        self.stderr.write(self.style.SUCCESS(
+            f'{len(ids)} link(s) generated, '
+            + (f'expiring at {timezone.localtime(expira):%Y-%m-%d %H:%M}' if expira else 'no expiration set')
+        ))
@@ -0,0 +1,96 @@
+from collections import Counter, defaultdict
+from itertools import combinations, groupby
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from sweets.models import Encomenda, Produto, ProdutoRecomendacao
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the precomputed product recommendations from order co-occurrence'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--limite',
+            type=int,
+            default=4,
+            help='Number of recommendations kept per product and type (default: 4)',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=2000,
+            help='Rows fetched per database round-trip while scanning order lines',
+        )
+
+    def handle(self, *args, **options):
+        limite = options['limite']
+        chunk_size = options['chunk_size']
+
+        produtos = dict(
+            Produto.objects.filter(disponivel=True).values_list('id', 'categoria_id')
+        )
+
+        # Linhas de encomenda (encomenda, produto), ordenadas por encomenda para
+        # podermos agrupar sem carregar a tabela inteira em memória.
+        linhas = (
+            Encomenda.itens.through.objects
+            .order_by('encomenda_id')
+            .values_list('encomenda_id', 'itemcarrinho__produto_id')
+            .iterator(chunk_size=chunk_size)
+        )
+
+        popularidade = Counter()
+        pares = defaultdict(Counter)
+        total_encomendas = 0
+        for _, grupo in groupby(linhas, key=lambda linha: linha[0]):
+            ids = sorted({produto_id for _, produto_id in grupo if produto_id in produtos})
+            if not ids:
+                continue
+            total_encomendas += 1
+            popularidade.update(ids)
+            for a, b in combinations(ids, 2):
+                pares[a][b] += 1
+                pares[b][a] += 1
+
+        por_categoria = defaultdict(list)
+        for produto_id, categoria_id in produtos.items():
+            por_categoria[categoria_id].append(produto_id)
+        for ids in por_categoria.values():
+            ids.sort(key=lambda produto_id: (-popularidade[produto_id], -produto_id))
+
+        recomendacoes = []
+        for produto_id, categoria_id in produtos.items():
+            for posicao, (outro_id, pontuacao) in enumerate(pares[produto_id].most_common(limite)):
+                recomendacoes.append(ProdutoRecomendacao(
+                    produto_id=produto_id,
+                    recomendado_id=outro_id,
+                    tipo='comprado_junto',
+                    posicao=posicao,
+                    pontuacao=pontuacao,
+                ))
+
+            # Relacionados: mesma categoria, primeiro os que mais saem juntos
+            # com este produto, depois os mais populares.
+            candidatos = [outro_id for outro_id in por_categoria[categoria_id] if outro_id != produto_id]
+            candidatos.sort(key=lambda outro_id: -pares[produto_id][outro_id])
+            for posicao, outro_id in enumerate(candidatos[:limite]):
+                recomendacoes.append(ProdutoRecomendacao(
+                    produto_id=produto_id,
+                    recomendado_id=outro_id,
+                    tipo='relacionado',
+                    posicao=posicao,
+                    pontuacao=pares[produto_id][outro_id] or popularidade[outro_id],
+                ))
+
+        with transaction.atomic():
+            ProdutoRecomendacao.objects.all().delete()
+            ProdutoRecomendacao.objects.bulk_create(recomendacoes, batch_size=500)
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'{len(recomendacoes)} recommendations generated for {len(produtos)} products '
+                f'from {total_encomendas} orders'
+            )
+        )
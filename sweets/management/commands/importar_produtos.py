@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from sweets.importacao import importar_produtos, ler_linhas
+
+
+class Command(BaseCommand):
+    help = 'Create or update products in bulk from a CSV/JSONL catalogue, with images from a zip'
+
+    def add_arguments(self, parser):
+        parser.add_argument('catalogo', help='CSV or JSONL file (columns: id, nome, descricao, preco, categoria, disponivel, imagem)')
+        parser.add_argument('--imagens', help='Zip file with the images referenced in the "imagem" column')
+        parser.add_argument('--formato', choices=('csv', 'jsonl'), help='Catalogue format (default: from the file extension)')
+        parser.add_argument('--workers', type=int, default=4, help='Threads used to validate and store images (default: 4)')
+        parser.add_argument('--dry-run', action='store_true', help='Validate and report without writing anything')
+
+    def handle(self, *args, **options):
+        try:
+            catalogo = open(options['catalogo'], 'rb')
+        except OSError as erro:
+            raise CommandError(f'Cannot open catalogue: {erro}')
+
+        with catalogo:
+            resultado = importar_produtos(
+                ler_linhas(catalogo, options['formato']),
+                arquivo_zip=options['imagens'],
+                workers=options['workers'],
+                dry_run=options['dry_run'],
+            )
+
+        for linha, erro in resultado.erros:
+            self.stderr.write(f'Line {linha}: {erro}')
+        self.stdout.write(self.style.SUCCESS(f'{"Dry run: " if options["dry_run"] else ""}{resultado}'))
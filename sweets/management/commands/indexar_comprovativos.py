@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from sweets.duplicados import calcular_hash
+from sweets.models import ComprovativoPagamento
+
+
+class Command(BaseCommand):
+    help = 'Compute the perceptual hash of payment receipts used to flag reused screenshots'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--todos', action='store_true', help='Recompute receipts that already have a hash')
+
+    def handle(self, *args, **options):
+        comprovativos = ComprovativoPagamento.objects.exclude(comprovativo='')
+        if not options['todos']:
+            comprovativos = comprovativos.filter(hash_imagem='')
+        ids = list(comprovativos.values_list('id', flat=True))
+        for comprovativo_id in ids:
+            calcular_hash(comprovativo_id)
+        com_hash = ComprovativoPagamento.objects.filter(id__in=ids).exclude(hash_imagem='').count()
+        self.stdout.write(self.style.SUCCESS(
+            f'Hashed {com_hash} of {len(ids)} receipt(s) (the rest are not images or are missing)'
+        ))
@@ -0,0 +1,40 @@
+import time
+
+from django.contrib.sessions.models import Session
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+
+class Command(BaseCommand):
+    help = (
+        'Delete expired sessions from the database in small batches, each in its own short '
+        'transaction, so the site can keep writing in between (unlike clearsessions, which '
+        'deletes them all in one statement)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=500, help='Sessions deleted per batch (default: 500)')
+        parser.add_argument(
+            '--pausa',
+            type=float,
+            default=0.05,
+            help='Seconds to wait between batches, leaving the write lock to the site (default: 0.05)',
+        )
+
+    def handle(self, *args, **options):
+        agora = timezone.now()
+        lote = max(options['lote'], 1)
+        apagadas = 0
+        # Mesmo com sessões em cookies ou na cache podem ficar linhas de antes da mudança
+        while True:
+            chaves = list(
+                Session.objects.filter(expire_date__lt=agora).values_list('session_key', flat=True)[:lote]
+            )
+            if not chaves:
+                break
+            apagadas += Session.objects.filter(session_key__in=chaves).delete()[0]
+            if len(chaves) < lote:
+                break
+            time.sleep(options['pausa'])
+
+        self.stdout.write(self.style.SUCCESS(f'{apagadas} expired session(s) deleted'))
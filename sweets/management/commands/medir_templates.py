@@ -0,0 +1,134 @@
+import statistics
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.template import Context, TemplateDoesNotExist, engines
+from django.template.base import Template
+from django.template.loader_tags import ExtendsNode
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+
+from sweets.aquecimento import nomes_templates
+
+URLS_PADRAO = ['/', '/catalogo/', '/sobre-nos/', '/carrinho/', '/finalizar-encomenda/', '/minhas-encomendas/']
+
+
+@contextmanager
+def capturar_renders(capturados):
+    # Guarda (nome, contexto) de cada template renderizado ao nível de topo
+    original = Template._render
+    profundidade = 0
+
+    def _render(self, context):
+        nonlocal profundidade
+        if profundidade == 0:
+            capturados.append((self.name, context.flatten()))
+        profundidade += 1
+        try:
+            return original(self, context)
+        finally:
+            profundidade -= 1
+
+    Template._render = _render
+    try:
+        yield
+    finally:
+        Template._render = original
+
+
+class Command(BaseCommand):
+    help = (
+        'Render the templates behind the given URLs with the context the views build and report '
+        'per-template compile time, render time, peak memory and queries run from the template'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('urls', nargs='*', help=f'Pages to measure (default: {" ".join(URLS_PADRAO)})')
+        parser.add_argument('--usuario', help='Username to log in as (for pages behind login or admin pages)')
+        parser.add_argument('--repeticoes', type=int, default=50, help='Renders per template (default: 50)')
+
+    def handle(self, *args, **options):
+        cliente = Client()
+        if options['usuario']:
+            usuario = User.objects.filter(username=options['usuario']).first()
+            if not usuario:
+                raise CommandError(f'User {options["usuario"]} does not exist')
+            cliente.force_login(usuario)
+
+        # Os contextos vêm de pedidos reais (GET) às views
+        capturados = []
+        with override_settings(ALLOWED_HOSTS=['*']), capturar_renders(capturados):
+            for url in options['urls'] or URLS_PADRAO:
+                resposta = cliente.get(url)
+                if resposta.status_code != 200:
+                    self.stdout.write(self.style.WARNING(f'{url}: HTTP {resposta.status_code}, skipped'))
+
+        engine = engines['django'].engine
+        do_projeto = set(nomes_templates())
+        vistos = set()
+        linhas = []
+        for nome, contexto in capturados:
+            if nome in vistos or nome not in do_projeto:
+                continue
+            vistos.add(nome)
+            template = engine.get_template(nome)
+            linhas.append((nome, self.compilar(engine, nome), *self.medir(template, contexto, options['repeticoes'])))
+
+        if not linhas:
+            raise CommandError('No project template was rendered')
+        self.stdout.write(
+            f'{"template":<45} {"compile ms":>10} {"render ms":>10} {"p95 ms":>8} {"peak KB":>8} {"queries":>7}'
+        )
+        for nome, compilar, media, p95, pico, queries in sorted(linhas, key=lambda l: -l[2]):
+            self.stdout.write(f'{nome:<45} {compilar:>10.2f} {media:>10.2f} {p95:>8.2f} {pico:>8.0f} {queries:>7}')
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(linhas)} template(s), {options["repeticoes"]} render(s) each. Compile time is what the '
+            'cached loader saves on every request after the first.'
+        ))
+
+    def compilar(self, engine, nome):
+        # Parse do template e dos que ele estende, sem passar pela cache (melhor de 5)
+        tempos = []
+        for _ in range(5):
+            inicio = time.perf_counter()
+            atual = nome
+            while atual:
+                template = self.carregar_sem_cache(engine, atual)
+                pais = template.nodelist.get_nodes_by_type(ExtendsNode)[:1]
+                atual = pais[0].parent_name.resolve(Context()) if pais and not pais[0].parent_name.filters else None
+            tempos.append((time.perf_counter() - inicio) * 1000)
+        return min(tempos)
+
+    def carregar_sem_cache(self, engine, nome):
+        for carregador in engine.template_loaders[0].loaders:
+            try:
+                return carregador.get_template(nome)
+            except TemplateDoesNotExist:
+                continue
+        raise TemplateDoesNotExist(nome)
+
+    def medir(self, template, contexto, repeticoes):
+        # A primeira renderização avalia os querysets do contexto (custo da view, não do template)
+        template.render(Context(contexto))
+
+        with CaptureQueriesContext(connection) as queries:
+            template.render(Context(contexto))
+
+        tracemalloc.start()
+        base = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        template.render(Context(contexto))
+        pico = (tracemalloc.get_traced_memory()[1] - base) / 1024
+        tracemalloc.stop()
+
+        tempos = []
+        for _ in range(max(repeticoes, 1)):
+            inicio = time.perf_counter()
+            template.render(Context(contexto))
+            tempos.append((time.perf_counter() - inicio) * 1000)
+        p95 = statistics.quantiles(tempos, n=20)[-1] if len(tempos) > 1 else tempos[0]
+        return statistics.mean(tempos), p95, pico, len(queries)
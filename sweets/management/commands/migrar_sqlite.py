@@ -0,0 +1,134 @@
+from contextlib import contextmanager
+
+from django.apps import apps
+from django.contrib.auth.management import create_permissions
+from django.contrib.contenttypes.management import create_contenttypes
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connections, transaction
+
+ORIGEM = 'sqlite_origem'
+# Tabelas que o `migrate` preenche sozinho no destino; são sempre substituídas
+# pelas da origem para manter os ids referenciados pelas outras tabelas
+GERADOS_PELO_MIGRATE = {'contenttypes.ContentType', 'auth.Permission'}
+
+
+class Command(BaseCommand):
+    help = 'Copy every row of an existing SQLite database into the configured (e.g. PostgreSQL) database'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--origem',
+            default=str(settings.BASE_DIR / 'db.sqlite3'),
+            help='SQLite file to copy from (default: db.sqlite3 in the project root)',
+        )
+        parser.add_argument('--destino', default='default', help='Target database alias (default: default)')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows read and inserted per batch')
+        parser.add_argument(
+            '--substituir',
+            action='store_true',
+            help='Delete existing rows in the target first (otherwise the target must be empty)',
+        )
+
+    def handle(self, *args, **options):
+        destino = options['destino']
+        batch_size = options['batch_size']
+        connections.databases[ORIGEM] = {
+            **connections.databases[destino],
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': options['origem'],
+            'OPTIONS': {},
+            'CONN_MAX_AGE': 0,
+        }
+        if connections[destino].vendor == 'sqlite' and str(connections[destino].settings_dict['NAME']) == options['origem']:
+            raise CommandError('Source and target are the same database.')
+
+        tabelas_origem = set(connections[ORIGEM].introspection.table_names())
+        modelos = []
+        for modelo in self.modelos():
+            if modelo._meta.db_table in tabelas_origem:
+                modelos.append(modelo)
+            else:
+                self.stdout.write(self.style.WARNING(
+                    f'{modelo._meta.label}: table missing in the source (run migrate on it first?), skipped'
+                ))
+
+        ocupados = [
+            m._meta.label for m in modelos
+            if m._meta.label not in GERADOS_PELO_MIGRATE and m._base_manager.using(destino).exists()
+        ]
+        if ocupados and not options['substituir']:
+            raise CommandError(
+                f'Target database is not empty ({", ".join(ocupados[:5])}...). Use --substituir to replace its data.'
+            )
+
+        # Num único bloco atómico: as FKs (DEFERRABLE no PostgreSQL, verificadas
+        # no commit no SQLite) só são validadas no fim, por isso a ordem não importa.
+        # Os dados antigos saem com o SQL de flush do backend (TRUNCATE no
+        # PostgreSQL), não com delete() do ORM: sem post_delete (estatísticas,
+        # remoção de ficheiros, ...) para linhas que vão ser substituídas.
+        with transaction.atomic(using=destino):
+            tabelas = [modelo._meta.db_table for modelo in modelos]
+            with connections[destino].cursor() as cursor:
+                for sql in connections[destino].ops.sql_flush(no_style(), tabelas):
+                    cursor.execute(sql)
+            for modelo in modelos:
+                total = self.copiar(modelo, destino, batch_size)
+                self.stdout.write(f'{modelo._meta.label}: {total} rows')
+
+        with connections[destino].cursor() as cursor:
+            for sql in connections[destino].ops.sequence_reset_sql(no_style(), modelos):
+                cursor.execute(sql)
+
+        # Recria content types/permissões de modelos que não existiam na origem
+        for app_config in apps.get_app_configs():
+            create_contenttypes(app_config, verbosity=0, using=destino)
+            create_permissions(app_config, verbosity=0, using=destino)
+
+        connections[ORIGEM].close()
+        self.stdout.write(self.style.SUCCESS(f'Copied {len(modelos)} tables from {options["origem"]}'))
+
+    def modelos(self):
+        modelos = []
+        for modelo in apps.get_models():
+            if not modelo._meta.managed or modelo._meta.proxy:
+                continue
+            modelos.append(modelo)
+            for campo in modelo._meta.local_many_to_many:
+                through = campo.remote_field.through
+                if through._meta.auto_created and through not in modelos:
+                    modelos.append(through)
+        return modelos
+
+    def copiar(self, modelo, destino, batch_size):
+        gestor = modelo._base_manager.using(destino)
+        total = 0
+        lote = []
+        with datas_originais(modelo):
+            for objeto in modelo._base_manager.using(ORIGEM).order_by('pk').iterator(chunk_size=batch_size):
+                lote.append(objeto)
+                if len(lote) >= batch_size:
+                    total += len(gestor.bulk_create(lote, batch_size=batch_size))
+                    lote = []
+            if lote:
+                total += len(gestor.bulk_create(lote, batch_size=batch_size))
+        return total
+
+
+@contextmanager
+def datas_originais(modelo):
+    # bulk_create mantém os ids, mas chama pre_save(): sem isto auto_now/auto_now_add
+    # reescreviam as datas originais com a hora da cópia
+    campos = [
+        campo for campo in modelo._meta.concrete_fields
+        if getattr(campo, 'auto_now', False) or getattr(campo, 'auto_now_add', False)
+    ]
+    estado = [(campo, campo.auto_now, campo.auto_now_add) for campo in campos]
+    for campo in campos:
+        campo.auto_now = campo.auto_now_add = False
+    try:
+        yield
+    finally:
+        for campo, auto_now, auto_now_add in estado:
+            campo.auto_now, campo.auto_now_add = auto_now, auto_now_add
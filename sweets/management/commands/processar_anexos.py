@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from sweets.anexos import processar_anexo
+from sweets.models import ChatMessage
+
+
+class Command(BaseCommand):
+    help = 'Store type, size and dimensions of chat attachments and generate image previews'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--todos', action='store_true', help='Also redo attachments that were already processed')
+
+    def handle(self, *args, **options):
+        mensagens = ChatMessage.objects.exclude(attachment='').exclude(attachment__isnull=True)
+        if not options['todos']:
+            mensagens = mensagens.filter(attachment_type='')
+        ids = list(mensagens.values_list('id', flat=True))
+        for mensagem_id in ids:
+            processar_anexo(mensagem_id)
+        com_preview = ChatMessage.objects.filter(id__in=ids, attachment_preview__gt='').count()
+        self.stdout.write(self.style.SUCCESS(
+            f'Processed {len(ids)} attachment(s), {com_preview} with an image preview'
+        ))
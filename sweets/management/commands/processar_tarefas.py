@@ -0,0 +1,39 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+
+from sweets.tarefas import processar_pendentes
+
+
+class Command(BaseCommand):
+    help = 'Run queued background jobs (emails, image processing, ...)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--uma-vez', action='store_true', help='Process the jobs that are due and exit')
+        parser.add_argument('--intervalo', type=float, default=2.0, help='Seconds to sleep when the queue is empty')
+        parser.add_argument('--lote', type=int, default=20, help='Jobs reserved per round')
+        parser.add_argument(
+            '--exigir-bd-partilhada',
+            action='store_true',
+            help='Stay idle instead of running jobs when the database is SQLite (a separate worker '
+                 'service would only see its own copy; the web service runs the queue then)',
+        )
+
+    def handle(self, *args, **options):
+        if options['exigir_bd_partilhada'] and connection.vendor == 'sqlite':
+            self.stderr.write(self.style.WARNING(
+                'DATABASE_URL is not set: this worker cannot see the web database, so it stays idle. '
+                'The web service processes the queue itself (TAREFAS_NO_WEB).'
+            ))
+            while True:
+                time.sleep(3600)
+        while True:
+            close_old_connections()
+            total, falhas = processar_pendentes(options['lote'])
+            if total:
+                self.stdout.write(f'{total} job(s) run, {falhas} failed')
+            if options['uma_vez']:
+                break
+            if total < options['lote']:
+                time.sleep(options['intervalo'])
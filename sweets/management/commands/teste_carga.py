@@ -0,0 +1,134 @@
+import asyncio
+import secrets
+import socket
+import ssl
+import statistics
+import time
+from importlib import import_module
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.contrib.auth.models import User
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+
+from sweets.models import ChatMessage
+
+
+class Command(BaseCommand):
+    help = (
+        'Load test the chat upload endpoint of a running server with slow concurrent uploads '
+        '(mobile-like bandwidth). Run it against `gunicorn -c gunicorn.conf.py` once with '
+        'GUNICORN_MODO=gthread and once with GUNICORN_MODO=asgi to compare. The server must use '
+        'the same database as this command.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('url', nargs='?', default='http://127.0.0.1:8000', help='Server base URL')
+        parser.add_argument('--usuario', required=True, help='Existing (non-admin) user that sends the messages')
+        parser.add_argument('--pedidos', type=int, default=100, help='Total requests (default: 100)')
+        parser.add_argument('--concorrencia', type=int, default=30, help='Simultaneous uploads (default: 30)')
+        parser.add_argument('--tamanho-kb', type=int, default=1536, help='Attachment size in KB (default: 1536)')
+        parser.add_argument('--kbps', type=int, default=512, help='Upload speed per connection in KB/s (default: 512)')
+        parser.add_argument('--manter', action='store_true', help='Keep the chat messages created by the test')
+
+    def handle(self, *args, **options):
+        usuario = User.objects.filter(username=options['usuario']).first()
+        if not usuario:
+            raise CommandError(f'User {options["usuario"]} does not exist')
+        url = urlsplit(options['url'])
+        if url.scheme not in ('http', 'https'):
+            raise CommandError('URL must start with http:// or https://')
+
+        # Sessão autenticada e token CSRF criados diretamente, sem passar pelo login
+        sessao = import_module(settings.SESSION_ENGINE).SessionStore()
+        sessao[SESSION_KEY] = str(usuario.pk)
+        sessao[BACKEND_SESSION_KEY] = 'django.contrib.auth.backends.ModelBackend'
+        sessao[HASH_SESSION_KEY] = usuario.get_session_auth_hash()
+        sessao.save()
+        self.csrf = secrets.token_hex(16)
+        self.cookies = f'{settings.SESSION_COOKIE_NAME}={sessao.session_key}; {settings.CSRF_COOKIE_NAME}={self.csrf}'
+        self.url = url
+        self.corpo, self.fronteira = self.multipart(options['tamanho_kb'] * 1024)
+        ultima_mensagem = ChatMessage.objects.order_by('-id').values_list('id', flat=True).first() or 0
+
+        try:
+            inicio = time.perf_counter()
+            resultados = asyncio.run(self.carga(options))
+            duracao = time.perf_counter() - inicio
+        finally:
+            sessao.delete()
+            if not options['manter']:
+                criadas = ChatMessage.objects.filter(sender=usuario, id__gt=ultima_mensagem)
+                anexos = set(criadas.exclude(attachment='').values_list('attachment', flat=True))
+                criadas.delete()
+                for nome in anexos:
+                    default_storage.delete(nome)  # só apaga se nenhuma linha o referir
+
+        tempos = sorted(t for ok, t in resultados if ok)
+        erros = len(resultados) - len(tempos)
+        if not tempos:
+            raise CommandError(f'All {erros} request(s) failed')
+        self.stdout.write(
+            f'{len(resultados)} request(s) in {duracao:.1f}s ({len(tempos) / duracao:.1f} req/s), {erros} error(s)\n'
+            f'latency p50 {statistics.median(tempos):.2f}s, '
+            f'p95 {tempos[int(len(tempos) * 0.95) - 1 if len(tempos) > 1 else 0]:.2f}s, max {tempos[-1]:.2f}s\n'
+            f'an upload alone takes {options["tamanho_kb"] / options["kbps"]:.2f}s at {options["kbps"]} KB/s'
+        )
+
+    def multipart(self, tamanho):
+        fronteira = secrets.token_hex(12)
+        conteudo = secrets.token_bytes(tamanho)  # o mesmo em todos: o storage guarda-o uma vez
+        corpo = (
+            f'--{fronteira}\r\nContent-Disposition: form-data; name="message"\r\n\r\nteste de carga\r\n'
+            f'--{fronteira}\r\nContent-Disposition: form-data; name="attachment"; filename="carga.bin"\r\n'
+            f'Content-Type: application/octet-stream\r\n\r\n'
+        ).encode() + conteudo + f'\r\n--{fronteira}--\r\n'.encode()
+        return corpo, fronteira
+
+    async def carga(self, options):
+        semaforo = asyncio.Semaphore(options['concorrencia'])
+
+        async def um_pedido():
+            async with semaforo:
+                return await self.pedido(options['kbps'] * 1024)
+
+        return await asyncio.gather(*(um_pedido() for _ in range(options['pedidos'])))
+
+    async def pedido(self, bytes_por_segundo):
+        porta = self.url.port or (443 if self.url.scheme == 'https' else 80)
+        contexto = ssl.create_default_context() if self.url.scheme == 'https' else None
+        inicio = time.perf_counter()
+        try:
+            # Buffer de envio pequeno: como num telemóvel, os dados saem à velocidade da
+            # rede em vez de ficarem todos no kernel à espera que o servidor os leia
+            ligacao = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            ligacao.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 16 * 1024)
+            ligacao.setblocking(False)
+            await asyncio.get_running_loop().sock_connect(ligacao, (self.url.hostname, porta))
+            leitor, escritor = await asyncio.open_connection(
+                sock=ligacao, ssl=contexto, server_hostname=self.url.hostname if contexto else None
+            )
+            escritor.write((
+                f'POST /chat/send/ HTTP/1.1\r\n'
+                f'Host: {self.url.netloc}\r\n'
+                f'Content-Type: multipart/form-data; boundary={self.fronteira}\r\n'
+                f'Content-Length: {len(self.corpo)}\r\n'
+                f'Cookie: {self.cookies}\r\n'
+                f'X-CSRFToken: {self.csrf}\r\n'
+                f'Referer: {self.url.scheme}://{self.url.netloc}/chat/\r\n'
+                f'Connection: close\r\n\r\n'
+            ).encode())
+            # Envia o corpo aos bocados de 1/10 s, à velocidade pedida
+            bloco = max(bytes_por_segundo // 10, 1024)
+            for posicao in range(0, len(self.corpo), bloco):
+                escritor.write(self.corpo[posicao:posicao + bloco])
+                await escritor.drain()
+                await asyncio.sleep(bloco / bytes_por_segundo)
+            resposta = await leitor.read()
+            escritor.close()
+        except OSError:
+            return False, time.perf_counter() - inicio
+        ok = resposta.startswith(b'HTTP/1.1 200') and b'"success": true' in resposta
+        return ok, time.perf_counter() - inicio
@@ -0,0 +1,223 @@
+import mimetypes
+import os
+import re
+import stat
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation, SuspiciousOperation
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.db.models import Q
+from django.http import Http404, HttpResponse, HttpResponseNotModified, HttpResponseRedirect, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.http import content_disposition_header, http_date, parse_http_date_safe, quote_etag
+from django.views.decorators.http import require_safe
+
+from .fluxo import conteudo
+from .models import ChatMessage, ComprovativoPagamento, Encomenda
+
+BLOCO = 64 * 1024
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def e_admin(user):
+    return user.is_authenticated and user.username == 'ivsweets'
+
+
+def _pode_ver_comprovativo(user, caminho):
+    return ComprovativoPagamento.objects.filter(comprovativo=caminho, usuario=user).exists()
+
+
+def _pode_ver_anexo(user, caminho):
+    return ChatMessage.objects.filter(
+        Q(sender=user) | Q(recipient=user), Q(attachment=caminho) | Q(attachment_preview=caminho)
+    ).exists()
+
+
+def _pode_ver_referencia(user, caminho):
+    return Encomenda.objects.filter(
+        Q(imagem_referencia_1=caminho) | Q(imagem_referencia_2=caminho), usuario=user
+    ).exists()
+
+
+def _pode_ver_original(user, caminho):
+    # originais/<ficheiro derivado>/<original> (sweets.uploads.validar_ficheiro):
+    # quem pode ver o ficheiro re-encodado pode ver o original; os das pastas
+    # públicas (produtos) só o admin
+    derivado = os.path.dirname(caminho[len('originais/'):])
+    verificar = protegido(derivado)
+    return verificar is not None and verificar is not _pode_ver_original and verificar(user, derivado)
+
+
+# Pastas privadas: só o dono (ou o admin) pode descarregar
+PROTEGIDOS = {
+    'comprovativos/': _pode_ver_comprovativo,
+    'chat_attachments/': _pode_ver_anexo,
+    'encomendas/referencias/': _pode_ver_referencia,
+    'originais/': _pode_ver_original,
+}
+
+# Tipos que o browser pode abrir na página; o resto (HTML, SVG, ...) é sempre
+# descarregado, senão um anexo com <script> correria na origem do site
+INLINE = ('image/jpeg', 'image/png', 'image/gif', 'image/webp', 'application/pdf')
+
+
+def protegido(caminho):
+    for prefixo, verificar in PROTEGIDOS.items():
+        if caminho.startswith(prefixo):
+            return verificar
+    return None
+
+
+def etag_para(estado):
+    # ETag forte: muda sempre que o ficheiro é reescrito (tamanho/mtime/inode)
+    return quote_etag(f'{estado.st_ino:x}-{estado.st_size:x}-{estado.st_mtime_ns:x}')
+
+
+def imutavel(caminho):
+    # Ficheiros cujo nome é o hash do conteúdo nunca mudam
+    padrao = getattr(settings, 'MEDIA_IMMUTABLE_PATTERN', r'(^|/)[0-9a-f]{32,64}(\.\w+)?$')
+    return bool(re.search(padrao, caminho))
+
+
+def _ler(caminho_absoluto, inicio, tamanho):
+    with open(caminho_absoluto, 'rb') as ficheiro:
+        ficheiro.seek(inicio)
+        restante = tamanho
+        while restante > 0:
+            bloco = ficheiro.read(min(BLOCO, restante))
+            if not bloco:
+                break
+            restante -= len(bloco)
+            yield bloco
+
+
+def _intervalo(cabecalho, tamanho):
+    # Só um intervalo (o que browsers e players de vídeo pedem); outros casos -> ficheiro inteiro
+    correspondencia = RANGE_RE.match(cabecalho.replace(' ', ''))
+    if not correspondencia:
+        return None
+    inicio, fim = correspondencia.groups()
+    if inicio == '' and fim == '':
+        return None
+    if inicio == '':
+        sufixo = int(fim)
+        if sufixo == 0:
+            return False
+        inicio, fim = max(tamanho - sufixo, 0), tamanho - 1
+    else:
+        inicio, fim = int(inicio), int(fim) if fim else tamanho - 1
+        fim = min(fim, tamanho - 1)
+    if inicio > fim or inicio >= tamanho:
+        return False
+    return inicio, fim
+
+
+def _autorizar(request, caminho):
+    verificar = protegido(caminho)
+    if verificar and not e_admin(request.user):
+        if not request.user.is_authenticated or not verificar(request.user, caminho):
+            raise Http404  # não revela a existência do ficheiro
+    return verificar
+
+
+def _redirecionar_storage(request, caminho):
+    # Uploads num bucket (MEDIA_STORAGE=s3): links antigos /media/... continuam
+    # a funcionar, redirecionando para o URL pré-assinado depois de validar o acesso
+    _autorizar(request, caminho)
+    try:
+        url = default_storage.url(caminho)
+    except SuspiciousOperation:
+        raise Http404
+    resposta = HttpResponseRedirect(url)
+    resposta['Cache-Control'] = 'private, no-store'
+    return resposta
+
+
+@require_safe
+def servir_media(request, caminho):
+    caminho = caminho.lstrip('/')
+    if not isinstance(default_storage, FileSystemStorage):
+        return _redirecionar_storage(request, caminho)
+    try:
+        caminho_absoluto = safe_join(settings.MEDIA_ROOT, caminho)
+        estado = os.stat(caminho_absoluto)
+    except (SuspiciousFileOperation, ValueError, OSError):
+        raise Http404
+    if not stat.S_ISREG(estado.st_mode):
+        raise Http404
+
+    verificar = _autorizar(request, caminho)
+
+    etag = etag_para(estado)
+    ultima_modificacao = http_date(estado.st_mtime)
+    if verificar:
+        cache_control = 'private, no-cache'
+    elif imutavel(caminho):
+        cache_control = 'public, max-age=31536000, immutable'
+    else:
+        cache_control = f"public, max-age={getattr(settings, 'MEDIA_CACHE_MAX_AGE', 86400)}"
+
+    content_type, encoding = mimetypes.guess_type(caminho_absoluto)
+    content_type = content_type or 'application/octet-stream'
+
+    def cabecalhos(resposta):
+        resposta['ETag'] = etag
+        resposta['Last-Modified'] = ultima_modificacao
+        resposta['Cache-Control'] = cache_control
+        resposta['Accept-Ranges'] = 'bytes'
+        resposta['X-Content-Type-Options'] = 'nosniff'
+        if content_type not in INLINE:
+            resposta['Content-Disposition'] = content_disposition_header(True, os.path.basename(caminho))
+        if verificar:
+            # Enviados pelos clientes: nunca correm scripts nem acedem à sessão
+            resposta['Vary'] = 'Cookie'
+            resposta['Content-Security-Policy'] = 'sandbox'
+        return resposta
+
+    if_none_match = request.headers.get('If-None-Match')
+    if if_none_match:
+        if etag in [t.strip() for t in if_none_match.split(',')] or if_none_match.strip() == '*':
+            return cabecalhos(HttpResponseNotModified())
+    else:
+        desde = parse_http_date_safe(request.headers.get('If-Modified-Since', ''))
+        if desde is not None and int(estado.st_mtime) <= desde:
+            return cabecalhos(HttpResponseNotModified())
+
+    # Descarregar o envio para o proxy (nginx/Apache) depois de validar o acesso
+    acelerador = getattr(settings, 'MEDIA_ACCEL', '')
+    if acelerador:
+        resposta = HttpResponse(content_type=content_type)
+        if acelerador == 'nginx':
+            resposta['X-Accel-Redirect'] = settings.MEDIA_ACCEL_PREFIX.rstrip('/') + '/' + caminho
+        else:
+            resposta['X-Sendfile'] = caminho_absoluto
+        return cabecalhos(resposta)
+
+    tamanho = estado.st_size
+    intervalo = None
+    if 'Range' in request.headers:
+        if_range = request.headers.get('If-Range')
+        if not if_range or if_range.strip() in (etag, ultima_modificacao):
+            intervalo = _intervalo(request.headers['Range'], tamanho)
+    if intervalo is False:
+        resposta = HttpResponse(status=416)
+        resposta['Content-Range'] = f'bytes */{tamanho}'
+        return cabecalhos(resposta)
+
+    if intervalo:
+        inicio, fim = intervalo
+        resposta = StreamingHttpResponse(
+            conteudo(request, _ler(caminho_absoluto, inicio, fim - inicio + 1), thread_sensitive=False),
+            status=206, content_type=content_type)
+        resposta['Content-Range'] = f'bytes {inicio}-{fim}/{tamanho}'
+        resposta['Content-Length'] = str(fim - inicio + 1)
+    else:
+        resposta = StreamingHttpResponse(
+            conteudo(request, _ler(caminho_absoluto, 0, tamanho), thread_sensitive=False), content_type=content_type
+        )
+        resposta['Content-Length'] = str(tamanho)
+    if encoding:
+        resposta['Content-Encoding'] = encoding
+    if request.method == 'HEAD':
+        resposta.streaming_content = conteudo(request, [])
+    return cabecalhos(resposta)
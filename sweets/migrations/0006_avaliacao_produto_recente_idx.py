@@ -0,0 +1,19 @@
+# Generated by Django 5.2.6 on 2026-10-19 16:54
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sweets', '0005_chatmessage_attachment_alter_chatmessage_message'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='avaliacao',
+            index=models.Index(fields=['produto', '-criado_em', '-id'], name='avaliacao_produto_recente_idx'),
+        ),
+    ]
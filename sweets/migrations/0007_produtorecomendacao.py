@@ -0,0 +1,32 @@
+# Generated by Django 5.2.6 on 2026-10-19 16:55
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sweets', '0006_avaliacao_produto_recente_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProdutoRecomendacao',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('comprado_junto', 'Frequentemente comprados juntos'), ('relacionado', 'Relacionado')], max_length=20, verbose_name='Tipo')),
+                ('posicao', models.PositiveSmallIntegerField(verbose_name='Posição')),
+                ('pontuacao', models.PositiveIntegerField(default=0, verbose_name='Pontuação')),
+                ('gerado_em', models.DateTimeField(auto_now_add=True, verbose_name='Gerado em')),
+                ('produto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recomendacoes', to='sweets.produto', verbose_name='Produto')),
+                ('recomendado', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='sweets.produto', verbose_name='Produto Recomendado')),
+            ],
+            options={
+                'verbose_name': 'Recomendação de Produto',
+                'verbose_name_plural': 'Recomendações de Produtos',
+                'ordering': ['tipo', 'posicao'],
+                'indexes': [models.Index(fields=['produto', 'tipo', 'posicao'], name='recomendacao_produto_idx')],
+            },
+        ),
+    ]
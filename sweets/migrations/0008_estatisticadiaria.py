@@ -0,0 +1,51 @@
+# Generated by Django 5.2.6 on 2026-10-19 16:57
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sweets', '0007_produtorecomendacao'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EstatisticaDiaria',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data', models.DateField(unique=True, verbose_name='Data')),
+                ('encomendas', models.PositiveIntegerField(default=0, verbose_name='Encomendas')),
+                ('encomendas_por_status', models.JSONField(blank=True, default=dict, verbose_name='Encomendas por Status')),
+                ('receita', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='Receita')),
+                ('comprovativos_aprovados', models.PositiveIntegerField(default=0, verbose_name='Comprovativos Aprovados')),
+                ('novos_clientes', models.PositiveIntegerField(default=0, verbose_name='Novos Clientes')),
+                ('avaliacoes', models.PositiveIntegerField(default=0, verbose_name='Avaliações')),
+                ('reclamacoes', models.PositiveIntegerField(default=0, verbose_name='Reclamações')),
+                ('atualizado_em', models.DateTimeField(auto_now=True, verbose_name='Atualizado em')),
+            ],
+            options={
+                'verbose_name': 'Estatística Diária',
+                'verbose_name_plural': 'Estatísticas Diárias',
+                'ordering': ['data'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='avaliacao',
+            index=models.Index(fields=['criado_em'], name='avaliacao_criado_em_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='comprovativopagamento',
+            index=models.Index(fields=['status', 'processado_em'], name='comprovativo_status_proc_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='encomenda',
+            index=models.Index(fields=['created_at'], name='encomenda_created_at_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reclamacao',
+            index=models.Index(fields=['created_at'], name='reclamacao_created_at_idx'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.6 on 2026-10-19 17:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sweets', '0009_tarefa'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificacaoAdmin',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('comprovativo', 'Comprovativo de Pagamento'), ('reclamacao', 'Reclamação'), ('mensagem', 'Mensagem de Chat')], max_length=20, verbose_name='Tipo')),
+                ('titulo', models.CharField(max_length=200, verbose_name='Título')),
+                ('mensagem', models.TextField(blank=True, verbose_name='Mensagem')),
+                ('link', models.CharField(blank=True, max_length=300, verbose_name='Link')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Criado em')),
+                ('enviada_em', models.DateTimeField(blank=True, null=True, verbose_name='Enviada em')),
+            ],
+            options={
+                'verbose_name': 'Notificação do Admin',
+                'verbose_name_plural': 'Notificações do Admin',
+                'ordering': ['created_at'],
+                'indexes': [models.Index(fields=['enviada_em', 'created_at'], name='notificacao_pendente_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 5.2.6 on 2026-10-19 17:13
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sweets', '0010_notificacaoadmin'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comprovativopagamento',
+            name='hash_bloco_0',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='comprovativopagamento',
+            name='hash_bloco_1',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='comprovativopagamento',
+            name='hash_bloco_2',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='comprovativopagamento',
+            name='hash_bloco_3',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='comprovativopagamento',
+            name='hash_imagem',
+            field=models.CharField(blank=True, default='', max_length=16, verbose_name='Hash da imagem'),
+        ),
+        migrations.AddIndex(
+            model_name='comprovativopagamento',
+            index=models.Index(fields=['metodo_pagamento', 'numero_referencia'], name='comprovativo_referencia_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='comprovativopagamento',
+            index=models.Index(fields=['hash_bloco_0'], name='comprovativo_hash_bloco0_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='comprovativopagamento',
+            index=models.Index(fields=['hash_bloco_1'], name='comprovativo_hash_bloco1_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='comprovativopagamento',
+            index=models.Index(fields=['hash_bloco_2'], name='comprovativo_hash_bloco2_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='comprovativopagamento',
+            index=models.Index(fields=['hash_bloco_3'], name='comprovativo_hash_bloco3_idx'),
+        ),
+    ]
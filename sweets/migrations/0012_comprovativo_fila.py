@@ -0,0 +1,24 @@
+# Generated by Django 5.2.6 on 2026-10-19 17:15
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sweets', '0011_comprovativo_duplicados'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comprovativopagamento',
+            name='motivo_rejeicao',
+            field=models.TextField(blank=True, default='', verbose_name='Motivo da Rejeição'),
+        ),
+        migrations.AddIndex(
+            model_name='comprovativopagamento',
+            index=models.Index(fields=['status', 'enviado_em'], name='comprovativo_fila_idx'),
+        ),
+    ]
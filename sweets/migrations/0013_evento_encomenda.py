@@ -0,0 +1,53 @@
+# Generated by Django 5.2.6 on 2026-10-19 17:17
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sweets', '0012_comprovativo_fila'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EventoEncomenda',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status_anterior', models.CharField(blank=True, choices=[('pendente', 'Pendente'), ('confirmada', 'Confirmada'), ('em_preparo', 'Em Preparo'), ('pronta', 'Pronta'), ('entregue', 'Entregue'), ('cancelada', 'Cancelada')], max_length=20, verbose_name='Status Anterior')),
+                ('status_novo', models.CharField(choices=[('pendente', 'Pendente'), ('confirmada', 'Confirmada'), ('em_preparo', 'Em Preparo'), ('pronta', 'Pronta'), ('entregue', 'Entregue'), ('cancelada', 'Cancelada')], max_length=20, verbose_name='Novo Status')),
+                ('nota', models.CharField(blank=True, max_length=200, verbose_name='Nota')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Criado em')),
+            ],
+            options={
+                'verbose_name': 'Evento de Encomenda',
+                'verbose_name_plural': 'Eventos de Encomenda',
+                'ordering': ['created_at', 'id'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='encomenda',
+            index=models.Index(fields=['status', 'data_recepcao'], name='encomenda_status_recepcao_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='encomenda',
+            index=models.Index(fields=['usuario', '-created_at'], name='encomenda_usuario_recente_idx'),
+        ),
+        migrations.AddField(
+            model_name='eventoencomenda',
+            name='autor',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Autor'),
+        ),
+        migrations.AddField(
+            model_name='eventoencomenda',
+            name='encomenda',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='eventos', to='sweets.encomenda', verbose_name='Encomenda'),
+        ),
+        migrations.AddIndex(
+            model_name='eventoencomenda',
+            index=models.Index(fields=['encomenda', 'created_at'], name='evento_encomenda_idx'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.6 on 2026-10-19 17:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sweets', '0013_evento_encomenda'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chatmessage',
+            name='attachment_height',
+            field=models.PositiveIntegerField(blank=True, null=True, verbose_name='Altura'),
+        ),
+        migrations.AddField(
+            model_name='chatmessage',
+            name='attachment_preview',
+            field=models.ImageField(blank=True, null=True, upload_to='chat_attachments/previews/', verbose_name='Pré-visualização'),
+        ),
+        migrations.AddField(
+            model_name='chatmessage',
+            name='attachment_size',
+            field=models.PositiveIntegerField(blank=True, null=True, verbose_name='Tamanho do anexo'),
+        ),
+        migrations.AddField(
+            model_name='chatmessage',
+            name='attachment_type',
+            field=models.CharField(blank=True, default='', max_length=100, verbose_name='Tipo do anexo'),
+        ),
+        migrations.AddField(
+            model_name='chatmessage',
+            name='attachment_width',
+            field=models.PositiveIntegerField(blank=True, null=True, verbose_name='Largura'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.6 on 2026-10-19 17:44
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sweets', '0014_chat_anexo_metadados'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeituraChat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ultima_lida', models.BigIntegerField(default=0, verbose_name='Última mensagem lida')),
+                ('atualizada_em', models.DateTimeField(auto_now=True, verbose_name='Atualizada em')),
+                ('leitor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='leituras_chat', to=settings.AUTH_USER_MODEL, verbose_name='Leitor')),
+                ('remetente', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Remetente')),
+            ],
+            options={
+                'verbose_name': 'Leitura de Chat',
+                'verbose_name_plural': 'Leituras de Chat',
+                'constraints': [models.UniqueConstraint(fields=('leitor', 'remetente'), name='leitura_chat_conversa_unica')],
+            },
+        ),
+    ]
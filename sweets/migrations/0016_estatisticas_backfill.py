@@ -0,0 +1,63 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import migrations
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+
+def preencher_estatisticas(apps, schema_editor):
+    # O painel lê só EstatisticaDiaria: preenche-a a partir do histórico que já
+    # existia antes da 0008 (uma query agrupada por dia em cada tabela).
+    EstatisticaDiaria = apps.get_model('sweets', 'EstatisticaDiaria')
+    Encomenda = apps.get_model('sweets', 'Encomenda')
+    ComprovativoPagamento = apps.get_model('sweets', 'ComprovativoPagamento')
+    Avaliacao = apps.get_model('sweets', 'Avaliacao')
+    Reclamacao = apps.get_model('sweets', 'Reclamacao')
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    fuso = timezone.get_current_timezone()
+
+    dias = defaultdict(lambda: {
+        'encomendas': 0, 'encomendas_por_status': {}, 'receita': Decimal('0'),
+        'comprovativos_aprovados': 0, 'novos_clientes': 0, 'avaliacoes': 0, 'reclamacoes': 0,
+    })
+    for dia, status, total in (
+        Encomenda.objects.annotate(dia=TruncDate('created_at', tzinfo=fuso))
+        .values_list('dia', 'status').annotate(total=Count('id')).order_by()
+    ):
+        dias[dia]['encomendas'] += total
+        dias[dia]['encomendas_por_status'][status] = total
+    for dia, receita, total in (
+        ComprovativoPagamento.objects.filter(status='aprovado').exclude(processado_em=None)
+        .annotate(dia=TruncDate('processado_em', tzinfo=fuso))
+        .values_list('dia').annotate(receita=Sum('valor'), total=Count('id')).order_by()
+    ):
+        dias[dia]['receita'] = receita or Decimal('0')
+        dias[dia]['comprovativos_aprovados'] = total
+    for campo, queryset, data in (
+        ('novos_clientes', User.objects.exclude(username='ivsweets'), 'date_joined'),
+        ('avaliacoes', Avaliacao.objects.all(), 'criado_em'),
+        ('reclamacoes', Reclamacao.objects.all(), 'created_at'),
+    ):
+        for dia, total in (
+            queryset.annotate(dia=TruncDate(data, tzinfo=fuso))
+            .values_list('dia').annotate(total=Count('id')).order_by()
+        ):
+            dias[dia][campo] = total
+
+    for dia, valores in dias.items():
+        EstatisticaDiaria.objects.update_or_create(data=dia, defaults=valores)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sweets', '0015_chat_leituras'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(preencher_estatisticas, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.6 on 2026-10-19 18:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sweets', '0016_estatisticas_backfill'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='chatmessage',
+            name='attachment',
+            field=models.FileField(blank=True, db_index=True, null=True, upload_to='chat_attachments/', verbose_name='Anexo'),
+        ),
+        migrations.AlterField(
+            model_name='chatmessage',
+            name='attachment_preview',
+            field=models.ImageField(blank=True, db_index=True, null=True, upload_to='chat_attachments/previews/', verbose_name='Pré-visualização'),
+        ),
+        migrations.AlterField(
+            model_name='comprovativopagamento',
+            name='comprovativo',
+            field=models.ImageField(db_index=True, upload_to='comprovativos/', verbose_name='Comprovativo'),
+        ),
+        migrations.AlterField(
+            model_name='encomenda',
+            name='imagem_referencia_1',
+            field=models.ImageField(blank=True, db_index=True, null=True, upload_to='encomendas/referencias/', verbose_name='Imagem de Referência 1'),
+        ),
+        migrations.AlterField(
+            model_name='encomenda',
+            name='imagem_referencia_2',
+            field=models.ImageField(blank=True, db_index=True, null=True, upload_to='encomendas/referencias/', verbose_name='Imagem de Referência 2'),
+        ),
+        migrations.AlterField(
+            model_name='produto',
+            name='imagem',
+            field=models.ImageField(blank=True, db_index=True, null=True, upload_to='produtos/', verbose_name='Imagem'),
+        ),
+    ]
@@ -19,7 +19,7 @@ class Produto(models.Model):
     nome = models.CharField(max_length=200, verbose_name="Nome do Produto")
     descricao = models.TextField(verbose_name="Descrição")
     preco = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="Preço")
-    imagem = models.ImageField(upload_to='produtos/', blank=True, null=True, verbose_name="Imagem")
+    imagem = models.ImageField(upload_to='produtos/', blank=True, null=True, db_index=True, verbose_name="Imagem")
     categoria = models.ForeignKey(Categoria, on_delete=models.CASCADE, verbose_name="Categoria")
     disponivel = models.BooleanField(default=True, verbose_name="Disponível")
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Criado em")
@@ -45,6 +45,11 @@ class Avaliacao(models.Model):
     class Meta:
         verbose_name = "Avaliação"
         verbose_name_plural = "Avaliações"
+        indexes = [
+            # Listagem paginada das avaliações de um produto (mais recentes primeiro)
+            models.Index(fields=['produto', '-criado_em', '-id'], name='avaliacao_produto_recente_idx'),
+            models.Index(fields=['criado_em'], name='avaliacao_criado_em_idx'),
+        ]
 
 class Reclamacao(models.Model):
     STATUS_CHOICES = [
@@ -70,6 +75,9 @@ class Reclamacao(models.Model):
     class Meta:
         verbose_name = "Reclamação"
         verbose_name_plural = "Reclamações"
+        indexes = [
+            models.Index(fields=['created_at'], name='reclamacao_created_at_idx'),
+        ]
 
 class Carrinho(models.Model):
     usuario = models.ForeignKey(User, on_delete=models.CASCADE, verbose_name="Usuário")
@@ -118,8 +126,8 @@ class Encomenda(models.Model):
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pendente', verbose_name="Status")
     total = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="Total")
     descricao_encomenda = models.TextField(blank=True, null=True, verbose_name="Descrição da Encomenda")
-    imagem_referencia_1 = models.ImageField(upload_to='encomendas/referencias/', blank=True, null=True, verbose_name="Imagem de Referência 1")
-    imagem_referencia_2 = models.ImageField(upload_to='encomendas/referencias/', blank=True, null=True, verbose_name="Imagem de Referência 2")
+    imagem_referencia_1 = models.ImageField(upload_to='encomendas/referencias/', blank=True, null=True, db_index=True, verbose_name="Imagem de Referência 1")
+    imagem_referencia_2 = models.ImageField(upload_to='encomendas/referencias/', blank=True, null=True, db_index=True, verbose_name="Imagem de Referência 2")
     data_recepcao = models.DateField(blank=True, null=True, verbose_name="Data de Recepção")
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Criado em")
     updated_at = models.DateTimeField(auto_now=True, verbose_name="Atualizado em")
@@ -130,6 +138,11 @@ class Encomenda(models.Model):
     class Meta:
         verbose_name = "Encomenda"
         verbose_name_plural = "Encomendas"
+        indexes = [
+            models.Index(fields=['created_at'], name='encomenda_created_at_idx'),
+            models.Index(fields=['status', 'data_recepcao'], name='encomenda_status_recepcao_idx'),
+            models.Index(fields=['usuario', '-created_at'], name='encomenda_usuario_recente_idx'),
+        ]
 
 
 
@@ -151,12 +164,20 @@ class ComprovativoPagamento(models.Model):
     metodo_pagamento = models.CharField(max_length=20, choices=METODO_PAGAMENTO_CHOICES, verbose_name="Método de Pagamento")
     numero_referencia = models.CharField(max_length=50, verbose_name="Número de Referência")
     valor = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="Valor")
-    comprovativo = models.ImageField(upload_to='comprovativos/', verbose_name="Comprovativo")
+    comprovativo = models.ImageField(upload_to='comprovativos/', db_index=True, verbose_name="Comprovativo")
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pendente', verbose_name="Status")
     observacoes = models.TextField(blank=True, null=True, verbose_name="Observações")
     enviado_em = models.DateTimeField(auto_now_add=True, verbose_name="Enviado em")
     processado_em = models.DateTimeField(null=True, blank=True, verbose_name="Processado em")
     processado_por = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='comprovativos_processados', verbose_name="Processado por")
+    motivo_rejeicao = models.TextField(blank=True, default='', verbose_name="Motivo da Rejeição")
+    # Hash perceptual (dHash, 64 bits em hex) e os seus 4 blocos de 16 bits,
+    # indexados para procurar imagens parecidas por distância de Hamming
+    hash_imagem = models.CharField(max_length=16, blank=True, default='', verbose_name="Hash da imagem")
+    hash_bloco_0 = models.PositiveIntegerField(null=True, blank=True)
+    hash_bloco_1 = models.PositiveIntegerField(null=True, blank=True)
+    hash_bloco_2 = models.PositiveIntegerField(null=True, blank=True)
+    hash_bloco_3 = models.PositiveIntegerField(null=True, blank=True)
 
     def __str__(self):
         return f"Comprovativo #{self.id} - {self.encomenda.id} - {self.metodo_pagamento}"
@@ -164,6 +185,15 @@ class ComprovativoPagamento(models.Model):
     class Meta:
         verbose_name = "Comprovativo de Pagamento"
         verbose_name_plural = "Comprovativos de Pagamento"
+        indexes = [
+            models.Index(fields=['status', 'processado_em'], name='comprovativo_status_proc_idx'),
+            models.Index(fields=['status', 'enviado_em'], name='comprovativo_fila_idx'),
+            models.Index(fields=['metodo_pagamento', 'numero_referencia'], name='comprovativo_referencia_idx'),
+            models.Index(fields=['hash_bloco_0'], name='comprovativo_hash_bloco0_idx'),
+            models.Index(fields=['hash_bloco_1'], name='comprovativo_hash_bloco1_idx'),
+            models.Index(fields=['hash_bloco_2'], name='comprovativo_hash_bloco2_idx'),
+            models.Index(fields=['hash_bloco_3'], name='comprovativo_hash_bloco3_idx'),
+        ]
 
 class SecureLink(models.Model):
     encomenda = models.ForeignKey(Encomenda, on_delete=models.CASCADE, related_name='secure_links', verbose_name="Encomenda", null=True, blank=True)
@@ -188,7 +218,13 @@ class ChatMessage(models.Model):
     sender = models.ForeignKey(User, on_delete=models.CASCADE, related_name='sent_messages', verbose_name="Remetente")
     recipient = models.ForeignKey(User, on_delete=models.CASCADE, related_name='received_messages', verbose_name="Destinatário")
     message = models.TextField(blank=True, null=True, verbose_name="Mensagem")
-    attachment = models.FileField(upload_to='chat_attachments/', blank=True, null=True, verbose_name="Anexo")
+    attachment = models.FileField(upload_to='chat_attachments/', blank=True, null=True, db_index=True, verbose_name="Anexo")
+    # Preenchidos pelo worker depois de o anexo ser gravado (sweets.anexos)
+    attachment_type = models.CharField(max_length=100, blank=True, default='', verbose_name="Tipo do anexo")
+    attachment_size = models.PositiveIntegerField(null=True, blank=True, verbose_name="Tamanho do anexo")
+    attachment_width = models.PositiveIntegerField(null=True, blank=True, verbose_name="Largura")
+    attachment_height = models.PositiveIntegerField(null=True, blank=True, verbose_name="Altura")
+    attachment_preview = models.ImageField(upload_to='chat_attachments/previews/', blank=True, null=True, db_index=True, verbose_name="Pré-visualização")
     timestamp = models.DateTimeField(auto_now_add=True, verbose_name="Timestamp")
     is_read = models.BooleanField(default=False, verbose_name="Lida")
 
@@ -204,3 +240,149 @@ class ChatMessage(models.Model):
         ordering = ['timestamp']
         verbose_name = "Mensagem de Chat"
         verbose_name_plural = "Mensagens de Chat"
+
+
+class LeituraChat(models.Model):
+    # Marca de leitura de uma conversa: a última mensagem de `remetente` que `leitor`
+    # já viu. Só é escrita quando avança (sweets.leituras).
+    leitor = models.ForeignKey(User, on_delete=models.CASCADE, related_name='leituras_chat', verbose_name="Leitor")
+    remetente = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+', verbose_name="Remetente")
+    ultima_lida = models.BigIntegerField(default=0, verbose_name="Última mensagem lida")
+    atualizada_em = models.DateTimeField(auto_now=True, verbose_name="Atualizada em")
+
+    def __str__(self):
+        return f"{self.leitor_id} leu {self.remetente_id} até {self.ultima_lida}"
+
+    class Meta:
+        verbose_name = "Leitura de Chat"
+        verbose_name_plural = "Leituras de Chat"
+        constraints = [
+            models.UniqueConstraint(fields=['leitor', 'remetente'], name='leitura_chat_conversa_unica'),
+        ]
+
+
+class ProdutoRecomendacao(models.Model):
+    TIPO_CHOICES = [
+        ('comprado_junto', 'Frequentemente comprados juntos'),
+        ('relacionado', 'Relacionado'),
+    ]
+
+    produto = models.ForeignKey(Produto, on_delete=models.CASCADE, related_name='recomendacoes', verbose_name="Produto")
+    recomendado = models.ForeignKey(Produto, on_delete=models.CASCADE, related_name='+', verbose_name="Produto Recomendado")
+    tipo = models.CharField(max_length=20, choices=TIPO_CHOICES, verbose_name="Tipo")
+    posicao = models.PositiveSmallIntegerField(verbose_name="Posição")
+    pontuacao = models.PositiveIntegerField(default=0, verbose_name="Pontuação")
+    gerado_em = models.DateTimeField(auto_now_add=True, verbose_name="Gerado em")
+
+    def __str__(self):
+        return f"{self.produto_id} -> {self.recomendado_id} ({self.tipo})"
+
+    class Meta:
+        ordering = ['tipo', 'posicao']
+        verbose_name = "Recomendação de Produto"
+        verbose_name_plural = "Recomendações de Produtos"
+        indexes = [
+            models.Index(fields=['produto', 'tipo', 'posicao'], name='recomendacao_produto_idx'),
+        ]
+
+
+class EstatisticaDiaria(models.Model):
+    data = models.DateField(unique=True, verbose_name="Data")
+    encomendas = models.PositiveIntegerField(default=0, verbose_name="Encomendas")
+    encomendas_por_status = models.JSONField(default=dict, blank=True, verbose_name="Encomendas por Status")
+    receita = models.DecimalField(max_digits=12, decimal_places=2, default=0, verbose_name="Receita")
+    comprovativos_aprovados = models.PositiveIntegerField(default=0, verbose_name="Comprovativos Aprovados")
+    novos_clientes = models.PositiveIntegerField(default=0, verbose_name="Novos Clientes")
+    avaliacoes = models.PositiveIntegerField(default=0, verbose_name="Avaliações")
+    reclamacoes = models.PositiveIntegerField(default=0, verbose_name="Reclamações")
+    atualizado_em = models.DateTimeField(auto_now=True, verbose_name="Atualizado em")
+
+    def __str__(self):
+        return f"Estatísticas de {self.data}"
+
+    class Meta:
+        ordering = ['data']
+        verbose_name = "Estatística Diária"
+        verbose_name_plural = "Estatísticas Diárias"
+
+
+class Tarefa(models.Model):
+    STATUS_CHOICES = [
+        ('pendente', 'Pendente'),
+        ('em_execucao', 'Em Execução'),
+        ('concluida', 'Concluída'),
+        ('falhou', 'Falhou'),
+    ]
+
+    nome = models.CharField(max_length=100, verbose_name="Tarefa")
+    argumentos = models.JSONField(default=dict, blank=True, verbose_name="Argumentos")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pendente', verbose_name="Status")
+    tentativas = models.PositiveSmallIntegerField(default=0, verbose_name="Tentativas")
+    max_tentativas = models.PositiveSmallIntegerField(default=5, verbose_name="Máximo de Tentativas")
+    # Próxima execução; enquanto 'em_execucao' funciona como prazo do worker
+    executar_apos = models.DateTimeField(default=timezone.now, verbose_name="Executar após")
+    erro = models.TextField(blank=True, verbose_name="Último Erro")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Criado em")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Atualizado em")
+
+    def __str__(self):
+        return f"Tarefa #{self.id} {self.nome} ({self.status})"
+
+    class Meta:
+        verbose_name = "Tarefa"
+        verbose_name_plural = "Tarefas"
+        indexes = [
+            models.Index(fields=['status', 'executar_apos'], name='tarefa_fila_idx'),
+        ]
+
+
+class NotificacaoAdmin(models.Model):
+    TIPO_CHOICES = [
+        ('comprovativo', 'Comprovativo de Pagamento'),
+        ('reclamacao', 'Reclamação'),
+        ('mensagem', 'Mensagem de Chat'),
+    ]
+
+    tipo = models.CharField(max_length=20, choices=TIPO_CHOICES, verbose_name="Tipo")
+    titulo = models.CharField(max_length=200, verbose_name="Título")
+    mensagem = models.TextField(blank=True, verbose_name="Mensagem")
+    link = models.CharField(max_length=300, blank=True, verbose_name="Link")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Criado em")
+    enviada_em = models.DateTimeField(null=True, blank=True, verbose_name="Enviada em")
+
+    def __str__(self):
+        return f"{self.get_tipo_display()}: {self.titulo}"
+
+    class Meta:
+        ordering = ['created_at']
+        verbose_name = "Notificação do Admin"
+        verbose_name_plural = "Notificações do Admin"
+        indexes = [
+            models.Index(fields=['enviada_em', 'created_at'], name='notificacao_pendente_idx'),
+        ]
+
+
+class EventoEncomenda(models.Model):
+    # Histórico só de acrescentar: cada mudança de status da encomenda (sweets.estados)
+    encomenda = models.ForeignKey(Encomenda, on_delete=models.CASCADE, related_name='eventos', verbose_name="Encomenda")
+    status_anterior = models.CharField(max_length=20, blank=True, choices=Encomenda.STATUS_CHOICES, verbose_name="Status Anterior")
+    status_novo = models.CharField(max_length=20, choices=Encomenda.STATUS_CHOICES, verbose_name="Novo Status")
+    autor = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+', verbose_name="Autor")
+    nota = models.CharField(max_length=200, blank=True, verbose_name="Nota")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Criado em")
+
+    def save(self, *args, **kwargs):
+        if self.pk:
+            raise ValueError('Os eventos de encomenda não podem ser alterados.')
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f"Encomenda #{self.encomenda_id}: {self.status_anterior or '-'} -> {self.status_novo}"
+
+    class Meta:
+        ordering = ['created_at', 'id']
+        verbose_name = "Evento de Encomenda"
+        verbose_name_plural = "Eventos de Encomenda"
+        indexes = [
+            models.Index(fields=['encomenda', 'created_at'], name='evento_encomenda_idx'),
+        ]
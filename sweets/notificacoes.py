@@ -0,0 +1,77 @@
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.utils import timezone
+
+from .models import NotificacaoAdmin
+
+
+def janela():
+    return timedelta(seconds=getattr(settings, 'ADMIN_NOTIFICACOES_JANELA', 300))
+
+
+def registar(tipo, titulo, mensagem='', link=''):
+    # Gravada depois do commit, fora da transação de quem gerou o evento (e só
+    # se ela for confirmada). A entrega é a tarefa periódica entregar_notificacoes,
+    # uma vez por janela: todos os eventos que chegarem até lá seguem no mesmo email.
+    dados = {
+        'tipo': tipo,
+        'titulo': titulo[:200],
+        'mensagem': mensagem,
+        'link': f"{getattr(settings, 'SITE_URL', '')}{link}" if link else '',
+    }
+    transaction.on_commit(lambda: NotificacaoAdmin.objects.create(**dados))
+
+
+def _texto(notificacao):
+    linhas = [f"[{timezone.localtime(notificacao.created_at):%d/%m %H:%M}] {notificacao.titulo}"]
+    if notificacao.mensagem:
+        linhas.append(f"    {notificacao.mensagem}")
+    if notificacao.link:
+        linhas.append(f"    {notificacao.link}")
+    return '\n'.join(linhas)
+
+
+def _mensagens(notificacoes, destinatarios):
+    if getattr(settings, 'ADMIN_NOTIFICACOES_DIGEST', True):
+        por_tipo = defaultdict(list)
+        for notificacao in notificacoes:
+            por_tipo[notificacao.get_tipo_display()].append(notificacao)
+        corpo = []
+        for tipo, grupo in por_tipo.items():
+            corpo.append(f"{tipo} ({len(grupo)})")
+            corpo.extend(_texto(n) for n in grupo)
+            corpo.append('')
+        resumo = ', '.join(f"{len(grupo)} {tipo.lower()}" for tipo, grupo in por_tipo.items())
+        return [EmailMessage(f'IV Sweets: {resumo}', '\n'.join(corpo), settings.DEFAULT_FROM_EMAIL, destinatarios)]
+    return [
+        EmailMessage(f'IV Sweets: {n.titulo}', _texto(n), settings.DEFAULT_FROM_EMAIL, destinatarios)
+        for n in notificacoes
+    ]
+
+
+def entregar(forcar=False, limite=500):
+    """
+    Envia as notificações pendentes, em lotes de `limite` pela mesma ligação
+    SMTP, até não sobrar nenhuma. Sem `forcar`, espera que a janela do resumo
+    feche. Devolve quantas foram enviadas.
+    """
+    destinatarios = getattr(settings, 'ADMIN_NOTIFICACOES_EMAILS', [])
+    pendentes = NotificacaoAdmin.objects.filter(enviada_em=None).order_by('created_at', 'id')
+    lote = list(pendentes[:limite])
+    if not lote or not destinatarios:
+        return 0
+    if not forcar and lote[0].created_at > timezone.now() - janela():
+        return 0  # a janela do resumo ainda não fechou
+
+    total = 0
+    with get_connection(fail_silently=False) as ligacao:
+        while lote:
+            ligacao.send_messages(_mensagens(lote, destinatarios))
+            NotificacaoAdmin.objects.filter(id__in=[n.id for n in lote]).update(enviada_em=timezone.now())
+            total += len(lote)
+            lote = list(pendentes[:limite]) if len(lote) == limite else []
+    return total
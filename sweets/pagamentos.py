@@ -0,0 +1,89 @@
+from django.db import transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .estados import transitar_em_lote
+from .estatisticas import atualizar_estatisticas, dia_local
+from .models import ComprovativoPagamento
+
+COMPROVATIVOS_POR_PAGINA = 25
+ACOES = {'aprovar': 'aprovado', 'rejeitar': 'rejeitado'}
+
+
+def contagem_por_status():
+    contagem = dict(
+        ComprovativoPagamento.objects.values_list('status').annotate(total=Count('id')).order_by()
+    )
+    return {status: contagem.get(status, 0) for status, _ in ComprovativoPagamento.STATUS_CHOICES}
+
+
+def fila_comprovativos(status='pendente', cursor=None, por_pagina=COMPROVATIVOS_POR_PAGINA):
+    # Keyset sobre o índice (status, enviado_em): os pendentes saem por ordem de
+    # chegada (o mais antigo primeiro), os já processados do mais recente para trás.
+    antigos_primeiro = status == 'pendente'
+    ordem = ('enviado_em', 'id') if antigos_primeiro else ('-enviado_em', '-id')
+    comprovativos = (
+        ComprovativoPagamento.objects.filter(status=status)
+        .select_related('encomenda__usuario', 'usuario')
+        .prefetch_related('encomenda__itens__produto')
+        .order_by(*ordem)
+    )
+    if cursor:
+        try:
+            enviado_em, comprovativo_id = cursor.rsplit('_', 1)
+            enviado_em = parse_datetime(enviado_em)
+            comprovativo_id = int(comprovativo_id)
+        except ValueError:
+            enviado_em = None
+        if enviado_em is not None:
+            if antigos_primeiro:
+                depois = Q(enviado_em__gt=enviado_em) | Q(enviado_em=enviado_em, id__gt=comprovativo_id)
+            else:
+                depois = Q(enviado_em__lt=enviado_em) | Q(enviado_em=enviado_em, id__lt=comprovativo_id)
+            comprovativos = comprovativos.filter(depois)
+    pagina = list(comprovativos[:por_pagina + 1])
+    proximo_cursor = None
+    if len(pagina) > por_pagina:
+        pagina = pagina[:por_pagina]
+        ultimo = pagina[-1]
+        proximo_cursor = f"{ultimo.enviado_em.isoformat()}_{ultimo.id}"
+    return pagina, proximo_cursor
+
+
+def processar_comprovativos(ids, acao, admin, motivo=''):
+    """
+    Aprova ou rejeita de uma vez os comprovativos pendentes em `ids`.
+    Aprovar confirma as encomendas ainda pendentes (sweets.estados).
+    Devolve quantos foram processados.
+    """
+    status = ACOES[acao]
+    agora = timezone.now()
+    with transaction.atomic():
+        comprovativos = list(
+            ComprovativoPagamento.objects.select_for_update()
+            .filter(id__in=ids, status='pendente')
+        )
+        # Dias em que já contavam (se tinham sido processados antes) e o de hoje
+        dias = {dia_local(c.processado_em) for c in comprovativos if c.processado_em}
+        dias.add(dia_local(agora))
+        for comprovativo in comprovativos:
+            comprovativo.status = status
+            comprovativo.processado_por = admin
+            comprovativo.processado_em = agora
+            comprovativo.motivo_rejeicao = motivo if acao == 'rejeitar' else ''
+        ComprovativoPagamento.objects.bulk_update(
+            comprovativos, ['status', 'processado_por', 'processado_em', 'motivo_rejeicao']
+        )
+
+        if acao == 'aprovar':
+            # Só as encomendas ainda pendentes passam a confirmadas
+            transitar_em_lote(
+                {c.encomenda_id for c in comprovativos}, 'confirmada', autor=admin,
+                nota='Pagamento aprovado', ignorar_invalidas=True,
+            )
+
+        # bulk_update não dispara os signals: atualiza as estatísticas dos dias afetados
+        if comprovativos:
+            transaction.on_commit(lambda: atualizar_estatisticas(dias))
+    return len(comprovativos)
@@ -0,0 +1,87 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import Encomenda
+
+# Links de partilha de encomendas: o token leva o id da encomenda e a data de
+# expiração, assinados com HMAC (SECRET_KEY), por isso valida-se sem ir à base
+# de dados. Os links antigos (UUID guardado em SecureLink) continuam a funcionar.
+SAL = 'sweets.partilha'
+
+
+def expiracao_padrao():
+    return timezone.now() + timedelta(days=settings.PARTILHA_VALIDADE_DIAS)
+
+
+def gerar_token(encomenda_id, expira=None):
+    # Sem `expira` o link não expira
+    valor = str(encomenda_id)
+    if expira:
+        valor += '-' + signing.b62_encode(int(expira.timestamp()))
+    return signing.Signer(salt=SAL).sign(valor)
+
+
+def ler_token(token):
+    """
+    Devolve o id da encomenda do token. Levanta signing.BadSignature se o token
+    foi alterado e signing.SignatureExpired (subclasse) se já expirou.
+    """
+    valor = signing.Signer(salt=SAL).unsign(token)
+    encomenda_id, _, expira = valor.partition('-')
+    if expira and signing.b62_decode(expira) < time.time():
+        raise signing.SignatureExpired('Link expirado')
+    return int(encomenda_id)
+
+
+def caminho(encomenda_id, expira=None):
+    return reverse('sweets:secure_order_assinado', args=[gerar_token(encomenda_id, expira)])
+
+
+# O resumo mostra os produtos dos itens (nome, subtotal): alterar um produto
+# muda esta versão, que faz parte da chave, e os resumos antigos deixam de ser lidos
+VERSAO_PRODUTOS = 'partilha:produtos'
+
+
+def versao_produtos():
+    return cache.get_or_set(VERSAO_PRODUTOS, time.time_ns, None)
+
+
+def produtos_alterados():
+    cache.set(VERSAO_PRODUTOS, time.time_ns(), None)
+
+
+def chave(encomenda_id, versao=None):
+    return f'partilha:encomenda:{encomenda_id}:{versao or versao_produtos()}'
+
+
+def resumo(encomenda_id):
+    """
+    HTML do resumo da encomenda mostrado na página partilhada, guardado em cache
+    até a encomenda ou um produto mudar (ver invalidar e produtos_alterados).
+    None se a encomenda não existe.
+    """
+    chave_resumo = chave(encomenda_id)
+    html = cache.get(chave_resumo)
+    if html is None:
+        encomenda = (
+            Encomenda.objects.filter(id=encomenda_id)
+            .prefetch_related('itens__produto')
+            .first()
+        )
+        if encomenda is None:
+            return None
+        html = render_to_string('sweets/encomenda_partilhada.html', {'encomenda': encomenda})
+        cache.set(chave_resumo, html, settings.PARTILHA_CACHE_TIMEOUT)
+    return html
+
+
+def invalidar(ids):
+    versao = versao_produtos()
+    cache.delete_many([chave(encomenda_id, versao) for encomenda_id in ids])
@@ -0,0 +1,151 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django.urls import reverse
+
+from . import contadores, notificacoes, partilha
+from .estatisticas import dia_local
+from .models import Avaliacao, ChatMessage, ComprovativoPagamento, Encomenda, EventoEncomenda, Produto, Reclamacao
+from .tarefas import enfileirar, enfileirar_unica
+
+
+def _agendar_atualizacao(momento):
+    # Recalcula só o dia afetado, no worker e depois do commit. Com atraso, as
+    # alterações seguintes do mesmo dia juntam-se ao recálculo já enfileirado
+    if momento:
+        dia = dia_local(momento).isoformat()
+        atraso = timedelta(seconds=settings.ESTATISTICAS_ATRASO)
+        transaction.on_commit(lambda: enfileirar_unica('estatisticas_dia', atraso=atraso, dia=dia))
+
+
+@receiver([post_save, post_delete], sender=Encomenda)
+def estatisticas_encomenda(sender, instance, raw=False, **kwargs):
+    if not raw:
+        _agendar_atualizacao(instance.created_at)
+
+
+@receiver(pre_save, sender=ComprovativoPagamento)
+def processado_em_anterior(sender, instance, raw=False, **kwargs):
+    # Um comprovativo aprovado e depois rejeitado sai da receita do dia em que foi aprovado
+    if not raw and instance.pk:
+        instance._processado_em_anterior = (
+            ComprovativoPagamento.objects.filter(pk=instance.pk).values_list('processado_em', flat=True).first()
+        )
+
+
+@receiver([post_save, post_delete], sender=ComprovativoPagamento)
+def estatisticas_comprovativo(sender, instance, raw=False, **kwargs):
+    if not raw:
+        anterior = getattr(instance, '_processado_em_anterior', None)
+        if anterior and dia_local(anterior) != dia_local(instance.processado_em or anterior):
+            _agendar_atualizacao(anterior)
+        _agendar_atualizacao(instance.processado_em)
+
+
+@receiver([post_save, post_delete], sender=Avaliacao)
+def estatisticas_avaliacao(sender, instance, raw=False, **kwargs):
+    if not raw:
+        _agendar_atualizacao(instance.criado_em)
+
+
+@receiver([post_save, post_delete], sender=Reclamacao)
+def estatisticas_reclamacao(sender, instance, raw=False, **kwargs):
+    if not raw:
+        _agendar_atualizacao(instance.created_at)
+
+
+@receiver(post_save, sender=User)
+def estatisticas_cliente(sender, instance, created=False, raw=False, **kwargs):
+    if created and not raw:
+        _agendar_atualizacao(instance.date_joined)
+
+
+@receiver(post_save, sender=Encomenda)
+def evento_criacao(sender, instance, created=False, raw=False, **kwargs):
+    # Primeiro evento da linha do tempo; as mudanças seguintes passam por sweets.estados
+    if created and not raw:
+        EventoEncomenda.objects.create(encomenda=instance, status_novo=instance.status, autor=instance.usuario)
+
+
+@receiver([post_save, post_delete], sender=Encomenda)
+def partilha_encomenda(sender, instance, raw=False, **kwargs):
+    # A página partilhada da encomenda (sweets.partilha) volta a ser gerada
+    if not raw:
+        transaction.on_commit(lambda: partilha.invalidar([instance.pk]))
+
+
+@receiver([post_save, post_delete], sender=Produto)
+def partilha_produto(sender, instance, raw=False, **kwargs):
+    if not raw:
+        transaction.on_commit(partilha.produtos_alterados)
+
+
+@receiver(m2m_changed, sender=Encomenda.itens.through)
+def partilha_itens(sender, instance, action, pk_set=None, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear') and isinstance(instance, Encomenda):
+        transaction.on_commit(lambda: partilha.invalidar([instance.pk]))
+
+
+@receiver(post_save, sender=ComprovativoPagamento)
+def hash_comprovativo(sender, instance, created=False, raw=False, **kwargs):
+    # Hash perceptual para detetar o mesmo comprovativo usado noutras encomendas
+    if created and not raw and instance.comprovativo:
+        transaction.on_commit(lambda: enfileirar('hash_comprovativo', comprovativo_id=instance.pk))
+
+
+@receiver(post_save, sender=ChatMessage)
+def anexo_chat(sender, instance, created=False, raw=False, **kwargs):
+    # Tipo, tamanho e miniatura do anexo, calculados uma vez fora do pedido
+    if created and not raw and instance.attachment:
+        transaction.on_commit(lambda: enfileirar('anexo_chat', mensagem_id=instance.pk))
+
+
+@receiver(post_save, sender=ChatMessage)
+def contador_mensagens(sender, instance, created=False, raw=False, **kwargs):
+    if created and not raw:
+        contadores.invalidar('mensagens', instance.recipient_id)
+
+
+@receiver([post_save, post_delete], sender=Reclamacao)
+def contador_reclamacoes(sender, instance, raw=False, **kwargs):
+    if not raw:
+        contadores.invalidar('reclamacoes')
+
+
+# Notificações para o admin (entregues em lote por sweets.notificacoes)
+
+@receiver(post_save, sender=ComprovativoPagamento)
+def notificar_comprovativo(sender, instance, created=False, raw=False, **kwargs):
+    if created and not raw:
+        notificacoes.registar(
+            'comprovativo',
+            f'Novo comprovativo da encomenda #{instance.encomenda_id} ({instance.get_metodo_pagamento_display()})',
+            f'{instance.usuario.username} - MT {instance.valor} - ref. {instance.numero_referencia}',
+            reverse('sweets:admin_encomenda_detalhe', args=[instance.encomenda_id]),
+        )
+
+
+@receiver(post_save, sender=Reclamacao)
+def notificar_reclamacao(sender, instance, created=False, raw=False, **kwargs):
+    if created and not raw:
+        notificacoes.registar(
+            'reclamacao',
+            f'Nova reclamação de {instance.usuario.username}: {instance.assunto}',
+            instance.mensagem[:300],
+            reverse('sweets:admin_reclamacao_detalhe', args=[instance.id]),
+        )
+
+
+@receiver(post_save, sender=ChatMessage)
+def notificar_mensagem(sender, instance, created=False, raw=False, **kwargs):
+    if created and not raw and instance.recipient.username == 'ivsweets':
+        notificacoes.registar(
+            'mensagem',
+            f'Nova mensagem de {instance.sender.username}',
+            (instance.message or '[Anexo]')[:300],
+            reverse('sweets:admin_chat_with_user', args=[instance.sender_id]),
+        )
@@ -0,0 +1,19 @@
+// Relógio em tempo real da barra de navegação
+function updateClock() {
+    const now = new Date();
+    const day = String(now.getDate()).padStart(2, '0');
+    const month = String(now.getMonth() + 1).padStart(2, '0'); // Months are 0-based
+    const year = now.getFullYear();
+    const hours = String(now.getHours()).padStart(2, '0');
+    const minutes = String(now.getMinutes()).padStart(2, '0');
+    const seconds = String(now.getSeconds()).padStart(2, '0');
+
+    const dateTimeString = `${day}/${month}/${year} ${hours}:${minutes}:${seconds}`;
+    document.getElementById('currentDateTime').textContent = dateTimeString;
+}
+
+// Update clock immediately and then every second
+if (document.getElementById('currentDateTime')) {
+    updateClock();
+    setInterval(updateClock, 1000);
+}
@@ -0,0 +1,78 @@
+// Upload direto para o bucket (MEDIA_STORAGE=s3): os <input type="file" data-upload-direto="destino">
+// são enviados para o storage antes do formulário, que segue só com o token `<nome>_chave`.
+(function() {
+    // O URL de assinatura vem do próprio <script data-assinar="...">
+    const urlAssinar = document.currentScript.dataset.assinar;
+
+    function csrf(form) {
+        const campo = form.querySelector('[name=csrfmiddlewaretoken]');
+        return campo ? campo.value : '';
+    }
+
+    function pendentes(form) {
+        return Array.from(form.elements).filter(function(input) {
+            return input.type === 'file' && input.dataset.uploadDireto && !input.disabled && input.files.length;
+        });
+    }
+
+    async function enviar(form, input) {
+        const ficheiro = input.files[0];
+        const pedido = new FormData();
+        pedido.append('destino', input.dataset.uploadDireto);
+        pedido.append('nome', ficheiro.name);
+        pedido.append('tipo', ficheiro.type || 'application/octet-stream');
+        pedido.append('tamanho', ficheiro.size);
+        const resposta = await fetch(urlAssinar, {
+            method: 'POST',
+            body: pedido,
+            headers: {'X-CSRFToken': csrf(form)}
+        });
+        const dados = await resposta.json();
+        if (!dados.success) {
+            throw new Error(dados.error || 'Erro ao preparar o envio do ficheiro');
+        }
+
+        const envio = new FormData();
+        Object.entries(dados.campos).forEach(function([chave, valor]) { envio.append(chave, valor); });
+        envio.append('file', ficheiro);  // o ficheiro tem de ser o último campo
+        const upload = await fetch(dados.url, {method: 'POST', body: envio});
+        if (!upload.ok) {
+            throw new Error('Erro ao enviar o ficheiro ' + ficheiro.name);
+        }
+
+        const token = document.createElement('input');
+        token.type = 'hidden';
+        token.name = input.name + '_chave';
+        token.value = dados.token;
+        form.appendChild(token);
+        input.disabled = true;  // o ficheiro já não vai no corpo do formulário
+    }
+
+    async function preparar(form) {
+        for (const input of pendentes(form)) {
+            await enviar(form, input);
+        }
+    }
+
+    // Formulários com submit próprio (ex.: chat por AJAX) chamam uploadDireto.preparar()
+    window.uploadDireto = {preparar: preparar};
+
+    document.addEventListener('submit', function(e) {
+        const form = e.target;
+        if ('uploadManual' in form.dataset || !pendentes(form).length) {
+            return;
+        }
+        e.preventDefault();
+        const botoes = form.querySelectorAll('[type=submit]');
+        botoes.forEach(function(botao) { botao.disabled = true; });
+        preparar(form)
+            .then(function() {
+                botoes.forEach(function(botao) { botao.disabled = false; });
+                form.requestSubmit ? form.requestSubmit(e.submitter) : form.submit();
+            })
+            .catch(function(erro) {
+                botoes.forEach(function(botao) { botao.disabled = false; });
+                alert(erro.message);
+            });
+    }, true);
+})();
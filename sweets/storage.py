@@ -0,0 +1,117 @@
+import hashlib
+import os
+import uuid
+from datetime import timedelta
+
+from django.apps import apps
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.base import File
+from django.core.files.storage import FileSystemStorage
+from django.db import models, transaction
+
+try:
+    from storages.backends.s3 import S3Storage
+except ImportError:  # django-storages só é preciso com MEDIA_STORAGE=s3
+    S3Storage = None
+
+
+def nome_por_conteudo(nome, conteudo):
+    # pasta/<sha256>.<ext>: o mesmo conteúdo dá sempre o mesmo nome
+    digest = hashlib.sha256()
+    for bloco in conteudo.chunks():
+        digest.update(bloco.encode() if isinstance(bloco, str) else bloco)
+    conteudo.seek(0)
+    extensao = os.path.splitext(nome)[1].lower()
+    return os.path.join(os.path.dirname(nome), digest.hexdigest() + extensao)
+
+
+def campos_de_ficheiro():
+    for modelo in apps.get_models():
+        for campo in modelo._meta.concrete_fields:
+            if isinstance(campo, models.FileField):
+                yield modelo, campo.name
+
+
+def referencias(nome):
+    # Contagem de referências calculada a partir da BD (os campos de ficheiro têm
+    # índice): quantas linhas apontam para o ficheiro
+    return sum(
+        modelo._base_manager.filter(**{campo: nome}).count() for modelo, campo in campos_de_ficheiro()
+    )
+
+
+class ConteudoEnderecado:
+    """
+    Guarda cada ficheiro uma única vez, com o hash do conteúdo como nome.
+    Uploads repetidos reutilizam o ficheiro existente e delete() só o remove
+    quando já nenhum registo o referencia.
+    """
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.get_available_name(nome_por_conteudo(name, content), max_length=max_length)
+        if self.exists(name):
+            return name
+        return super().save(name, content, max_length=max_length)
+
+    def get_available_name(self, name, max_length=None):
+        # O mesmo nome implica o mesmo conteúdo: nunca é preciso um sufixo aleatório.
+        # Se não couber no campo, encurta o hash (continua a depender só do conteúdo).
+        excesso = len(name) - max_length if max_length else 0
+        if excesso <= 0:
+            return name
+        pasta, ficheiro = os.path.split(name)
+        raiz, extensao = os.path.splitext(ficheiro)
+        if len(raiz) - excesso < 32:
+            raise SuspiciousFileOperation(f'O nome "{name}" não cabe em {max_length} caracteres.')
+        return os.path.join(pasta, raiz[:len(raiz) - excesso] + extensao)
+
+    def delete(self, name):
+        # Só depois do commit e com atraso (MEDIA_REMOCAO_ATRASO), pelo worker: um
+        # save() do mesmo conteúdo que encontrou o ficheiro e ainda não gravou a
+        # linha chega a tempo de o referenciar. As referências contam-se nessa altura.
+        if not name:
+            return
+        from .tarefas import enfileirar
+        atraso = timedelta(seconds=getattr(settings, 'MEDIA_REMOCAO_ATRASO', 3600))
+        transaction.on_commit(lambda: enfileirar('remover_ficheiro', atraso=atraso, caminho=name))
+
+    def remover_se_orfao(self, name):
+        if not referencias(name):
+            super().delete(name)
+
+    def ler_inicio(self, name, tamanho):
+        with self.open(name, 'rb') as ficheiro:
+            return ficheiro.read(tamanho)
+
+    def copiar(self, origem, destino):
+        with self.open(origem, 'rb') as ficheiro:
+            return super().save(destino, ficheiro)
+
+
+class ArmazenamentoLocal(ConteudoEnderecado, FileSystemStorage):
+    def _save(self, name, content):
+        # Escreve num temporário e troca de forma atómica: dois uploads iguais
+        # em simultâneo escrevem os mesmos bytes e nenhum vê um ficheiro a meio
+        temporario = super()._save(f'{name}.{uuid.uuid4().hex}.tmp', content)
+        os.replace(self.path(temporario), self.path(name))
+        return name
+
+
+if S3Storage is not None:
+    class ArmazenamentoS3(ConteudoEnderecado, S3Storage):
+        # open() descarrega o objeto inteiro: aqui só os bytes pedidos (Range) e
+        # a cópia é feita pelo próprio bucket (CopyObject)
+        def ler_inicio(self, name, tamanho):
+            objeto = self.bucket.Object(self._normalize_name(name))
+            return objeto.get(Range=f'bytes=0-{tamanho - 1}')['Body'].read()
+
+        def copiar(self, origem, destino):
+            self.bucket.Object(self._normalize_name(destino)).copy_from(
+                CopySource={'Bucket': self.bucket_name, 'Key': self._normalize_name(origem)}
+            )
+            return destino
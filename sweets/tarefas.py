@@ -0,0 +1,276 @@
+import logging
+import threading
+import time
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import send_mail
+from django.db import DatabaseError, close_old_connections, connection
+from django.utils import timezone
+
+from .models import Tarefa
+
+logger = logging.getLogger(__name__)
+
+REGISTO = {}
+PERIODICAS = {}
+
+
+def tarefa(nome, periodica=None):
+    # Regista uma função como tarefa executável pelo worker (`manage.py processar_tarefas`).
+    # Com `periodica` (ver diariamente/a_cada) o worker mantém-na sempre agendada.
+    def decorador(funcao):
+        REGISTO[nome] = funcao
+        if periodica:
+            PERIODICAS[nome] = periodica
+        return funcao
+    return decorador
+
+
+def diariamente(hora, minuto=0):
+    def proxima(agora):
+        # Próximo hora:minuto no fuso horário da loja
+        local = timezone.localtime(agora)
+        alvo = local.replace(hour=hora, minute=minuto, second=0, microsecond=0)
+        return alvo if alvo > local else alvo + timedelta(days=1)
+    return proxima
+
+
+def a_cada(segundos):
+    return lambda agora: agora + timedelta(seconds=segundos)
+
+
+def agendar_periodicas():
+    """
+    Garante uma linha pendente (ou em execução) por tarefa periódica; quando
+    uma termina, a ronda seguinte do worker agenda a próxima. Corre no worker
+    e na thread do TAREFAS_NO_WEB, que veem a base de dados da aplicação, por
+    isso não é preciso um cron à parte.
+    """
+    if not PERIODICAS:
+        return
+    agendadas = set(
+        Tarefa.objects.filter(nome__in=PERIODICAS, status__in=['pendente', 'em_execucao'])
+        .values_list('nome', flat=True)
+    )
+    agora = timezone.now()
+    for nome, proxima in PERIODICAS.items():
+        if nome in agendadas:
+            continue
+        # As execuções anteriores já não interessam (as que falharam ficam para consulta)
+        Tarefa.objects.filter(nome=nome, status='concluida').delete()
+        Tarefa.objects.create(nome=nome, executar_apos=proxima(agora))
+        # Dois processos a agendar ao mesmo tempo: fica só a primeira linha
+        pendentes = Tarefa.objects.filter(nome=nome, status='pendente').order_by('id')
+        repetidas = list(pendentes.values_list('id', flat=True)[1:])
+        if repetidas:
+            Tarefa.objects.filter(id__in=repetidas, status='pendente').delete()
+
+
+def enfileirar(nome, atraso=None, max_tentativas=None, **argumentos):
+    if nome not in REGISTO:
+        raise ValueError(f'Tarefa desconhecida: {nome}')
+    dados = {'nome': nome, 'argumentos': argumentos}
+    if atraso:
+        dados['executar_apos'] = timezone.now() + atraso
+    if max_tentativas:
+        dados['max_tentativas'] = max_tentativas
+    if getattr(settings, 'TAREFAS_SINCRONAS', False) and not atraso:
+        # Modo síncrono (desenvolvimento/testes): executa já, sem worker. As
+        # tarefas com atraso ficam na fila mesmo assim (correr já anularia o atraso)
+        tarefa_obj = Tarefa(**dados)
+        executar(tarefa_obj)
+        return tarefa_obj
+    return Tarefa.objects.create(**dados)
+
+
+def enfileirar_unica(nome, atraso=None, **argumentos):
+    # Não enfileira se já houver uma pendente com os mesmos argumentos: essa
+    # ainda vai correr e cobre esta (ex.: recalcular o mesmo dia)
+    pendentes = Tarefa.objects.filter(
+        nome=nome, status='pendente', **{f'argumentos__{chave}': valor for chave, valor in argumentos.items()}
+    )
+    if atraso and pendentes.exists():
+        return None
+    return enfileirar(nome, atraso=atraso, **argumentos)
+
+
+def _reservar(limite):
+    # Reserva tarefas prontas; as que ficaram 'em_execucao' além do prazo
+    # (worker morreu a meio) voltam a ser elegíveis.
+    agora = timezone.now()
+    prazo = agora + timedelta(seconds=getattr(settings, 'TAREFAS_TIMEOUT', 300))
+    candidatas = list(
+        Tarefa.objects.filter(status__in=['pendente', 'em_execucao'], executar_apos__lte=agora)
+        .order_by('executar_apos', 'id')
+        .values_list('id', 'status', 'executar_apos')[:limite]
+    )
+    reservadas = []
+    for tarefa_id, status, executar_apos in candidatas:
+        # Só quem mudar a linha primeiro fica com a tarefa (seguro com vários workers)
+        if Tarefa.objects.filter(id=tarefa_id, status=status, executar_apos=executar_apos).update(
+            status='em_execucao', executar_apos=prazo, updated_at=agora
+        ):
+            reservadas.append(tarefa_id)
+    return Tarefa.objects.filter(id__in=reservadas).order_by('id')
+
+
+def _manter_reserva(tarefa_id, parar):
+    # Enquanto a tarefa corre, adia o prazo da reserva: só a de um worker que
+    # morreu deixa de ser adiada e volta a ser reservada por outro
+    timeout = getattr(settings, 'TAREFAS_TIMEOUT', 300)
+    try:
+        while not parar.wait(timeout / 3):
+            try:
+                Tarefa.objects.filter(id=tarefa_id, status='em_execucao').update(
+                    executar_apos=timezone.now() + timedelta(seconds=timeout)
+                )
+            except DatabaseError:
+                logger.warning('Não foi possível renovar a reserva da tarefa #%s', tarefa_id, exc_info=True)
+    finally:
+        connection.close()
+
+
+def executar(tarefa_obj):
+    # Uma tarefa pode ainda assim correr duas vezes (o worker morre depois de a
+    # executar e antes de gravar o estado): as funções devem tolerá-lo
+    tarefa_obj.tentativas += 1
+    parar = threading.Event()
+    if tarefa_obj.pk and tarefa_obj.status == 'em_execucao':
+        threading.Thread(target=_manter_reserva, args=(tarefa_obj.pk, parar), daemon=True).start()
+    try:
+        REGISTO[tarefa_obj.nome](**tarefa_obj.argumentos)
+    except Exception:
+        tarefa_obj.erro = traceback.format_exc()
+        if tarefa_obj.tentativas >= tarefa_obj.max_tentativas:
+            tarefa_obj.status = 'falhou'
+            logger.error('Tarefa %s falhou definitivamente:\n%s', tarefa_obj, tarefa_obj.erro)
+        else:
+            # Backoff exponencial: 30s, 1min, 2min, 4min, ...
+            espera = getattr(settings, 'TAREFAS_BACKOFF_BASE', 30) * 2 ** (tarefa_obj.tentativas - 1)
+            tarefa_obj.status = 'pendente'
+            tarefa_obj.executar_apos = timezone.now() + timedelta(seconds=espera)
+            logger.warning('Tarefa %s falhou, nova tentativa em %ss', tarefa_obj, espera)
+    else:
+        tarefa_obj.status = 'concluida'
+        tarefa_obj.erro = ''
+    finally:
+        parar.set()
+    if tarefa_obj.pk:
+        tarefa_obj.save(update_fields=['status', 'tentativas', 'executar_apos', 'erro', 'updated_at'])
+    return tarefa_obj.status == 'concluida'
+
+
+def processar_pendentes(limite=20):
+    agendar_periodicas()
+    resultados = [executar(tarefa_obj) for tarefa_obj in _reservar(limite)]
+    return len(resultados), resultados.count(False)
+
+
+def processar_em_segundo_plano(intervalo=None, limite=20):
+    """
+    Processa a fila numa thread do próprio processo (TAREFAS_NO_WEB), para
+    instalações em que não há um worker a ver a mesma base de dados. Vários
+    processos podem fazê-lo ao mesmo tempo: cada tarefa só é reservada uma vez.
+    """
+    intervalo = intervalo or getattr(settings, 'TAREFAS_INTERVALO', 5)
+
+    def ciclo():
+        while True:
+            close_old_connections()
+            try:
+                total, _ = processar_pendentes(limite)
+            except Exception:
+                logger.exception('Erro ao processar a fila de tarefas')
+                total = 0
+            if total < limite:
+                time.sleep(intervalo)
+
+    thread = threading.Thread(target=ciclo, name='tarefas', daemon=True)
+    thread.start()
+    return thread
+
+
+@tarefa('enviar_email')
+def enviar_email(assunto, mensagem, destinatarios, remetente=None, html=None):
+    send_mail(
+        assunto,
+        mensagem,
+        remetente or settings.DEFAULT_FROM_EMAIL,
+        destinatarios,
+        html_message=html,
+        fail_silently=False,
+    )
+
+
+@tarefa('entregar_notificacoes', periodica=a_cada(getattr(settings, 'ADMIN_NOTIFICACOES_JANELA', 300)))
+def entregar_notificacoes():
+    from .notificacoes import entregar
+    entregar(forcar=True)
+
+
+@tarefa('otimizar_imagem')
+def otimizar_imagem(modelo, pk, campo):
+    from .imagens import otimizar_campo_imagem
+    otimizar_campo_imagem(modelo, pk, campo)
+
+
+@tarefa('anexo_chat')
+def anexo_chat(mensagem_id):
+    from .anexos import processar_anexo
+    processar_anexo(mensagem_id)
+
+
+@tarefa('hash_comprovativo')
+def hash_comprovativo(comprovativo_id):
+    from .duplicados import calcular_hash
+    calcular_hash(comprovativo_id)
+
+
+@tarefa('enderecar_upload')
+def enderecar_upload(chave, tipo):
+    from .uploads import enderecar
+    enderecar(chave, tipo)
+
+
+@tarefa('estatisticas_dia')
+def estatisticas_dia(dia):
+    from datetime import date
+
+    from .estatisticas import atualizar_estatisticas_dia
+    atualizar_estatisticas_dia(date.fromisoformat(dia))
+
+
+# Manutenção noturna (antes era um cron à parte, que no Render corria noutro
+# disco e, com SQLite, atualizava uma cópia da base de dados)
+
+@tarefa('gerar_recomendacoes', periodica=diariamente(getattr(settings, 'TAREFAS_NOTURNAS_HORA', 3)))
+def gerar_recomendacoes():
+    from django.core.management import call_command
+    call_command('gerar_recomendacoes')
+
+
+@tarefa('atualizar_estatisticas', periodica=diariamente(getattr(settings, 'TAREFAS_NOTURNAS_HORA', 3)))
+def atualizar_estatisticas():
+    from django.core.management import call_command
+    call_command('atualizar_estatisticas', dias=7)
+
+
+@tarefa('limpar_sessoes', periodica=diariamente(getattr(settings, 'TAREFAS_NOTURNAS_HORA', 3)))
+def limpar_sessoes():
+    from django.core.management import call_command
+    call_command('limpar_sessoes')
+
+
+@tarefa('limpar_tarefas', periodica=diariamente(getattr(settings, 'TAREFAS_NOTURNAS_HORA', 3)))
+def limpar_tarefas():
+    # Sem isto as linhas das tarefas já terminadas acumulavam-se na tabela
+    limite = timezone.now() - timedelta(days=getattr(settings, 'TAREFAS_RETENCAO_DIAS', 7))
+    Tarefa.objects.filter(status__in=['concluida', 'falhou'], updated_at__lt=limite).delete()
+
+
+@tarefa('remover_ficheiro')
+def remover_ficheiro(caminho):
+    from django.core.files.storage import default_storage
+    default_storage.remover_se_orfao(caminho)
@@ -1,3 +1,425 @@
-from django.test import TestCase
+import base64
+import hashlib
+import io
+import json
+from datetime import timedelta
+from decimal import Decimal
+from smtplib import SMTPException
+from unittest import mock
 
-# Create your tests here.
+from botocore.response import StreamingBody
+from botocore.stub import Stubber
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core import mail, signing
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from PIL import Image
+
+from . import partilha, tarefas, uploads
+from .assets import icones_do_texto
+from .estatisticas import atualizar_estatisticas_dia
+from .importacao import importar_produtos
+from .models import (
+    Avaliacao, Carrinho, Categoria, ComprovativoPagamento, Encomenda, EstatisticaDiaria, ItemCarrinho,
+    NotificacaoAdmin, Produto, Reclamacao, Tarefa,
+)
+from .storage import ArmazenamentoS3
+from .views import pagina_avaliacoes
+
+
+class PaginaAvaliacoesTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        categoria = Categoria.objects.create(nome='Bolos')
+        cls.produto = Produto.objects.create(nome='Bolo', descricao='', preco=10, categoria=categoria)
+        for n in range(7):
+            usuario = User.objects.create_user(f'cliente{n}')
+            Avaliacao.objects.create(produto=cls.produto, usuario=usuario, estrelas=5)
+        # Empates no criado_em: a ordem tem de desempatar pelo id
+        agora = timezone.now()
+        Avaliacao.objects.filter(id__in=list(Avaliacao.objects.values_list('id', flat=True)[:4])).update(criado_em=agora)
+
+    def test_percorre_todas_sem_repetir(self):
+        esperadas = list(self.produto.avaliacoes.order_by('-criado_em', '-id').values_list('id', flat=True))
+        vistas, cursor = [], None
+        while True:
+            pagina, cursor = pagina_avaliacoes(self.produto, cursor, por_pagina=3)
+            vistas += [avaliacao.id for avaliacao in pagina]
+            if not cursor:
+                break
+        self.assertEqual(vistas, esperadas)
+
+    def test_uma_query_por_pagina(self):
+        _, cursor = pagina_avaliacoes(self.produto, por_pagina=3)
+        with self.assertNumQueries(1):
+            pagina, _ = pagina_avaliacoes(self.produto, cursor, por_pagina=3)
+            [avaliacao.usuario.username for avaliacao in pagina]
+
+    def test_cursor_invalido_volta_ao_inicio(self):
+        pagina, _ = pagina_avaliacoes(self.produto, 'lixo', por_pagina=3)
+        primeira, _ = pagina_avaliacoes(self.produto, por_pagina=3)
+        self.assertEqual(pagina, primeira)
+
+
+class ReservaTarefasTests(TestCase):
+    def setUp(self):
+        self.periodicas = dict(tarefas.PERIODICAS)
+        tarefas.PERIODICAS.clear()
+
+    def tearDown(self):
+        tarefas.PERIODICAS.update(self.periodicas)
+
+    def test_cada_tarefa_reservada_uma_vez(self):
+        pronta = Tarefa.objects.create(nome='enviar_email')
+        Tarefa.objects.create(nome='enviar_email', executar_apos=timezone.now() + timedelta(hours=1))
+        self.assertEqual([t.id for t in tarefas._reservar(10)], [pronta.id])
+        self.assertEqual(list(tarefas._reservar(10)), [])
+        pronta.refresh_from_db()
+        self.assertEqual(pronta.status, 'em_execucao')
+        self.assertGreater(pronta.executar_apos, timezone.now())
+
+    def test_reserva_expirada_volta_a_ser_reservada(self):
+        # Worker que morreu a meio: passado o prazo, outro fica com a tarefa
+        tarefa = Tarefa.objects.create(
+            nome='enviar_email', status='em_execucao', executar_apos=timezone.now() - timedelta(seconds=1)
+        )
+        self.assertEqual([t.id for t in tarefas._reservar(10)], [tarefa.id])
+
+    def test_linha_alterada_por_outro_worker_nao_e_reservada(self):
+        tarefa = Tarefa.objects.create(nome='enviar_email')
+        filtro = Tarefa.objects.filter
+
+        def outro_worker_primeiro(*args, **kwargs):
+            # Entre a leitura das candidatas e o update, outro worker reserva-a
+            if 'status' in kwargs and 'executar_apos' in kwargs:
+                filtro(id=tarefa.id).update(status='em_execucao', executar_apos=timezone.now() + timedelta(minutes=5))
+            return filtro(*args, **kwargs)
+
+        with mock.patch.object(Tarefa.objects, 'filter', side_effect=outro_worker_primeiro):
+            self.assertEqual(list(tarefas._reservar(10)), [])
+
+
+class EstatisticasTests(TestCase):
+    def setUp(self):
+        self.cliente = User.objects.create_user('cliente')
+        self.hoje = timezone.localdate()
+
+    def criar_movimento(self):
+        encomenda = Encomenda.objects.create(usuario=self.cliente, total=15)
+        Encomenda.objects.create(usuario=self.cliente, total=5, status='cancelada')
+        ComprovativoPagamento.objects.create(
+            encomenda=encomenda, usuario=self.cliente, metodo_pagamento='mpesa', numero_referencia='1',
+            valor=15, comprovativo='comprovativos/x.jpg', status='aprovado', processado_em=timezone.now(),
+        )
+        categoria = Categoria.objects.create(nome='Bolos')
+        produto = Produto.objects.create(nome='Bolo', descricao='', preco=10, categoria=categoria)
+        Avaliacao.objects.create(produto=produto, usuario=self.cliente, estrelas=4)
+        Reclamacao.objects.create(usuario=self.cliente, assunto='Atraso', mensagem='...')
+
+    def test_resumo_do_dia(self):
+        self.criar_movimento()
+        User.objects.create_user('ivsweets')
+        estatistica = atualizar_estatisticas_dia(self.hoje)
+        self.assertEqual(estatistica.encomendas, 2)
+        self.assertEqual(estatistica.encomendas_por_status, {'pendente': 1, 'cancelada': 1})
+        self.assertEqual(estatistica.receita, Decimal('15'))
+        self.assertEqual(estatistica.comprovativos_aprovados, 1)
+        self.assertEqual(estatistica.novos_clientes, 1)
+        self.assertEqual(estatistica.avaliacoes, 1)
+        self.assertEqual(estatistica.reclamacoes, 1)
+        # Recalcular atualiza a mesma linha
+        atualizar_estatisticas_dia(self.hoje)
+        self.assertEqual(EstatisticaDiaria.objects.count(), 1)
+
+    @override_settings(TAREFAS_SINCRONAS=False, ESTATISTICAS_ATRASO=60)
+    def test_alteracoes_enfileiram_um_recalculo_por_dia(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.criar_movimento()
+        recalculos = Tarefa.objects.filter(nome='estatisticas_dia')
+        self.assertEqual(list(recalculos.values_list('argumentos', flat=True)), [{'dia': self.hoje.isoformat()}])
+        self.assertFalse(EstatisticaDiaria.objects.exists())
+
+        tarefas.executar(recalculos.get())
+        self.assertEqual(EstatisticaDiaria.objects.get(data=self.hoje).encomendas, 2)
+
+
+@override_settings(TAREFAS_SINCRONAS=False, ADMIN_NOTIFICACOES_EMAILS=['admin@example.com'])
+class NotificacoesTests(TestCase):
+    def setUp(self):
+        self.cliente = User.objects.create_user('cliente')
+
+    def reclamar(self, assunto='Atraso'):
+        return Reclamacao.objects.create(usuario=self.cliente, assunto=assunto, mensagem='A encomenda não chegou')
+
+    def entregar_agora(self):
+        # A tarefa periódica fica agendada para o fim da janela; aqui corre já
+        tarefas.agendar_periodicas()
+        Tarefa.objects.filter(nome='entregar_notificacoes').update(executar_apos=timezone.now())
+        return tarefas.processar_pendentes()
+
+    def test_registada_so_depois_do_commit(self):
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            self.reclamar()
+            self.assertFalse(NotificacaoAdmin.objects.exists())
+        self.assertTrue(callbacks)
+        self.assertEqual(NotificacaoAdmin.objects.get().tipo, 'reclamacao')
+        self.assertEqual(mail.outbox, [])
+
+    def test_transacao_desfeita_nao_notifica(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    self.reclamar()
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+        self.assertFalse(NotificacaoAdmin.objects.exists())
+
+    def test_worker_envia_um_resumo(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.reclamar('Atraso')
+            self.reclamar('Embalagem')
+        self.entregar_agora()
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['admin@example.com'])
+        self.assertIn('Atraso', mail.outbox[0].body)
+        self.assertIn('Embalagem', mail.outbox[0].body)
+        self.assertFalse(NotificacaoAdmin.objects.filter(enviada_em=None).exists())
+        # Já enviadas: a ronda seguinte não as repete
+        self.entregar_agora()
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_falha_smtp_mantem_pendentes_e_tenta_de_novo(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.reclamar()
+        with mock.patch('django.core.mail.backends.locmem.EmailBackend.send_messages', side_effect=SMTPException):
+            with self.assertLogs('sweets.tarefas', 'WARNING'):
+                self.entregar_agora()
+        tarefa = Tarefa.objects.get(nome='entregar_notificacoes')
+        self.assertEqual((tarefa.status, tarefa.tentativas), ('pendente', 1))
+        self.assertGreater(tarefa.executar_apos, timezone.now())
+        self.assertTrue(NotificacaoAdmin.objects.filter(enviada_em=None).exists())
+
+        self.entregar_agora()
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertFalse(NotificacaoAdmin.objects.filter(enviada_em=None).exists())
+
+
+@override_settings(TAREFAS_SINCRONAS=False)
+class EnviarEmailTests(TestCase):
+    def enfileirar(self, **kwargs):
+        return tarefas.enfileirar(
+            'enviar_email', assunto='Olá', mensagem='Corpo', destinatarios=['cliente@example.com'], **kwargs
+        )
+
+    def test_enviado_pelo_worker(self):
+        tarefa = self.enfileirar()
+        self.assertEqual(mail.outbox, [])
+        tarefas.executar(Tarefa.objects.get(pk=tarefa.pk))
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].subject, 'Olá')
+        tarefa.refresh_from_db()
+        self.assertEqual(tarefa.status, 'concluida')
+
+    @override_settings(TAREFAS_BACKOFF_BASE=30)
+    def test_nova_tentativa_com_backoff_e_falha_definitiva(self):
+        tarefa = self.enfileirar(max_tentativas=2)
+        with mock.patch('django.core.mail.backends.locmem.EmailBackend.send_messages', side_effect=SMTPException):
+            antes = timezone.now()
+            with self.assertLogs('sweets.tarefas', 'WARNING'):
+                self.assertFalse(tarefas.executar(Tarefa.objects.get(pk=tarefa.pk)))
+            tarefa.refresh_from_db()
+            self.assertEqual((tarefa.status, tarefa.tentativas), ('pendente', 1))
+            self.assertGreaterEqual(tarefa.executar_apos, antes + timedelta(seconds=30))
+            self.assertIn('SMTPException', tarefa.erro)
+
+            with self.assertLogs('sweets.tarefas', 'ERROR'):
+                self.assertFalse(tarefas.executar(tarefa))
+            tarefa.refresh_from_db()
+            self.assertEqual((tarefa.status, tarefa.tentativas), ('falhou', 2))
+        self.assertEqual(mail.outbox, [])
+
+
+S3_TESTE = {
+    'default': {
+        'BACKEND': 'sweets.storage.ArmazenamentoS3',
+        'OPTIONS': {
+            'bucket_name': 'loja', 'region_name': 'us-east-1', 'access_key': 'teste', 'secret_key': 'teste',
+            'querystring_auth': True, 'signature_version': 's3v4',
+        },
+    },
+    'staticfiles': settings.STORAGES['staticfiles'],
+}
+
+
+@override_settings(STORAGES=S3_TESTE, UPLOADS_DIRETOS=True, TAREFAS_SINCRONAS=False)
+class UploadsDiretosTests(TestCase):
+    # O cliente S3 é substituído por um Stubber: cada chamada ao bucket tem de ser
+    # a esperada (e nenhuma vai à rede)
+
+    def setUp(self):
+        self.cliente = User.objects.create_user('cliente')
+        self.s3 = Stubber(default_storage.connection.meta.client)
+        self.s3.activate()
+        self.addCleanup(self.s3.deactivate)
+        imagem = io.BytesIO()
+        Image.new('RGB', (20, 20), 'red').save(imagem, 'PNG')
+        self.png = imagem.getvalue()
+
+    def token(self, chave, destino='comprovativo'):
+        return signing.dumps({'chave': chave, 'destino': destino, 'user': self.cliente.pk}, salt=uploads.SALT)
+
+    def objeto_no_bucket(self, chave, tamanho):
+        for _ in range(2):  # exists() e size()
+            self.s3.add_response('head_object', {'ContentLength': tamanho}, {'Bucket': 'loja', 'Key': chave})
+
+    def cabecalho(self, chave, conteudo):
+        self.s3.add_response(
+            'get_object',
+            {'Body': StreamingBody(io.BytesIO(conteudo), len(conteudo))},
+            {'Bucket': 'loja', 'Key': chave, 'Range': f'bytes=0-{uploads.CABECALHO - 1}'},
+        )
+
+    def remocoes(self):
+        return list(Tarefa.objects.filter(nome='remover_ficheiro').values_list('argumentos__caminho', flat=True))
+
+    def test_assinar_recusa_tipo_tamanho_e_destino(self):
+        for destino, tipo, tamanho in [
+            ('comprovativo', 'text/html', 100),
+            ('comprovativo', 'image/png', 11 * uploads.MB),
+            ('comprovativo', 'image/png', 0),
+            ('produto', 'image/png', 100),
+            ('outro', 'image/png', 100),
+        ]:
+            with self.subTest(destino=destino, tipo=tipo, tamanho=tamanho):
+                with self.assertRaises(uploads.UploadInvalido):
+                    uploads.assinar(self.cliente, destino, 'foto.png', tipo, tamanho)
+
+    def test_assinar_limita_tipo_e_tamanho_na_politica(self):
+        dados = uploads.assinar(self.cliente, 'comprovativo', 'Foto.PNG', 'image/png', 1000)
+        chave = dados['campos']['key']
+        self.assertRegex(chave, r'^comprovativos/[0-9a-f]{32}\.png$')
+        politica = json.loads(base64.b64decode(dados['campos']['policy']))
+        self.assertIn({'Content-Type': 'image/png'}, politica['conditions'])
+        self.assertIn(['content-length-range', 1, 10 * uploads.MB], politica['conditions'])
+        self.assertEqual(signing.loads(dados['token'], salt=uploads.SALT)['chave'], chave)
+
+    def test_confirmar_le_so_o_cabecalho(self):
+        chave = 'comprovativos/aaaa.png'
+        self.objeto_no_bucket(chave, len(self.png))
+        self.cabecalho(chave, self.png)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(uploads.confirmar(self.cliente, self.token(chave), 'comprovativo'), chave)
+        self.s3.assert_no_pending_responses()
+        tarefa = Tarefa.objects.get(nome='enderecar_upload')
+        self.assertEqual(tarefa.argumentos, {'chave': chave, 'tipo': 'image/png'})
+        self.assertGreater(tarefa.executar_apos, timezone.now())
+
+    def test_confirmar_recusa_tipo_real_e_remove_o_objeto(self):
+        chave = 'comprovativos/bbbb.png'
+        self.objeto_no_bucket(chave, 30)
+        self.cabecalho(chave, b'<html><script></script></html>')
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertRaisesMessage(uploads.UploadInvalido, 'Tipo de ficheiro não permitido.'):
+                uploads.confirmar(self.cliente, self.token(chave), 'comprovativo')
+        self.assertEqual(self.remocoes(), [chave])
+
+    def test_confirmar_recusa_objeto_grande_demais(self):
+        chave = 'comprovativos/cccc.png'
+        self.objeto_no_bucket(chave, 11 * uploads.MB)
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertRaises(uploads.UploadInvalido):
+                uploads.confirmar(self.cliente, self.token(chave), 'comprovativo')
+        self.assertEqual(self.remocoes(), [chave])
+
+    def test_confirmar_recusa_token_de_outro_destino_ou_utilizador(self):
+        outro = User.objects.create_user('outro')
+        token = self.token('comprovativos/dddd.png')
+        with self.assertRaises(uploads.UploadInvalido):
+            uploads.confirmar(outro, token, 'comprovativo')
+        with self.assertRaises(uploads.UploadInvalido):
+            uploads.confirmar(self.cliente, token, 'chat')
+        with self.assertRaises(uploads.UploadInvalido):
+            uploads.confirmar(self.cliente, token[:-2] + 'xx', 'comprovativo')
+
+    def test_enderecar_copia_para_o_nome_pelo_conteudo(self):
+        chave = 'comprovativos/eeee.jpeg'
+        final = f'comprovativos/{hashlib.sha256(self.png).hexdigest()}.png'
+        encomenda = Encomenda.objects.create(usuario=self.cliente, total=1)
+        comprovativo = ComprovativoPagamento.objects.create(
+            encomenda=encomenda, usuario=self.cliente, metodo_pagamento='mpesa', numero_referencia='1',
+            valor=1, comprovativo=chave,
+        )
+        self.s3.add_response('head_object', {'ContentLength': len(self.png)}, {'Bucket': 'loja', 'Key': chave})
+        self.s3.add_client_error('head_object', http_status_code=404, expected_params={'Bucket': 'loja', 'Key': final})
+        self.s3.add_response(
+            'copy_object', {}, {'Bucket': 'loja', 'Key': final, 'CopySource': {'Bucket': 'loja', 'Key': chave}}
+        )
+        with mock.patch.object(ArmazenamentoS3, 'open', return_value=ContentFile(self.png)):
+            with self.captureOnCommitCallbacks(execute=True):
+                uploads.enderecar(chave, 'image/png')
+        self.s3.assert_no_pending_responses()
+        comprovativo.refresh_from_db()
+        self.assertEqual(comprovativo.comprovativo.name, final)
+        # O objeto com o nome aleatório sai pela remoção diferida (só se ficar órfão)
+        self.assertEqual(self.remocoes(), [chave])
+
+    def test_enderecar_sem_linha_nao_copia(self):
+        chave = 'chat_attachments/ffff.png'
+        self.s3.add_response('head_object', {'ContentLength': 1}, {'Bucket': 'loja', 'Key': chave})
+        with self.captureOnCommitCallbacks(execute=True):
+            uploads.enderecar(chave, 'image/png')
+        self.s3.assert_no_pending_responses()
+        self.assertEqual(self.remocoes(), [chave])
+
+
+class ResumoPartilhadoTests(TestCase):
+    def setUp(self):
+        cliente = User.objects.create_user('cliente')
+        categoria = Categoria.objects.create(nome='Bolos')
+        self.produto = Produto.objects.create(nome='Bolo de chocolate', descricao='', preco=10, categoria=categoria)
+        item = ItemCarrinho.objects.create(carrinho=Carrinho.objects.create(usuario=cliente), produto=self.produto)
+        self.encomenda = Encomenda.objects.create(usuario=cliente, total=10)
+        self.encomenda.itens.add(item)
+        self.addCleanup(cache.clear)
+
+    def test_guardado_em_cache(self):
+        partilha.resumo(self.encomenda.id)
+        with self.assertNumQueries(0):
+            self.assertIn('Bolo de chocolate', partilha.resumo(self.encomenda.id))
+
+    def test_produto_alterado_invalida(self):
+        partilha.resumo(self.encomenda.id)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.produto.nome = 'Bolo de morango'
+            self.produto.save()
+        self.assertIn('Bolo de morango', partilha.resumo(self.encomenda.id))
+
+    def test_importacao_invalida(self):
+        partilha.resumo(self.encomenda.id)
+        importar_produtos([(2, {'id': str(self.produto.id), 'nome': 'Bolo de coco', 'preco': '12', 'categoria': 'Bolos'})])
+        resumo = partilha.resumo(self.encomenda.id)
+        self.assertIn('Bolo de coco', resumo)
+        self.assertIn('12', resumo)
+
+
+class IconesDinamicosTests(TestCase):
+    def test_expressao_permitida_da_os_seus_icones(self):
+        texto = '<i class="fas fa-star"></i><i class="fas fa-{{ notificacao.icone }}"></i>'
+        icones, desconhecidas = icones_do_texto(texto, {'fa-{{notificacao.icone}}': ['fa-bell', 'fa-envelope']})
+        self.assertEqual(icones, {'fa-star', 'fa-bell', 'fa-envelope'})
+        self.assertEqual(desconhecidas, [])
+
+    def test_expressao_desconhecida(self):
+        for texto in [
+            '<i class="fa-{{ x }}">', '<i class="fa-{% if a %}check{% endif %}">',
+            "el.className = 'fa-' + tipo;", 'el.className = `fa-${tipo}`;',
+        ]:
+            with self.subTest(texto=texto):
+                self.assertEqual(len(icones_do_texto(texto, {})[1]), 1)
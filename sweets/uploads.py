@@ -0,0 +1,253 @@
+import io
+import mimetypes
+import os
+import uuid
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core import signing
+from django.core.files.base import ContentFile, File
+from django.core.files.storage import default_storage
+from django.core.files.uploadhandler import FileUploadHandler, SkipFile
+from django.db import transaction
+from PIL import Image
+
+from .imagens import otimizada, reencodar
+from .storage import campos_de_ficheiro, nome_por_conteudo
+
+SALT = 'sweets.uploads'
+MB = 1024 * 1024
+# Bytes lidos do bucket para reconhecer o tipo (cabeçalhos de PDF/imagem,
+# incluindo um bloco EXIF grande antes do SOF de um JPEG)
+CABECALHO = 256 * 1024
+
+
+class Destino:
+    def __init__(self, pasta, tipos, tamanho_max, so_admin=False):
+        self.pasta = pasta
+        self.tipos = tipos  # prefixos de Content-Type aceites; None = qualquer
+        self.tamanho_max = tamanho_max
+        self.so_admin = so_admin
+
+    def aceita(self, content_type):
+        return self.tipos is None or content_type.startswith(self.tipos)
+
+
+# Mesmas pastas do upload_to de cada campo
+DESTINOS = {
+    'comprovativo': Destino('comprovativos/', ('image/', 'application/pdf'), 10 * MB),
+    'referencia': Destino('encomendas/referencias/', ('image/',), 10 * MB),
+    'chat': Destino('chat_attachments/', None, 20 * MB),
+    'produto': Destino('produtos/', ('image/',), 10 * MB, so_admin=True),
+}
+
+
+class UploadInvalido(Exception):
+    pass
+
+
+def ativos():
+    return getattr(settings, 'UPLOADS_DIRETOS', False)
+
+
+def assinar(user, destino, nome, content_type, tamanho):
+    # Devolve o POST pré-assinado (url + campos) para o browser enviar o ficheiro
+    # diretamente para o bucket, e um token que o formulário devolve no lugar do ficheiro.
+    config = DESTINOS.get(destino)
+    if config is None:
+        raise UploadInvalido('Destino inválido.')
+    if config.so_admin and user.username != 'ivsweets':
+        raise UploadInvalido('Sem permissão.')
+    if not config.aceita(content_type):
+        raise UploadInvalido('Tipo de ficheiro não permitido.')
+    if not 0 < tamanho <= config.tamanho_max:
+        raise UploadInvalido(f'O ficheiro deve ter no máximo {config.tamanho_max // MB}MB.')
+
+    extensao = os.path.splitext(nome)[1].lower()[:10]
+    chave = f'{config.pasta}{uuid.uuid4().hex}{extensao}'
+    prazo = getattr(settings, 'UPLOADS_DIRETOS_PRAZO', 3600)
+    cliente = default_storage.connection.meta.client
+    formulario = cliente.generate_presigned_post(
+        Bucket=default_storage.bucket_name,
+        Key=default_storage._normalize_name(chave),
+        Fields={'Content-Type': content_type},
+        Conditions=[
+            {'Content-Type': content_type},
+            ['content-length-range', 1, config.tamanho_max],
+        ],
+        ExpiresIn=prazo,
+    )
+    token = signing.dumps({'chave': chave, 'destino': destino, 'user': user.pk}, salt=SALT)
+    return {'url': formulario['url'], 'campos': formulario['fields'], 'token': token}
+
+
+def confirmar(user, token, destino):
+    # Valida o token, confirma que o objeto chegou ao bucket dentro do limite e
+    # confere o tipo real pelos primeiros bytes (o Content-Type assinado é o que
+    # o browser disse). Devolve a chave; o nome pelo hash fica para o worker.
+    prazo = getattr(settings, 'UPLOADS_DIRETOS_PRAZO', 3600)
+    try:
+        dados = signing.loads(token, salt=SALT, max_age=prazo * 2)
+    except signing.BadSignature:
+        raise UploadInvalido('Upload inválido ou expirado.')
+    if dados['user'] != user.pk or dados['destino'] != destino:
+        raise UploadInvalido('Upload inválido.')
+    chave = dados['chave']
+    if not default_storage.exists(chave):
+        raise UploadInvalido('O ficheiro não chegou ao armazenamento.')
+    if default_storage.size(chave) > DESTINOS[destino].tamanho_max:
+        default_storage.delete(chave)
+        raise UploadInvalido('Ficheiro demasiado grande.')
+    tipo = tipo_real(io.BytesIO(default_storage.ler_inicio(chave, CABECALHO)))
+    if not DESTINOS[destino].aceita(tipo):
+        default_storage.delete(chave)
+        raise UploadInvalido('Tipo de ficheiro não permitido.')
+    # Com atraso: a view grava a linha que aponta para a chave depois de confirmar()
+    from .tarefas import enfileirar
+    atraso = timedelta(seconds=getattr(settings, 'UPLOADS_DIRETOS_ENDERECAR_ATRASO', 30))
+    transaction.on_commit(lambda: enfileirar('enderecar_upload', atraso=atraso, chave=chave, tipo=tipo))
+    return chave
+
+
+def enderecar(chave, tipo):
+    """
+    Corre no worker: dá ao objeto enviado diretamente o nome pelo hash do
+    conteúdo, como os outros uploads (cópia dentro do bucket), e passa as
+    linhas que apontam para a chave aleatória a apontar para esse nome.
+    """
+    if not default_storage.exists(chave):
+        return
+    campos = [
+        (modelo, campo) for modelo, campo in campos_de_ficheiro()
+        if modelo._base_manager.filter(**{campo: chave}).exists()
+    ]
+    if not campos:
+        # O formulário não chegou a gravar a linha: a remoção diferida só apaga
+        # o objeto se continuar sem referências
+        default_storage.delete(chave)
+        return
+    extensao = mimetypes.guess_extension(tipo) if tipo != 'application/octet-stream' else None
+    with default_storage.open(chave, 'rb') as ficheiro:
+        nome = nome_por_conteudo(os.path.splitext(chave)[0] + (extensao or os.path.splitext(chave)[1]), File(ficheiro))
+    nome = default_storage.get_available_name(
+        nome, max_length=min(modelo._meta.get_field(campo).max_length for modelo, campo in campos)
+    )
+    if not default_storage.exists(nome):
+        default_storage.copiar(chave, nome)
+    for modelo, campo in campos:
+        modelo._base_manager.filter(**{campo: chave}).update(**{campo: nome})
+    default_storage.delete(chave)
+
+
+def limite_upload(request):
+    # Limite aplicado pelo LimiteUploadHandler a cada ficheiro deste pedido; a
+    # importação do catálogo sobe-o (request.upload_tamanho_max) antes do parse
+    return getattr(request, 'upload_tamanho_max', None) or getattr(settings, 'UPLOAD_TAMANHO_MAX', 20 * MB)
+
+
+class LimiteUploadHandler(FileUploadHandler):
+    """
+    Conta os bytes de cada ficheiro enquanto chegam e descarta-o a meio
+    (SkipFile) quando passa UPLOAD_TAMANHO_MAX, em vez de o escrever todo em
+    disco. O campo fica em request.uploads_recusados para a view avisar.
+    """
+
+    def new_file(self, field_name, *args, **kwargs):
+        super().new_file(field_name, *args, **kwargs)
+        self.recebidos = 0
+
+    def receive_data_chunk(self, raw_data, start):
+        self.recebidos += len(raw_data)
+        if self.recebidos > limite_upload(self.request):
+            if not hasattr(self.request, 'uploads_recusados'):
+                self.request.uploads_recusados = set()
+            self.request.uploads_recusados.add(self.field_name)
+            raise SkipFile
+        return raw_data
+
+    def file_complete(self, file_size):
+        return None
+
+
+def tipo_real(ficheiro):
+    # Pelo conteúdo, não pelo Content-Type nem pela extensão que o browser manda
+    ficheiro.seek(0)
+    inicio = ficheiro.read(5)
+    ficheiro.seek(0)
+    if inicio == b'%PDF-':
+        return 'application/pdf'
+    try:
+        with Image.open(ficheiro) as imagem:
+            formato = imagem.format
+    except (OSError, Image.DecompressionBombError):
+        return 'application/octet-stream'
+    finally:
+        ficheiro.seek(0)
+    return Image.MIME.get(formato, f'image/{formato.lower()}')
+
+
+def validar_ficheiro(ficheiro, destino):
+    """
+    Confere o tamanho e o tipo real de um ficheiro recebido no pedido. As
+    imagens são re-encodadas (resolução limitada, sem metadados); devolve o
+    ficheiro a gravar.
+    """
+    config = DESTINOS[destino]
+    if ficheiro.size > config.tamanho_max:
+        raise UploadInvalido(f'O ficheiro deve ter no máximo {config.tamanho_max // MB}MB.')
+    tipo = tipo_real(ficheiro)
+    if not config.aceita(tipo):
+        raise UploadInvalido('Tipo de ficheiro não permitido.')
+    if not tipo.startswith('image/'):
+        return ficheiro
+
+    original = ficheiro.read()
+    ficheiro.seek(0)
+    try:
+        if otimizada(original):
+            return ficheiro
+        conteudo, extensao = reencodar(original)
+    except (OSError, Image.DecompressionBombError):
+        raise UploadInvalido('Imagem inválida.')
+    otimizado = ContentFile(conteudo, name=os.path.splitext(os.path.basename(ficheiro.name))[0] + extensao)
+    if getattr(settings, 'UPLOADS_MANTER_ORIGINAL', False):
+        # Guardado numa pasta com o nome do ficheiro derivado: sweets.media dá
+        # acesso ao original a quem pode ver o derivado
+        derivado = nome_por_conteudo(f'{config.pasta}{otimizado.name}', otimizado)
+        default_storage.save(f'originais/{derivado}/{os.path.basename(ficheiro.name)}', ficheiro)
+    return otimizado
+
+
+def ficheiro_enviado(request, campo, destino):
+    # O ficheiro veio no corpo do pedido (upload clássico) ou foi enviado
+    # diretamente para o bucket e só chega o token `<campo>_chave`.
+    if campo in getattr(request, 'uploads_recusados', ()):
+        limite = min(DESTINOS[destino].tamanho_max, limite_upload(request))
+        raise UploadInvalido(f'O ficheiro deve ter no máximo {limite // MB}MB.')
+    if campo in request.FILES:
+        return validar_ficheiro(request.FILES[campo], destino)
+    token = request.POST.get(f'{campo}_chave')
+    if token and ativos():
+        return confirmar(request.user, token, destino)
+    return None
+
+
+async def gravar_enviado(request, campo, destino, modelo, nome_campo):
+    """
+    Versão async de ficheiro_enviado: confirma o upload direto ou valida,
+    re-encoda e grava o ficheiro numa thread à parte, fora da thread das queries.
+    Devolve o nome a atribuir ao FileField (ou None).
+    """
+    if campo in request.FILES or campo in getattr(request, 'uploads_recusados', ()):
+        # Validação e re-encode (CPU) sem BD: fora da thread das queries
+        ficheiro = await sync_to_async(ficheiro_enviado, thread_sensitive=False)(request, campo, destino)
+    else:
+        ficheiro = await sync_to_async(ficheiro_enviado)(request, campo, destino)
+    if ficheiro is None or isinstance(ficheiro, str):
+        return ficheiro
+    field = modelo._meta.get_field(nome_campo)
+    nome = field.generate_filename(None, ficheiro.name)
+    return await sync_to_async(field.storage.save, thread_sensitive=False)(
+        nome, ficheiro, max_length=field.max_length
+    )
@@ -17,6 +17,7 @@ urlpatterns = [
     path('pagamento/<int:encomenda_id>/', views.efetuar_pagamento, name='efetuar_pagamento'),
     path('minhas-encomendas/', views.minhas_encomendas, name='minhas_encomendas'),
     path('encomenda/<int:id>/', views.encomenda_detalhe, name='encomenda_detalhe'),
+    path('uploads/assinar/', views.assinar_upload, name='assinar_upload'),
     path('sobre-nos/', views.sobre_nos, name='sobre_nos'),
     path('pagamentos/', views.pagamentos, name='pagamentos'),
     path('register/', views.register, name='register'),
@@ -33,10 +34,13 @@ urlpatterns = [
     path('admin/clientes/', views.admin_clientes, name='admin_clientes'),
     path('admin/avaliacoes/', views.admin_avaliacoes, name='admin_avaliacoes'),
     path('admin/comprovativos/', views.admin_comprovativos, name='admin_comprovativos'),
+    path('admin/comprovativos/acao/', views.admin_comprovativos_acao, name='admin_comprovativos_acao'),
+    path('admin/exportar/<str:tipo>/', views.admin_exportar, name='admin_exportar'),
     path('admin/reclamacoes/', views.admin_reclamacoes, name='admin_reclamacoes'),
     path('admin/reclamacao/<int:id>/', views.admin_reclamacao_detalhe, name='admin_reclamacao_detalhe'),
     path('admin/reclamacao/<int:id>/responder/', views.admin_responder_reclamacao, name='admin_responder_reclamacao'),
     path('secure-order/<uuid:token>/', views.secure_order_view, name='secure_order_view'),
+    path('secure-order/<str:token>/', views.secure_order_view, name='secure_order_assinado'),
 
     # Chat views
     path('chat/', views.user_chat, name='user_chat'),
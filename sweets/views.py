@@ -1,18 +1,42 @@
-from django.shortcuts import render, get_object_or_404, redirect
+import asyncio
+import uuid
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core import signing
+from django.db import transaction
+from django.shortcuts import render, get_object_or_404, aget_object_or_404, redirect
 from django.contrib.auth import login, authenticate
 from django.contrib.auth.forms import UserCreationForm, AuthenticationForm
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.models import User
 from django.contrib import messages
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse, HttpResponseBadRequest, Http404
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
 from django.views.decorators.http import require_http_methods
 from django.urls import reverse
-from django.core.mail import send_mail
-from .models import Produto, Categoria, Encomenda, Carrinho, ItemCarrinho, ComprovativoPagamento, Avaliacao, Reclamacao, SecureLink, ChatMessage
-from django.db.models import Q, Avg
+from .models import Produto, Categoria, Encomenda, Carrinho, ItemCarrinho, ComprovativoPagamento, Avaliacao, Reclamacao, SecureLink, ChatMessage, EstatisticaDiaria
+from . import contadores, leituras, partilha
+from .duplicados import anotar_duplicados
+from .estados import TransicaoInvalida, transicoes_possiveis, transitar, transitar_em_lote
+from .estatisticas import serie_diaria
+from .exportacao import EXPORTACOES, FORMATOS, exportar
+from .fluxo import conteudo
+from .importacao import importar_produtos, ler_linhas
+from .pagamentos import ACOES, contagem_por_status, fila_comprovativos, processar_comprovativos
+from .tarefas import enfileirar
+from .uploads import MB, UploadInvalido, assinar, ativos, ficheiro_enviado, gravar_enviado, limite_upload
+from django.db.models import Q, Avg, Count, Sum
 from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
 from datetime import timedelta
 
+def otimizar_imagens(objeto, *campos):
+    # O re-encode das imagens é feito pelo worker, fora do pedido
+    for campo in campos:
+        if getattr(objeto, campo):
+            enfileirar('otimizar_imagem', modelo=objeto._meta.label, pk=objeto.pk, campo=campo)
+
 def index(request):
     if request.user.is_authenticated and request.user.username == 'ivsweets':
         return redirect('sweets:admin_dashboard')
@@ -44,16 +68,48 @@ def catalogo(request):
     categorias = Categoria.objects.all()
     return render(request, 'sweets/catalogo.html', {'produtos': produtos, 'categorias': categorias, 'busca': busca, 'categoria_selecionada': categoria_id})
 
+AVALIACOES_POR_PAGINA = 10
+
+def pagina_avaliacoes(produto, cursor=None, por_pagina=AVALIACOES_POR_PAGINA):
+    # Paginação por cursor (keyset) sobre o índice (produto, -criado_em, -id):
+    # cada página custa uma única query, independentemente do total de avaliações.
+    avaliacoes = produto.avaliacoes.select_related('usuario').order_by('-criado_em', '-id')
+    if cursor:
+        try:
+            criado_em, avaliacao_id = cursor.rsplit('_', 1)
+            criado_em = parse_datetime(criado_em)
+            avaliacao_id = int(avaliacao_id)
+        except ValueError:
+            criado_em = None
+        if criado_em is not None:
+            avaliacoes = avaliacoes.filter(
+                Q(criado_em__lt=criado_em) | Q(criado_em=criado_em, id__lt=avaliacao_id)
+            )
+    pagina = list(avaliacoes[:por_pagina + 1])
+    proximo_cursor = None
+    if len(pagina) > por_pagina:
+        pagina = pagina[:por_pagina]
+        ultima = pagina[-1]
+        proximo_cursor = f"{ultima.criado_em.isoformat()}_{ultima.id}"
+    return pagina, proximo_cursor
+
 @login_required
 def produto_detalhe(request, id):
     if request.user.username == 'ivsweets':
         return redirect('sweets:admin_dashboard')
     produto = get_object_or_404(Produto, id=id, disponivel=True)
-    avaliacoes = produto.avaliacoes.all()
-    avg_rating = produto.avaliacoes.aggregate(avg=Avg('estrelas'))['avg'] or 0
-    count_avaliacoes = produto.avaliacoes.count()
+    avaliacoes, proximo_cursor = pagina_avaliacoes(produto, request.GET.get('avaliacoes_antes'))
+    resumo = produto.avaliacoes.aggregate(avg=Avg('estrelas'), total=Count('id'))
+    avg_rating = resumo['avg'] or 0
+    count_avaliacoes = resumo['total']
     user_has_rated = produto.avaliacoes.filter(usuario=request.user).exists()
-    produtos_relacionados = Produto.objects.filter(categoria=produto.categoria).exclude(id=produto.id)[:4]
+    # Recomendações pré-calculadas por `manage.py gerar_recomendacoes` (uma query indexada)
+    recomendacoes = produto.recomendacoes.filter(recomendado__disponivel=True).select_related('recomendado')
+    produtos_relacionados = [r.recomendado for r in recomendacoes if r.tipo == 'relacionado']
+    comprados_juntos = [r.recomendado for r in recomendacoes if r.tipo == 'comprado_junto']
+    if not recomendacoes:
+        # Produto ainda sem recomendações geradas (ex.: produto novo)
+        produtos_relacionados = Produto.objects.filter(categoria=produto.categoria, disponivel=True).exclude(id=produto.id)[:4]
 
     # Calculate star display
     full_stars = int(avg_rating)
@@ -63,10 +119,13 @@ def produto_detalhe(request, id):
     return render(request, 'sweets/produto_detalhe.html', {
         'produto': produto,
         'avaliacoes': avaliacoes,
+        'avaliacoes_cursor': proximo_cursor,
+        'avaliacoes_paginada': bool(request.GET.get('avaliacoes_antes')),
         'avg_rating': avg_rating,
         'count_avaliacoes': count_avaliacoes,
         'user_has_rated': user_has_rated,
         'produtos_relacionados': produtos_relacionados,
+        'comprados_juntos': comprados_juntos,
         'full_stars': range(full_stars),
         'has_half_star': has_half_star,
         'empty_stars': range(empty_stars)
@@ -117,6 +176,8 @@ def adicionar_carrinho(request, produto_id):
     if not created:
         item.quantidade += 1
         item.save()
+    else:
+        contadores.invalidar('carrinho', request.user.id)
     if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
         return JsonResponse({'success': True, 'message': f'{produto.nome} adicionado ao carrinho!'})
     messages.success(request, f'{produto.nome} adicionado ao carrinho!')
@@ -127,6 +188,7 @@ def adicionar_carrinho(request, produto_id):
 def remover_carrinho(request, item_id):
     item = get_object_or_404(ItemCarrinho, id=item_id, carrinho__usuario=request.user, carrinho__encomendado=False)
     item.delete()
+    contadores.invalidar('carrinho', request.user.id)
     messages.success(request, 'Item removido do carrinho!')
     return redirect('sweets:carrinho')
 
@@ -140,12 +202,40 @@ def atualizar_quantidade_carrinho(request, item_id):
         item.save()
     else:
         item.delete()
+        contadores.invalidar('carrinho', request.user.id)
     return JsonResponse({'success': True})
 
+def registar_encomenda(usuario, carrinho, dados, comprovativo=None):
+    # Todas as escritas numa transação (transaction.atomic não funciona em código async)
+    with transaction.atomic():
+        encomenda = Encomenda.objects.create(
+            usuario=usuario,
+            total=carrinho.total,
+            descricao_encomenda=dados.get('descricao', ''),
+            imagem_referencia_1=dados.get('imagem_referencia_1'),
+            imagem_referencia_2=dados.get('imagem_referencia_2'),
+            data_recepcao=dados.get('data_recepcao'),
+        )
+        encomenda.itens.set(carrinho.itens.all())
+        carrinho.encomendado = True
+        carrinho.save()
+        contadores.invalidar('carrinho', usuario.id)
+        otimizar_imagens(encomenda, 'imagem_referencia_1', 'imagem_referencia_2')
+        if comprovativo:
+            comprovativo = ComprovativoPagamento.objects.create(encomenda=encomenda, usuario=usuario, valor=encomenda.total, **comprovativo)
+            otimizar_imagens(comprovativo, 'comprovativo')
+    return encomenda
+
+# Sob ASGI (GUNICORN_MODO=asgi) o Django recebe o corpo inteiro do pedido no event
+# loop antes de correr qualquer middleware, por isso um upload lento de telemóvel não
+# prende uma thread; o parse do multipart acontece depois, no CsrfViewMiddleware.
+# As views com upload são async para validar, re-encodar e gravar os ficheiros em
+# threads à parte (e em paralelo), fora da thread das queries. Sob WSGI continuam a funcionar.
 @login_required
-def finalizar_encomenda(request):
-    carrinho = Carrinho.objects.filter(usuario=request.user, encomendado=False).first()
-    if not carrinho or not carrinho.itens.exists():
+async def finalizar_encomenda(request):
+    usuario = await request.auser()
+    carrinho = await Carrinho.objects.filter(usuario=usuario, encomendado=False).afirst()
+    if not carrinho or not await carrinho.itens.aexists():
         messages.error(request, 'Carrinho vazio!')
         return redirect('sweets:carrinho')
 
@@ -153,36 +243,38 @@ def finalizar_encomenda(request):
         # Check if payment fields are present (combined form submission)
         metodo_pagamento = request.POST.get('metodo_pagamento')
         numero_referencia = request.POST.get('numero_referencia')
-        comprovativo_file = request.FILES.get('comprovativo')
+        envios = {
+            'imagem_referencia_1': gravar_enviado(request, 'imagem_referencia_1', 'referencia', Encomenda, 'imagem_referencia_1'),
+            'imagem_referencia_2': gravar_enviado(request, 'imagem_referencia_2', 'referencia', Encomenda, 'imagem_referencia_2'),
+        }
+        if metodo_pagamento and numero_referencia:
+            envios['comprovativo'] = gravar_enviado(request, 'comprovativo', 'comprovativo', ComprovativoPagamento, 'comprovativo')
+        try:
+            ficheiros = dict(zip(envios, await asyncio.gather(*envios.values())))
+        except UploadInvalido as erro:
+            messages.error(request, str(erro))
+            return redirect('sweets:finalizar_encomenda')
 
         # Process the order finalization
-        descricao = request.POST.get('descricao', '')
         data_recepcao = request.POST.get('data_recepcao')
-        data_recepcao_obj = timezone.datetime.strptime(data_recepcao, '%Y-%m-%d').date() if data_recepcao else None
-
-        encomenda = Encomenda.objects.create(
-            usuario=request.user,
-            total=carrinho.total,
-            descricao_encomenda=descricao,
-            imagem_referencia_1=request.FILES.get('imagem_referencia_1'),
-            imagem_referencia_2=request.FILES.get('imagem_referencia_2'),
-            data_recepcao=data_recepcao_obj
-        )
-        encomenda.itens.set(carrinho.itens.all())
-        carrinho.encomendado = True
-        carrinho.save()
+        dados = {
+            'descricao': request.POST.get('descricao', ''),
+            'data_recepcao': timezone.datetime.strptime(data_recepcao, '%Y-%m-%d').date() if data_recepcao else None,
+            'imagem_referencia_1': ficheiros['imagem_referencia_1'],
+            'imagem_referencia_2': ficheiros['imagem_referencia_2'],
+        }
 
         # If payment information is provided, process it
-        if metodo_pagamento and numero_referencia and comprovativo_file:
-            ComprovativoPagamento.objects.create(
-                encomenda=encomenda,
-                usuario=request.user,
-                metodo_pagamento=metodo_pagamento,
-                numero_referencia=numero_referencia,
-                valor=encomenda.total,
-                comprovativo=comprovativo_file,
-                observacoes=request.POST.get('observacoes', '')
-            )
+        comprovativo = None
+        if ficheiros.get('comprovativo'):
+            comprovativo = {
+                'metodo_pagamento': metodo_pagamento,
+                'numero_referencia': numero_referencia,
+                'comprovativo': ficheiros['comprovativo'],
+                'observacoes': request.POST.get('observacoes', ''),
+            }
+        encomenda = await sync_to_async(registar_encomenda)(usuario, carrinho, dados, comprovativo)
+        if comprovativo:
             messages.success(request, 'Encomenda e comprovativo de pagamento enviados! Aguarde aprovação.')
             return redirect('sweets:minhas_encomendas')
         else:
@@ -191,43 +283,57 @@ def finalizar_encomenda(request):
             return redirect('sweets:efetuar_pagamento', encomenda_id=encomenda.id)
     else:
         # Show the finalization form
-        itens = ItemCarrinho.objects.filter(carrinho=carrinho)
+        itens = [item async for item in ItemCarrinho.objects.filter(carrinho=carrinho).select_related('produto')]
         total = sum(item.subtotal for item in itens)
-        return render(request, 'sweets/finalizar_encomenda.html', {
+        return await sync_to_async(render)(request, 'sweets/finalizar_encomenda.html', {
             'itens': itens,
             'total': total,
             'carrinho': carrinho
         })
 
 @login_required
-def efetuar_pagamento(request, encomenda_id):
-    encomenda = get_object_or_404(Encomenda, id=encomenda_id, usuario=request.user, status='pendente')
+async def efetuar_pagamento(request, encomenda_id):
+    usuario = await request.auser()
+    encomenda = await aget_object_or_404(Encomenda, id=encomenda_id, usuario=usuario, status='pendente')
     if request.method == 'POST':
         metodo = request.POST.get('metodo_pagamento')
         numero_referencia = request.POST.get('numero_referencia')
         observacoes = request.POST.get('observacoes')
-        comprovativo_file = request.FILES.get('comprovativo')
+        comprovativo_file = None
+        if metodo and numero_referencia:
+            try:
+                comprovativo_file = await gravar_enviado(request, 'comprovativo', 'comprovativo', ComprovativoPagamento, 'comprovativo')
+            except UploadInvalido as erro:
+                messages.error(request, str(erro))
+                return redirect('sweets:efetuar_pagamento', encomenda_id=encomenda.id)
         if metodo and numero_referencia and comprovativo_file:
-            ComprovativoPagamento.objects.create(
+            comprovativo = await ComprovativoPagamento.objects.acreate(
                 encomenda=encomenda,
-                usuario=request.user,
+                usuario=usuario,
                 metodo_pagamento=metodo,
                 numero_referencia=numero_referencia,
                 valor=encomenda.total,
                 comprovativo=comprovativo_file,
                 observacoes=observacoes
             )
+            await sync_to_async(otimizar_imagens)(comprovativo, 'comprovativo')
             messages.success(request, 'Comprovativo de pagamento enviado! Aguarde aprovação.')
             return redirect('sweets:minhas_encomendas')
         else:
             messages.error(request, 'Preencha todos os campos corretamente.')
-    return render(request, 'sweets/efetuar_pagamento.html', {'encomenda': encomenda})
+    return await sync_to_async(render)(request, 'sweets/efetuar_pagamento.html', {'encomenda': encomenda})
 
 @login_required
 def minhas_encomendas(request):
     if request.user.username == 'ivsweets':
         return redirect('sweets:admin_dashboard')
-    encomendas = Encomenda.objects.filter(usuario=request.user).order_by('-created_at')
+    # Índice (usuario, -created_at) e a linha do tempo numa query extra (índice (encomenda, created_at))
+    encomendas = (
+        Encomenda.objects.filter(usuario=request.user)
+        .annotate(num_itens=Count('itens'))
+        .order_by('-created_at')
+        .prefetch_related('eventos')
+    )
     return render(request, 'sweets/minhas_encomendas.html', {'encomendas': encomendas})
 
 @login_required
@@ -304,24 +410,48 @@ def admin_dashboard(request):
     if not (request.user.username == 'ivsweets' and request.user.check_password('Naite2025')):
         messages.error(request, 'Acesso negado. Credenciais de admin inválidas.')
         return redirect('sweets:index')
+    # Totais lidos da tabela de estatísticas diárias (uma linha por dia),
+    # mantida por signals e pelo comando `atualizar_estatisticas`
+    totais = EstatisticaDiaria.objects.aggregate(
+        encomendas=Sum('encomendas'),
+        clientes=Sum('novos_clientes'),
+        avaliacoes=Sum('avaliacoes'),
+        receita=Sum('receita'),
+    )
+    serie = serie_diaria(30)
     total_produtos = Produto.objects.count()
-    total_encomendas = Encomenda.objects.count()
-    total_clientes = User.objects.exclude(username='ivsweets').count()
     comprovativos_pendentes = ComprovativoPagamento.objects.filter(status='pendente').count()
-    total_avaliacoes = Avaliacao.objects.count()
+    reclamacoes_pendentes = Reclamacao.objects.filter(status='nova').count()
     encomendas_recentes = Encomenda.objects.order_by('-created_at')[:5]
+    reclamacoes_recentes = Reclamacao.objects.order_by('-created_at')[:5]
     categorias = Categoria.objects.all()
     return render(request, 'sweets/admin_dashboard.html', {
         'total_produtos': total_produtos,
-        'total_encomendas': total_encomendas,
-        'total_clientes': total_clientes,
+        'total_encomendas': totais['encomendas'] or 0,
+        'total_clientes': totais['clientes'] or 0,
+        'total_receita': totais['receita'] or 0,
         'comprovativos_pendentes': comprovativos_pendentes,
-        'total_avaliacoes': total_avaliacoes,
+        'reclamacoes_pendentes': reclamacoes_pendentes,
+        'total_avaliacoes': totais['avaliacoes'] or 0,
         'encomendas_recentes': encomendas_recentes,
+        'reclamacoes_recentes': reclamacoes_recentes,
+        'serie_diaria': serie,
+        'receita_30_dias': sum(e.receita for e in serie),
+        'encomendas_30_dias': sum(e.encomendas for e in serie),
         'categorias': categorias
     })
 
+@csrf_exempt
 def admin_produtos(request):
+    # O catálogo e o zip das imagens podem passar o limite normal de upload. O
+    # limite tem de subir antes do parse do multipart, que o CsrfViewMiddleware
+    # faria logo: por isso o CSRF é verificado aqui (_admin_produtos) e não no middleware.
+    if request.user.username == 'ivsweets':
+        request.upload_tamanho_max = settings.UPLOAD_CATALOGO_TAMANHO_MAX
+    return _admin_produtos(request)
+
+@csrf_protect
+def _admin_produtos(request):
     if not (request.user.username == 'ivsweets' and request.user.check_password('Naite2025')):
         return redirect('sweets:index')
     if request.method == 'POST':
@@ -333,6 +463,21 @@ def admin_produtos(request):
                 nome_produto = produto.nome
                 produto.delete()
                 messages.success(request, f'Produto {nome_produto} removido com sucesso!')
+        elif 'importar_catalogo' in request.POST:
+            # Importação em massa (CSV/JSONL + zip opcional com as imagens)
+            catalogo = request.FILES.get('catalogo')
+            recusados = getattr(request, 'uploads_recusados', set()) & {'catalogo', 'imagens_zip'}
+            if recusados:
+                messages.error(request, f'O catálogo e o zip das imagens devem ter no máximo {limite_upload(request) // MB}MB.')
+            elif catalogo:
+                resultado = importar_produtos(ler_linhas(catalogo), request.FILES.get('imagens_zip'))
+                messages.success(request, f'Catálogo importado: {resultado}.')
+                for linha, erro in resultado.erros[:20]:
+                    messages.warning(request, f'Linha {linha}: {erro}')
+                if len(resultado.erros) > 20:
+                    messages.warning(request, f'... e mais {len(resultado.erros) - 20} erros.')
+            else:
+                messages.error(request, 'Selecione um ficheiro CSV ou JSONL.')
         elif 'adicionar_categoria' in request.POST:
             # Adicionar nova categoria
             nome_categoria = request.POST.get('nome_categoria')
@@ -349,7 +494,11 @@ def admin_produtos(request):
             descricao = request.POST.get('descricao')
             preco = request.POST.get('preco')
             categoria_id = request.POST.get('categoria')
-            imagem = request.FILES.get('imagem')
+            try:
+                imagem = ficheiro_enviado(request, 'imagem', 'produto')
+            except UploadInvalido as erro:
+                messages.error(request, str(erro))
+                return redirect('sweets:admin_produtos')
             disponivel = request.POST.get('disponivel') == 'True'
             if nome and descricao and preco and categoria_id:
                 categoria = get_object_or_404(Categoria, id=categoria_id)
@@ -375,8 +524,13 @@ def admin_produto_editar(request, id):
         produto.descricao = request.POST.get('descricao')
         produto.preco = float(request.POST.get('preco'))
         produto.categoria_id = request.POST.get('categoria')
-        if request.FILES.get('imagem'):
-            produto.imagem = request.FILES['imagem']
+        try:
+            imagem = ficheiro_enviado(request, 'imagem', 'produto')
+        except UploadInvalido as erro:
+            messages.error(request, str(erro))
+            return redirect('sweets:admin_produto_editar', id=produto.id)
+        if imagem:
+            produto.imagem = imagem
         produto.save()
         messages.success(request, 'Produto atualizado com sucesso!')
         return redirect('sweets:admin_produtos')
@@ -386,83 +540,88 @@ def admin_produto_editar(request, id):
 def admin_encomendas(request):
     if not (request.user.username == 'ivsweets' and request.user.check_password('Naite2025')):
         return redirect('sweets:index')
+    if request.method == 'POST' and request.POST.get('action') == 'transicao_em_lote':
+        # Ex.: todas as encomendas "pronta" com recepção hoje -> "entregue", numa só transação
+        de = request.POST.get('de')
+        para = request.POST.get('para')
+        data_recepcao = parse_date(request.POST.get('data_recepcao') or '')
+        encomendas = Encomenda.objects.filter(status=de)
+        if data_recepcao:
+            encomendas = encomendas.filter(data_recepcao=data_recepcao)
+        try:
+            alteradas = transitar_em_lote(encomendas.values_list('id', flat=True), para, autor=request.user)
+        except TransicaoInvalida as erro:
+            messages.error(request, str(erro))
+        else:
+            messages.success(request, f'{len(alteradas)} encomenda(s) atualizada(s) para {dict(Encomenda.STATUS_CHOICES)[para]}.')
+        return redirect('sweets:admin_encomendas')
     if request.method == 'POST':
         encomenda_id = request.POST.get('encomenda_id')
         action = request.POST.get('action')
         encomenda = get_object_or_404(Encomenda, id=encomenda_id)
-        if action == 'aprovar_pagamento':
-            comprovativo = ComprovativoPagamento.objects.filter(encomenda=encomenda).first()
-            if comprovativo:
-                comprovativo.status = 'aprovado'
-                comprovativo.processado_por = request.user
-                comprovativo.processado_em = timezone.now()
-                comprovativo.save()
-                encomenda.paga = True
-                encomenda.save()
-                messages.success(request, f'Pagamento da encomenda {encomenda_id} aprovado!')
+        if action in ('aprovar_pagamento', 'rejeitar_pagamento'):
+            pendentes = list(
+                ComprovativoPagamento.objects.filter(encomenda=encomenda, status='pendente').values_list('id', flat=True)
+            )
+            if pendentes:
+                acao = 'aprovar' if action == 'aprovar_pagamento' else 'rejeitar'
+                processar_comprovativos(pendentes, acao, request.user, request.POST.get('motivo_rejeicao', ''))
+                if acao == 'aprovar':
+                    messages.success(request, f'Pagamento da encomenda {encomenda_id} aprovado!')
+                else:
+                    messages.success(request, f'Pagamento da encomenda {encomenda_id} rejeitado!')
             else:
-                messages.error(request, 'Nenhum comprovativo encontrado para esta encomenda.')
-        elif action == 'rejeitar_pagamento':
-            comprovativo = ComprovativoPagamento.objects.filter(encomenda=encomenda).first()
-            if comprovativo:
-                comprovativo.status = 'rejeitado'
-                comprovativo.processado_por = request.user
-                comprovativo.processado_em = timezone.now()
-                comprovativo.save()
-                messages.success(request, f'Pagamento da encomenda {encomenda_id} rejeitado!')
+                messages.error(request, 'Nenhum comprovativo pendente para esta encomenda.')
+        elif action in ('marcar_entregue', 'update_status'):
+            status = 'entregue' if action == 'marcar_entregue' else request.POST.get('status')
+            try:
+                transitar(encomenda, status, autor=request.user)
+            except TransicaoInvalida as erro:
+                messages.error(request, str(erro))
             else:
-                messages.error(request, 'Nenhum comprovativo encontrado para esta encomenda.')
-        elif action == 'marcar_entregue':
-            encomenda.entregue = True
-            encomenda.save()
-            messages.success(request, f'Encomenda {encomenda_id} marcada como entregue!')
-        elif action == 'update_status':
-            status = request.POST.get('status')
-            if status in dict(Encomenda.STATUS_CHOICES):
-                encomenda.status = status
-                encomenda.save()
-                messages.success(request, f'Status da encomenda atualizado para {status}!')
+                messages.success(request, f'Status da encomenda {encomenda_id} atualizado para {encomenda.get_status_display()}!')
     encomendas = Encomenda.objects.all().order_by('-created_at')
-    return render(request, 'sweets/admin_encomendas.html', {'encomendas': encomendas})
+    return render(request, 'sweets/admin_encomendas.html', {
+        'encomendas': encomendas,
+        'status_choices': Encomenda.STATUS_CHOICES,
+        'hoje': timezone.localdate(),
+    })
 
 def admin_encomenda_detalhe(request, id):
     if not (request.user.username == 'ivsweets' and request.user.check_password('Naite2025')):
         return redirect('sweets:index')
     encomenda = get_object_or_404(Encomenda, id=id)
     if request.method == 'POST' and request.POST.get('action') == 'generate_link':
-        link, created = SecureLink.objects.get_or_create(
-            encomenda=encomenda, 
-            defaults={'expires_at': timezone.now() + timezone.timedelta(days=7)}
-        )
-        if not created:
-            link.expires_at = timezone.now() + timezone.timedelta(days=7)
-            link.save()
-        share_url = request.build_absolute_uri(reverse('sweets:secure_order_view', args=[str(link.token)]))
+        # Token assinado: nada é gravado na base de dados
+        share_url = request.build_absolute_uri(partilha.caminho(encomenda.id, partilha.expiracao_padrao()))
         messages.success(request, f'Link seguro gerado: {share_url}')
-    secure_links = SecureLink.objects.filter(encomenda=encomenda)
     comprovativos = ComprovativoPagamento.objects.filter(encomenda=encomenda)
+    if request.method == 'POST' and 'status' in request.POST and 'comprovativo_id' not in request.POST:
+        try:
+            transitar(encomenda, request.POST.get('status'), autor=request.user, nota=request.POST.get('nota', '')[:200])
+        except TransicaoInvalida as erro:
+            messages.error(request, str(erro))
+        else:
+            messages.success(request, f'Status atualizado para {encomenda.get_status_display()}!')
+        return redirect('sweets:admin_encomenda_detalhe', id=encomenda.id)
     if request.method == 'POST' and 'comprovativo_id' in request.POST:
         comprovativo_id = request.POST.get('comprovativo_id')
         action = request.POST.get('action')
-        comprovativo = get_object_or_404(ComprovativoPagamento, id=comprovativo_id)
-        if action == 'aprovar':
-            comprovativo.status = 'aprovado'
-            comprovativo.processado_por = request.user
-            comprovativo.processado_em = timezone.now()
-            comprovativo.save()
-            encomenda.status = 'confirmada'
-            encomenda.save()
-            messages.success(request, 'Comprovativo aprovado e encomenda confirmada!')
-        elif action == 'rejeitar':
-            comprovativo.status = 'rejeitado'
-            comprovativo.processado_por = request.user
-            comprovativo.processado_em = timezone.now()
-            comprovativo.save()
-            messages.success(request, 'Comprovativo rejeitado!')
+        comprovativo = get_object_or_404(ComprovativoPagamento, id=comprovativo_id, encomenda=encomenda)
+        if action in ACOES:
+            if processar_comprovativos([comprovativo.id], action, request.user, request.POST.get('motivo_rejeicao', '')):
+                if action == 'aprovar':
+                    messages.success(request, 'Comprovativo aprovado e encomenda confirmada!')
+                else:
+                    messages.success(request, 'Comprovativo rejeitado!')
+            else:
+                messages.error(request, 'Este comprovativo já foi processado.')
+            encomenda.refresh_from_db()
     return render(request, 'sweets/admin_encomenda_detalhe.html', {
         'encomenda': encomenda, 
-        'secure_links': secure_links,
-        'comprovativos': comprovativos
+        'comprovativos': comprovativos,
+        'transicoes': transicoes_possiveis(encomenda),
+        'eventos': encomenda.eventos.select_related('autor'),
     })
 
 
@@ -506,41 +665,108 @@ def admin_comprovativos(request):
     if not (request.user.username == 'ivsweets' and request.user.check_password('Naite2025')):
         return redirect('sweets:index')
     if request.method == 'POST':
-        comprovativo_id = request.POST.get('comprovativo_id')
-        action = request.POST.get('action')
-        comprovativo = get_object_or_404(ComprovativoPagamento, id=comprovativo_id)
-        if action == 'aprovar':
-            comprovativo.status = 'aprovado'
-            comprovativo.processado_por = request.user
-            comprovativo.processado_em = timezone.now()
-            comprovativo.save()
-            encomenda = comprovativo.encomenda
-            encomenda.paga = True
-            encomenda.save()
-            messages.success(request, 'Comprovativo aprovado!')
-        elif action == 'rejeitar':
-            motivo = request.POST.get('motivo_rejeicao')
-            comprovativo.status = 'rejeitado'
-            comprovativo.motivo_rejeicao = motivo
-            comprovativo.processado_por = request.user
-            comprovativo.processado_em = timezone.now()
-            comprovativo.save()
-            messages.success(request, 'Comprovativo rejeitado!')
-        return redirect('sweets:admin_comprovativos')
-    comprovativos = ComprovativoPagamento.objects.select_related('encomenda__usuario', 'usuario').all().order_by('-enviado_em')
-    return render(request, 'sweets/admin_comprovativos.html', {'comprovativos': comprovativos})
+        return admin_comprovativos_acao(request)
+    status = request.GET.get('status', 'pendente')
+    if status not in dict(ComprovativoPagamento.STATUS_CHOICES):
+        status = 'pendente'
+    cursor = request.GET.get('depois')
+    comprovativos, proximo_cursor = fila_comprovativos(status, cursor)
+    comprovativos = anotar_duplicados(comprovativos)
+    contagem = contagem_por_status()
+    abas = [(valor, nome, contagem[valor]) for valor, nome in ComprovativoPagamento.STATUS_CHOICES]
+    return render(request, 'sweets/admin_comprovativos.html', {
+        'comprovativos': comprovativos,
+        'status_atual': status,
+        'cursor_atual': cursor,
+        'proximo_cursor': proximo_cursor,
+        'abas': abas,
+        'status_choices': ComprovativoPagamento.STATUS_CHOICES,
+    })
 
-def secure_order_view(request, token):
+@require_http_methods(["POST"])
+def admin_comprovativos_acao(request):
+    # Aprovar/rejeitar um ou vários comprovativos numa só transação.
+    # Responde em JSON a pedidos com Accept: application/json, senão volta à fila.
+    if not (request.user.username == 'ivsweets' and request.user.check_password('Naite2025')):
+        return JsonResponse({'success': False, 'error': 'Acesso negado.'}, status=403)
+    quer_json = 'application/json' in request.headers.get('Accept', '')
+    acao = request.POST.get('action')
+    ids = [
+        int(valor) for valor in request.POST.getlist('comprovativo_ids') + request.POST.getlist('comprovativo_id')
+        if valor.isdigit()
+    ]
+    motivo = (request.POST.get('motivo_rejeicao') or '').strip()
+    erro = None
+    if acao not in ACOES or not ids:
+        erro = 'Selecione pelo menos um comprovativo e uma ação.'
+    elif acao == 'rejeitar' and not motivo:
+        erro = 'Indique o motivo da rejeição.'
+    if erro:
+        if quer_json:
+            return JsonResponse({'success': False, 'error': erro}, status=400)
+        messages.error(request, erro)
+    else:
+        processados = processar_comprovativos(ids, acao, request.user, motivo)
+        if quer_json:
+            return JsonResponse({'success': True, 'processados': processados})
+        if acao == 'aprovar':
+            messages.success(request, f'{processados} comprovativo(s) aprovado(s)!')
+        else:
+            messages.success(request, f'{processados} comprovativo(s) rejeitado(s)!')
+    status = request.POST.get('status')
+    if status in dict(ComprovativoPagamento.STATUS_CHOICES):
+        return redirect(f"{reverse('sweets:admin_comprovativos')}?status={status}")
+    return redirect('sweets:admin_comprovativos')
+
+def admin_exportar(request, tipo):
+    if not (request.user.username == 'ivsweets' and request.user.check_password('Naite2025')):
+        return redirect('sweets:index')
+    if tipo not in EXPORTACOES:
+        raise Http404
+    formato = request.GET.get('formato', 'csv')
+    inicio = request.GET.get('inicio') or None
+    fim = request.GET.get('fim') or None
     try:
-        link = SecureLink.objects.get(token=token)
+        if formato not in FORMATOS or (inicio and not parse_date(inicio)) or (fim and not parse_date(fim)):
+            raise ValueError
+    except ValueError:
+        return HttpResponseBadRequest('Parâmetros de exportação inválidos.')
+    linhas = exportar(tipo, formato, inicio=inicio, fim=fim, status=request.GET.get('status') or None)
+    content_type = 'text/csv; charset=utf-8' if formato == 'csv' else 'application/x-ndjson; charset=utf-8'
+    response = StreamingHttpResponse(conteudo(request, linhas, lote=200), content_type=content_type)
+    nome = f"{tipo}_{timezone.localdate():%Y%m%d}.{formato}"
+    response['Content-Disposition'] = f'attachment; filename="{nome}"'
+    return response
+
+def secure_order_view(request, token):
+    # Links assinados (sweets.partilha) validam-se sem consultar a base de dados;
+    # os antigos, por UUID, continuam a ser procurados em SecureLink
+    if isinstance(token, uuid.UUID):
+        link = SecureLink.objects.filter(token=token).first()
+        if link is None or link.encomenda_id is None:
+            messages.error(request, 'Link inválido.')
+            return redirect('sweets:index')
         if not link.is_valid():
             messages.error(request, 'Link expirado.')
             return redirect('sweets:index')
-        encomenda = link.encomenda
-        return render(request, 'sweets/secure_link_share.html', {'encomenda': encomenda})
-    except SecureLink.DoesNotExist:
+        encomenda_id = link.encomenda_id
+    else:
+        try:
+            encomenda_id = partilha.ler_token(token)
+        except signing.SignatureExpired:
+            messages.error(request, 'Link expirado.')
+            return redirect('sweets:index')
+        except signing.BadSignature:
+            messages.error(request, 'Link inválido.')
+            return redirect('sweets:index')
+    resumo = partilha.resumo(encomenda_id)
+    if resumo is None:
         messages.error(request, 'Link inválido.')
         return redirect('sweets:index')
+    return render(request, 'sweets/secure_link_share.html', {
+        'resumo': resumo,
+        'public_url': request.build_absolute_uri(),
+    })
 
 
 from django.forms import Form, CharField
@@ -556,16 +782,20 @@ def user_chat(request):
         messages.error(request, 'Admin não encontrado.')
         return redirect('sweets:index')
 
-    mensagens = ChatMessage.objects.filter(
+    mensagens = list(ChatMessage.objects.filter(
         Q(sender=request.user, recipient=admin) | Q(sender=admin, recipient=request.user)
-    ).order_by('timestamp')
+    ).select_related('sender').order_by('timestamp'))
 
-    # Marcar mensagens do admin como lidas
-    mensagens.filter(sender=admin, recipient=request.user, is_read=False).update(is_read=True)
+    # Marcar mensagens do admin como lidas (só escreve se houver novas)
+    leituras.marcar_lidas(request.user.id, admin.id, max((m.id for m in mensagens if m.sender_id == admin.id), default=0))
 
     if request.method == 'POST':
         mensagem = request.POST.get('message')
-        attachment = request.FILES.get('attachment')
+        try:
+            attachment = ficheiro_enviado(request, 'attachment', 'chat')
+        except UploadInvalido as erro:
+            messages.error(request, str(erro))
+            return redirect('sweets:user_chat')
 
         if mensagem.strip() or attachment:
             ChatMessage.objects.create(
@@ -587,22 +817,46 @@ def user_chat(request):
 
 @login_required
 @require_http_methods(["POST"])
-def send_message_user(request):
-    if request.user.username == 'ivsweets':
+def assinar_upload(request):
+    # Upload direto para o bucket: o browser pede aqui um POST pré-assinado,
+    # envia o ficheiro para o storage e submete o formulário só com o token
+    if not ativos():
+        raise Http404
+    try:
+        tamanho = int(request.POST.get('tamanho') or 0)
+        dados = assinar(
+            request.user,
+            request.POST.get('destino', ''),
+            request.POST.get('nome', ''),
+            request.POST.get('tipo') or 'application/octet-stream',
+            tamanho,
+        )
+    except (UploadInvalido, ValueError) as erro:
+        return JsonResponse({'success': False, 'error': str(erro)}, status=400)
+    return JsonResponse({'success': True, **dados})
+
+@login_required
+@require_http_methods(["POST"])
+async def send_message_user(request):
+    usuario = await request.auser()
+    if usuario.username == 'ivsweets':
         return redirect('sweets:admin_dashboard')
     try:
-        admin = User.objects.get(username='ivsweets')
+        admin = await User.objects.aget(username='ivsweets')
     except User.DoesNotExist:
         return JsonResponse({'success': False, 'error': 'Admin não encontrado.'})
 
-    mensagem = request.POST.get('message')
-    attachment = request.FILES.get('attachment')
+    mensagem = request.POST.get('message') or ''
+    try:
+        attachment = await gravar_enviado(request, 'attachment', 'chat', ChatMessage, 'attachment')
+    except UploadInvalido as erro:
+        return JsonResponse({'success': False, 'error': str(erro)})
 
     if mensagem.strip() or attachment:
-        ChatMessage.objects.create(
-            sender=request.user,
+        await ChatMessage.objects.acreate(
+            sender=usuario,
             recipient=admin,
-            message=mensagem.strip() if mensagem else None,
+            message=mensagem.strip() or None,
             attachment=attachment
         )
         return JsonResponse({'success': True})
@@ -646,16 +900,20 @@ def admin_chat_with_user(request, user_id):
     user = get_object_or_404(User, id=user_id)
     admin = request.user
     
-    mensagens = ChatMessage.objects.filter(
+    mensagens = list(ChatMessage.objects.filter(
         Q(sender=user, recipient=admin) | Q(sender=admin, recipient=user)
-    ).order_by('timestamp')
+    ).select_related('sender').order_by('timestamp'))
     
-    # Marcar mensagens do user como lidas
-    mensagens.filter(sender=user, recipient=admin, is_read=False).update(is_read=True)
+    # Marcar mensagens do user como lidas (só escreve se houver novas)
+    leituras.marcar_lidas(admin.id, user.id, max((m.id for m in mensagens if m.sender_id == user.id), default=0))
     
     if request.method == 'POST':
         mensagem = request.POST.get('message')
-        attachment = request.FILES.get('attachment')
+        try:
+            attachment = ficheiro_enviado(request, 'attachment', 'chat')
+        except UploadInvalido as erro:
+            messages.error(request, str(erro))
+            return redirect('sweets:admin_chat_with_user', user_id=user_id)
 
         if mensagem.strip() or attachment:
             ChatMessage.objects.create(
@@ -677,19 +935,23 @@ def admin_chat_with_user(request, user_id):
     })
 
 @require_http_methods(["POST"])
-def send_message_admin(request, user_id):
-    if not (request.user.username == 'ivsweets' and request.user.check_password('Naite2025')):
+async def send_message_admin(request, user_id):
+    admin = await request.auser()
+    if not (admin.username == 'ivsweets' and await sync_to_async(admin.check_password)('Naite2025')):
         return JsonResponse({'success': False, 'error': 'Acesso negado.'})
 
-    user = get_object_or_404(User, id=user_id)
-    mensagem = request.POST.get('message')
-    attachment = request.FILES.get('attachment')
+    user = await aget_object_or_404(User, id=user_id)
+    mensagem = request.POST.get('message') or ''
+    try:
+        attachment = await gravar_enviado(request, 'attachment', 'chat', ChatMessage, 'attachment')
+    except UploadInvalido as erro:
+        return JsonResponse({'success': False, 'error': str(erro)})
 
     if mensagem.strip() or attachment:
-        ChatMessage.objects.create(
-            sender=request.user,
+        await ChatMessage.objects.acreate(
+            sender=admin,
             recipient=user,
-            message=mensagem.strip() if mensagem else None,
+            message=mensagem.strip() or None,
             attachment=attachment
         )
         return JsonResponse({'success': True})
@@ -708,6 +970,7 @@ def delete_chat(request, user_id):
     ChatMessage.objects.filter(
         Q(sender=user, recipient=admin) | Q(sender=admin, recipient=user)
     ).delete()
+    contadores.invalidar('mensagens', user.id, admin.id)
 
     messages.success(request, f'Conversa com {user.username} foi deletada com sucesso!')
     return redirect('sweets:admin_chats')
@@ -715,7 +978,7 @@ def delete_chat(request, user_id):
 def admin_reclamacoes(request):
     if not (request.user.username == 'ivsweets' and request.user.check_password('Naite2025')):
         return redirect('sweets:index')
-    reclamacoes = Reclamacao.objects.all().order_by('-data_criacao')
+    reclamacoes = Reclamacao.objects.all().order_by('-created_at')
     return render(request, 'sweets/admin_reclamacoes.html', {'reclamacoes': reclamacoes})
 
 def admin_reclamacao_detalhe(request, id):
@@ -734,7 +997,16 @@ def admin_responder_reclamacao(request, id):
             reclamacao.resposta = resposta
             reclamacao.respondida_por = request.user
             reclamacao.respondida_em = timezone.now()
+            if reclamacao.status in contadores.RECLAMACOES_ABERTAS:
+                reclamacao.status = 'respondida'
             reclamacao.save()
+            if reclamacao.usuario.email:
+                enfileirar(
+                    'enviar_email',
+                    assunto=f'Resposta à sua reclamação: {reclamacao.assunto}',
+                    mensagem=f'Olá {reclamacao.usuario.username},\n\n{resposta}\n\nIV Sweets',
+                    destinatarios=[reclamacao.usuario.email],
+                )
             messages.success(request, 'Resposta enviada com sucesso!')
             return redirect('sweets:admin_reclamacao_detalhe', id=id)
         else: